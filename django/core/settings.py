@@ -1,5 +1,6 @@
 import os
 import sys
+import tempfile
 from django.utils.translation import gettext_lazy as _
 
 
@@ -190,6 +191,58 @@ CKEDITOR_CONFIGS = {
 SILENCED_SYSTEM_CHECKS = ["ckeditor.W001"]
 
 
+# Cache
+# Shared by all processes, as it holds the version stamps of content cached within each process (see corpus/versions.py)
+# A database table (create it with: python manage.py createcachetable), which culls expired entries first when it's full.
+# Can be replaced in local_settings.py with a faster shared cache (e.g. Redis or Memcached) but not a per-process cache (e.g. LocMemCache)
+# Everything in the cache can be rebuilt from the database, so entries can be evicted at any time
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'corpus_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000
+        }
+    }
+}
+
+
+# RegEx search engine (see corpus/regex_search.py)
+# Directory of the memory-mapped corpus files (rebuilt by: python manage.py regex_search_corpus_build)
+REGEX_SEARCH_DIR = os.path.join(BASE_DIR, 'corpus', 'regexsearch')
+# Number of worker processes that scan the corpus in parallel
+REGEX_SEARCH_PROCESSES = 2
+# Maximum time (in seconds) a RegEx search can run before it's stopped
+REGEX_SEARCH_TIMEOUT = 5
+
+
+# Number of seconds that saved searches (used to download the results of a search, see corpus/saved_searches.py) are kept for
+SAVED_SEARCH_TIMEOUT = 60 * 60 * 24 * 7
+
+
+# Parser of the HTML of trans text fields (e.g. TextFolio.transcription) when building their lines (see corpus/text_lines.py)
+# Either 'beautifulsoup' or 'stream' (a faster parser giving identical lines, see TextLinesTest in corpus/tests.py and check with: python manage.py text_lines_check)
+TEXT_LINES_PARSER = 'beautifulsoup'
+
+
+# IIIF manifests of codex Texts (see IIIFManifest in corpus/models.py)
+# Number of seconds after which a stored manifest is refreshed by the iiif_manifests_refresh command
+IIIF_MANIFEST_TTL = 60 * 60 * 24
+# Number of seconds after which a manifest that has never been fetched successfully is fetched again (by a request or the command)
+IIIF_MANIFEST_ERROR_RETRY = 60 * 5
+# Maximum time (in seconds) to wait for the server of a manifest when fetching it
+IIIF_MANIFEST_FETCH_TIMEOUT = 10
+
+
+# Background jobs that create the smaller versions of uploaded images (see ImageDerivativeJob in corpus/models.py)
+# Number of times a job is tried before it's kept as failed
+IMAGE_DERIVATIVE_JOB_ATTEMPTS = 5
+# Number of seconds before a failed job is retried (doubled after each attempt)
+IMAGE_DERIVATIVE_JOB_RETRY_DELAY = 60
+# Number of seconds after which a running job (e.g. whose worker was killed) can be claimed by another worker
+IMAGE_DERIVATIVE_JOB_TIMEOUT = 60 * 10
+
+
 # Import local_settings.py
 try:
     from .local_settings import *  # NOQA
@@ -200,6 +253,11 @@ except ImportError:
 if not SECRET_KEY:  # NOQA
     sys.exit('Missing SECRET_KEY in local_settings.py')
 
+# Tests don't share the cache or the RegEx search corpus of the website (the test database has different content)
+if 'test' in sys.argv[1:2]:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    REGEX_SEARCH_DIR = os.path.join(tempfile.gettempdir(), 'invisible-east-regexsearch-test')
+
 
 # Storages
 
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class corpusAppConfig(AppConfig):
     name = 'corpus'
+
+    def ready(self):
+        from . import signals
+        signals.connect()
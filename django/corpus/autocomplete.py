@@ -0,0 +1,94 @@
+"""
+Autocomplete suggestions of tags, toponyms, persons, collections, and shelfmarks, used by the search box of the Text list page
+
+Each process keeps an AutocompleteIndex: a sorted list of lowercase keys (the name_unidecode of each object,
+and the remainder of it from the start of each later word, so 'Balkh' is suggested for both 'City of Balkh' and 'Balkh')
+which is searched for a prefix using a binary search (bisect), so suggestions don't need a database query.
+
+The index is rebuilt when the version of the corpus changes (see versions.py and signals.py)
+"""
+
+from bisect import bisect_left
+from django.urls import reverse
+from unidecode import unidecode
+from . import models, versions
+import re
+
+
+# Max number of suggestions returned
+SUGGESTIONS_MAX = 10
+
+# Types of suggestion: (type, model, filter param of the Text list page)
+SUGGESTION_TYPES = [
+    ('tag', models.SlTextFolioTag, 'filter_fk_text_folios__text_folio_tags__tag'),
+    ('toponym', models.SlTextToponym, 'filter_mm_toponyms'),
+    ('person', models.Person, 'filter_mm_persons_in_texts__person'),
+    ('collection', models.SlTextCollection, 'filter_fk_collection'),
+]
+
+WORD_START = re.compile(r'(?<=[\s\-(\'"/,.])\w')
+
+
+def autocomplete_key(value):
+    """ Returns the value in the form used for prefix matching, e.g. 'Balḫ ' --> 'balh' """
+    return ' '.join(unidecode(value or '').lower().split())
+
+
+class AutocompleteIndex:
+    """
+    A sorted list of keys, with a suggestion (a dict of type, label, and url) for each key
+    """
+
+    def __init__(self, version):
+        self.version = version
+        entries = []
+        text_list_url = reverse('corpus:text-list')
+        for suggestion_type, model, filter_param in SUGGESTION_TYPES:
+            for obj_id, name, name_unidecode in model.objects.values_list('id', 'name', 'name_unidecode'):
+                suggestion = {'type': suggestion_type, 'label': name, 'url': f'{text_list_url}?{filter_param}={obj_id}'}
+                entries.extend((key, suggestion, True) for key in self.keys(name_unidecode or name))
+        for obj_id, shelfmark, public in models.Text.objects.exclude(shelfmark='').values_list('id', 'shelfmark', 'public_review_approved'):
+            suggestion = {'type': 'shelfmark', 'label': shelfmark, 'url': reverse('corpus:text-detail', args=[obj_id])}
+            entries.extend((key, suggestion, public) for key in self.keys(shelfmark))
+        entries.sort(key=lambda entry: entry[0])
+        self.keys_sorted = [entry[0] for entry in entries]
+        self.suggestions = [entry[1] for entry in entries]
+        self.public = [entry[2] for entry in entries]
+
+    @staticmethod
+    def keys(value):
+        """ Returns the keys of a value: the whole value and the remainder of it from the start of each later word """
+        key = autocomplete_key(value)
+        if not key:
+            return []
+        return [key] + [key[match.start():] for match in WORD_START.finditer(key)]
+
+    def search(self, prefix, include_private=False, limit=SUGGESTIONS_MAX):
+        """
+        Returns a list of up to limit suggestions with a key that starts with prefix
+        Suggestions of Texts that aren't yet approved are only included if include_private is True
+        """
+        prefix = autocomplete_key(prefix)
+        if not prefix:
+            return []
+        results = []
+        for i in range(bisect_left(self.keys_sorted, prefix), len(self.keys_sorted)):
+            if not self.keys_sorted[i].startswith(prefix) or len(results) == limit:
+                break
+            suggestion = self.suggestions[i]
+            if (include_private or self.public[i]) and suggestion not in results:
+                results.append(suggestion)
+        return results
+
+
+# The AutocompleteIndex of this process (see autocomplete_index())
+_autocomplete_index = None
+
+
+def autocomplete_index():
+    """ Returns the AutocompleteIndex of the current version of the corpus, rebuilding it if the corpus has changed """
+    global _autocomplete_index
+    version = versions.version_get('corpus')
+    if _autocomplete_index is None or _autocomplete_index.version != version:
+        _autocomplete_index = AutocompleteIndex(version)
+    return _autocomplete_index
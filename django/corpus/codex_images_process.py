@@ -7,11 +7,13 @@ Steps:
 2.  Provide the full path to the directory of images to be processed when prompted
 3.  Manually copy the output file to the correct location (e.g. django/media/corpus/codex/)
     either locally on the dev machine during development or the live VM with live data
+    (then run `python manage.py codex_manifests_write`, as copying changes the directory, so its manifest must be rewritten)
 4.  Delete the original source images when no longer needed
 """
 
 from PIL import Image
 from pathlib import Path
+from codex_manifests import codex_manifest_write  # corpus/codex_manifests.py (as this script is run from corpus/)
 import shutil
 import os
 
@@ -45,3 +47,6 @@ for source_image in os.listdir(source_image_dir):
         image.thumbnail((400, 400), Image.LANCZOS)
         output_image_thumbnail_path = output_image_thumbnail_dir / Path(source_image)
         image.save(output_image_thumbnail_path, "JPEG", optimize=True, quality=80)
+
+# Write the manifest of the images (see corpus/codex_manifests.py)
+codex_manifest_write(str(output_image_dir))
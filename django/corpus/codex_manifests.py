@@ -0,0 +1,95 @@
+"""
+Manifests of the images of local codex Texts (i.e. codex images stored in MEDIA_ROOT/corpus/codex/<dir>/, see Text.codex_images)
+
+Rather than listing, filtering, and sorting the files of a codex directory every time its images are needed,
+the images (in page order, with their thumbnail path and dimensions) are written once to a JSON manifest
+within the directory (MANIFEST_FILE_NAME), which stores the modification time of the directory when written.
+The manifest is rewritten automatically when the directory's modification time changes (e.g. images are added or removed)
+
+Each process also keeps the manifests it has read, so reading the images of a codex only needs one os.stat() of its directory
+
+This module doesn't depend on Django, so it can also be used by codex_images_process.py
+"""
+
+from PIL import Image
+import json
+import os
+
+
+MANIFEST_FILE_NAME = 'codex.json'
+# Increase this when the structure of manifests changes, so existing manifests are rewritten
+MANIFEST_FORMAT_VERSION = 1
+
+# The manifests read by this process, as {directory: (directory modification time, images)}
+_manifests = {}
+
+
+def codex_manifest_images_list(directory):
+    """
+    Returns the images of the codex directory in page (i.e. file name) order, as dicts of:
+    file (the name of the image file), thumbnail (the path of its thumbnail, relative to the directory), width, and height
+    """
+    images = []
+    for file in sorted(os.listdir(directory)):
+        if file.lower().endswith(".jpg") and '_thumbnail.' not in file.lower():
+            with Image.open(os.path.join(directory, file)) as image:
+                width, height = image.size
+            images.append({'file': file, 'thumbnail': f'thumbnails/{file}', 'width': width, 'height': height})
+    return images
+
+
+def codex_manifest_write(directory):
+    """
+    Writes the manifest of the codex directory (replacing any existing manifest) and returns its images
+    If the manifest can't be written (e.g. the directory isn't writable) the images are only kept by this process
+    """
+    images = codex_manifest_images_list(directory)
+    path = os.path.join(directory, MANIFEST_FILE_NAME)
+    path_temp = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(path_temp, 'w') as f:
+            json.dump({'format_version': MANIFEST_FORMAT_VERSION, 'images': images}, f)
+        os.replace(path_temp, path)
+        # Adding the manifest changes the directory's modification time, so this is stored afterwards
+        # (updating the content of a file in place doesn't change the modification time of its directory)
+        directory_mtime = os.stat(directory).st_mtime_ns
+        with open(path, 'r+') as f:
+            manifest = json.load(f)
+            manifest['directory_mtime'] = directory_mtime
+            f.seek(0)
+            json.dump(manifest, f)
+            f.truncate()
+    except OSError:
+        directory_mtime = os.stat(directory).st_mtime_ns
+    _manifests[directory] = (directory_mtime, images)
+    return images
+
+
+def codex_manifest_read(directory, directory_mtime):
+    """ Returns the images of the manifest of the codex directory, or None if it doesn't exist or is out of date """
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format_version') == MANIFEST_FORMAT_VERSION and manifest.get('directory_mtime') == directory_mtime:
+        return manifest['images']
+
+
+def codex_manifest(directory):
+    """
+    Returns the images of the codex directory (see codex_manifest_images_list()), from its manifest,
+    which is written first if it doesn't exist or is out of date. Returns None if the directory doesn't exist
+    """
+    try:
+        directory_mtime = os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
+    manifest = _manifests.get(directory)
+    if manifest and manifest[0] == directory_mtime:
+        return manifest[1]
+    images = codex_manifest_read(directory, directory_mtime)
+    if images is None:
+        return codex_manifest_write(directory)
+    _manifests[directory] = (directory_mtime, images)
+    return images
@@ -0,0 +1,186 @@
+"""
+In-memory facet engine, used by TextListView to filter, count, sort, and paginate Text objects
+
+Each process keeps a FacetIndex of bitmaps of Text ids (a Python int, where bit n is set if Text n is included)
+for every value of every filter field (e.g. each collection) and every boolean ('Includes') filter.
+Filtering is then the intersection (&) of bitmaps, selecting multiple values of a filter is their union (|),
+and counting is a bit count, so only the Texts on the visible page need to be fetched from the database.
+
+The index is rebuilt when the version of the corpus changes (see versions.py and signals.py)
+"""
+
+from django.db.models import CharField, TextField, Count
+from django.db.models.functions import Lower
+from . import filters, models, versions
+import bisect
+
+
+# Filter fields of the index
+# Fields with one or more values per Text (e.g. ForeignKey, ManyToManyField, or a field of a related object)
+FILTER_FIELDS_VALUE = [
+    'primary_language',
+    'additional_languages',
+    'collection',
+    'corpus',
+    'type',
+    'writing_support',
+    'gregorian_date_century__century_number',
+    'text_folios__text_folio_tags__tag',
+    'toponyms',
+    'persons_in_texts__person',
+]
+# Boolean fields, i.e. the field has content (see filters.filter_boolean_q())
+FILTER_FIELDS_BOOLEAN = [
+    'text_folios__transliteration',
+    'text_folios__transcription',
+    'text_folios__translation',
+    'text_folios__image',
+    'text_folios__palaeography',
+    'seals__id',
+    'codex_images_location',
+]
+
+# Special start of sort values that sort by a count of related objects, e.g. 'count_text_folios'
+SORT_PRE_COUNT = 'count_'
+# Counts stored in TextListSummary, which are sorted by without counting the related objects
+TEXT_LIST_SUMMARY_COUNTS = [field.name for field in models.TextListSummary._meta.fields if field.name.startswith(SORT_PRE_COUNT)]
+
+
+def sort_queryset(queryset, sort):
+    """
+    Returns the queryset ordered by the sort value (e.g. 'shelfmark', '-gregorian_date_sort', 'count_text_folios')
+    and then by id, so objects with the same sort value are always in the same order
+    Text fields are sorted case insensitively
+    """
+    sort_dir = '-' if sort.startswith('-') else ''
+    sort_field = sort.lstrip('-')
+    # Count sorting (e.g. sort by count of related items)
+    if sort_field.startswith(SORT_PRE_COUNT):
+        # Use the count stored in TextListSummary, if it has one (e.g. 'count_text_folios')
+        if queryset.model is models.Text and sort_field in TEXT_LIST_SUMMARY_COUNTS:
+            return queryset.order_by(f'{sort_dir}list_summary__{sort_field}', 'id')
+        return queryset.annotate(countitems=Count(sort_field[len(SORT_PRE_COUNT):])).order_by(f'{sort_dir}countitems', 'id')
+    # Convert CharField and TextField values to lowercase, for case insensitivity
+    try:
+        field = queryset.model._meta.get_field(sort_field)
+    except Exception:
+        field = None
+    if isinstance(field, (CharField, TextField)):
+        return queryset.order_by(Lower(sort_field).desc() if sort_dir else Lower(sort_field), 'id')
+    return queryset.order_by(sort, 'id')
+
+
+def bitmap_from_ids(ids):
+    """ Returns a bitmap (int) with the bit of each id set """
+    ids = list(ids)
+    if not ids:
+        return 0
+    data = bytearray(max(ids) // 8 + 1)
+    for i in ids:
+        data[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(data, 'little')
+
+
+def ids_from_bitmap(bitmap):
+    """ Returns a list of the ids (in ascending order) that are set in the bitmap """
+    ids = []
+    for byte_index, byte in enumerate(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')):
+        if byte:
+            ids.extend((byte_index << 3) + bit for bit in range(8) if byte >> bit & 1)
+    return ids
+
+
+class FacetIndex:
+    """
+    Bitmaps of the Text ids of each value of each filter field, built from the database
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.all = bitmap_from_ids(models.Text.objects.values_list('id', flat=True))
+        self.public = bitmap_from_ids(models.Text.objects.filter(public_review_approved=True).values_list('id', flat=True))
+        # Bitmaps of each value of each filter field, e.g. {'collection': {collection_id: bitmap, ...}, ...}
+        self.values = {}
+        for field in FILTER_FIELDS_VALUE:
+            value_ids = {}
+            for text_id, value in models.Text.objects.filter(**{f'{field}__isnull': False}).values_list('id', field).distinct():
+                value_ids.setdefault(value, []).append(text_id)
+            self.values[field] = {value: bitmap_from_ids(ids) for value, ids in value_ids.items()}
+        # Bitmaps of each boolean filter field, e.g. {'text_folios__transcription': bitmap, ...}
+        self.booleans = {
+            field: bitmap_from_ids(models.Text.objects.filter(filters.filter_boolean_q(field)).values_list('id', flat=True))
+            for field in FILTER_FIELDS_BOOLEAN
+        }
+        # Ids (and their positions) of all Texts in order of each sort value, added when first needed (see sort_order())
+        self.sorts = {}
+
+    def value(self, field, value):
+        """ Returns the bitmap of Texts where field has the value (e.g. a collection id, provided as a string from a URL param) """
+        return self.values[field].get(int(value), 0)
+
+    def value_any(self, field, values):
+        """ Returns the bitmap of Texts where field has any of the values (i.e. several values of a filter are selected) """
+        bitmap = 0
+        for value in values:
+            bitmap |= self.value(field, value)
+        return bitmap
+
+    def value_range(self, field, value_min=None, value_max=None):
+        """ Returns the bitmap of Texts where field has a value within the range (inclusive) """
+        bitmap = 0
+        for value, value_bitmap in self.values[field].items():
+            if (value_min is None or value >= int(value_min)) and (value_max is None or value <= int(value_max)):
+                bitmap |= value_bitmap
+        return bitmap
+
+    def counts(self, field, bitmap):
+        """ Returns a dict of {value: count} of the Texts in bitmap for each value of field """
+        return {value: (value_bitmap & bitmap).bit_count() for value, value_bitmap in self.values[field].items()}
+
+    def sort_order(self, sort):
+        """
+        Returns (ids, positions) of all Texts in order of the sort value (e.g. 'shelfmark'),
+        where ids is a list of Text ids and positions is a dict of {id: index within ids}
+        Added to self.sorts when first needed
+        """
+        if sort not in self.sorts:
+            if sort == 'id':
+                ids = ids_from_bitmap(self.all)
+            else:
+                ids = list(dict.fromkeys(sort_queryset(models.Text.objects.all(), sort).values_list('id', flat=True)))
+            self.sorts[sort] = (ids, {text_id: position for position, text_id in enumerate(ids)})
+        return self.sorts[sort]
+
+    def sorted_ids(self, bitmap, sort):
+        """ Returns a list of the ids of the Texts in bitmap, ordered by the sort value (e.g. 'shelfmark') """
+        if sort == 'id':
+            return ids_from_bitmap(bitmap)
+        ids = set(ids_from_bitmap(bitmap))
+        return [i for i in self.sort_order(sort)[0] if i in ids]
+
+    def seek(self, sorted_ids, sort, cursor, backwards=False):
+        """
+        Returns the index within sorted_ids (ids of Texts in order of sort, see sorted_ids()) of the first Text
+        that comes after the Text with the id cursor (or if backwards, of the first Text that doesn't come before it)
+        Used for keyset pagination: a binary search of the sort positions, so the cost doesn't depend on how deep the page is
+        Returns None if the cursor isn't a Text
+        """
+        positions = self.sort_order(sort)[1]
+        position = positions.get(cursor)
+        if position is None:
+            return None
+        bisect_ids = bisect.bisect_left if backwards else bisect.bisect_right
+        return bisect_ids(sorted_ids, position, key=positions.__getitem__)
+
+
+# The FacetIndex of this process (see facet_index())
+_facet_index = None
+
+
+def facet_index():
+    """ Returns the FacetIndex of the current version of the corpus, rebuilding it if the corpus has changed """
+    global _facet_index
+    version = versions.version_get('corpus')
+    if _facet_index is None or _facet_index.version != version:
+        _facet_index = FacetIndex(version)
+    return _facet_index
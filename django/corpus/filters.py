@@ -0,0 +1,68 @@
+"""
+Compiles filters of Text objects to database conditions that keep the query at one row per Text
+
+A filter on a multi-valued relation of Text (e.g. text_folios, additional_languages, seals) would usually join the
+related table, duplicating Text rows, so results would then need a DISTINCT. Instead, each such filter is expressed
+as a correlated EXISTS subquery on the related model, e.g. filter_q('text_folios__text_folio_tags__tag', 'exact', 5)
+--> EXISTS(SELECT 1 FROM corpus_textfolio WHERE text_id = corpus_text.id AND <has tag 5>)
+
+See FiltersTest in corpus/tests.py, which checks that these give the same results as joined filters (legacy_filter_queryset()),
+and the filters_check management command, which runs the same checks against the current database
+"""
+
+from django.db.models import CharField, TextField, FileField, ManyToManyField, Exists, OuterRef, Q
+from . import models
+
+
+def multi_valued_relation(field_path):
+    """
+    If the first field of field_path (e.g. 'text_folios' in 'text_folios__transcription') is a multi-valued relation of Text
+    returns a tuple of (related model, lookup from the related model to Text, remainder of field_path), otherwise None
+    E.g. 'text_folios__transcription' --> (TextFolio, 'text', 'transcription')
+    """
+    first, _, rest = field_path.partition('__')
+    field = models.Text._meta.get_field(first)
+    if not (field.one_to_many or field.many_to_many):
+        return None
+    # Forward ManyToManyField (e.g. additional_languages) or reverse relation (e.g. text_folios, via TextFolio.text)
+    related_lookup = field.related_query_name() if isinstance(field, ManyToManyField) else field.field.name
+    return field.related_model, related_lookup, rest or 'pk'
+
+
+def filter_q(field_path, lookup, value):
+    """
+    Returns a condition of Text objects where field_path matches the value using the lookup (e.g. 'exact', 'in', 'gte')
+    E.g. filter_q('collection', 'exact', 1) or filter_q('additional_languages', 'in', [1, 2])
+    """
+    relation = multi_valued_relation(field_path)
+    if relation:
+        related_model, related_lookup, related_field_path = relation
+        return Exists(related_model.objects.filter(**{related_lookup: OuterRef('pk'), f'{related_field_path}__{lookup}': value}))
+    return Q(**{f'{field_path}__{lookup}': value})
+
+
+def has_content_q(model, field_path):
+    """ Returns a condition of model objects where field_path has content (i.e. isn't null, or an empty string for text fields) """
+    q = Q(**{f'{field_path}__isnull': False})
+    try:
+        field = model._meta.get_field(field_path)
+    except Exception:
+        field = None
+    if isinstance(field, (CharField, TextField, FileField)):
+        q &= ~Q(**{field_path: ''})
+    return q
+
+
+def filter_boolean_q(field_path):
+    """
+    Returns a condition of Text objects where field_path has content (i.e. isn't null or an empty string)
+    Used by 'Includes' filters (e.g. has a transcription)
+    For multi-valued relations, a Text must have at least one related object and all of them must have content
+    (e.g. has a transcription = has a folio, and every folio has a transcription)
+    """
+    relation = multi_valued_relation(field_path)
+    if relation:
+        related_model, related_lookup, related_field_path = relation
+        related = related_model.objects.filter(**{related_lookup: OuterRef('pk')})
+        return Exists(related) & ~Exists(related.exclude(has_content_q(related_model, related_field_path)))
+    return has_content_q(models.Text, field_path)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from corpus import models
+from corpus.codex_manifests import codex_manifest_write
+import os
+
+
+class Command(BaseCommand):
+    """
+    Writes the manifest (see corpus/codex_manifests.py) of the image directory of every local codex Text
+    Manifests are rewritten automatically when their directory changes, so this is only needed to write them in advance,
+    e.g. after first deploying manifests or after copying new codex images, so no request has to wait for them
+
+    Usage: python manage.py codex_manifests_write
+    """
+
+    help = 'Writes the manifest of the image directory of every local codex Text'
+
+    def handle(self, *args, **options):
+        texts = models.Text.objects.exclude(codex_images_location__isnull=True).only('id', 'codex_images_location')
+        directories = sorted({text.codex_images_dir for text in texts if text.codex_images_dir})
+        for directory in directories:
+            if os.path.isdir(directory):
+                images = codex_manifest_write(directory)
+                self.stdout.write(f'{directory}: {len(images)} images')
+            else:
+                self.stdout.write(self.style.WARNING(f'{directory}: directory not found'))
+        self.stdout.write(self.style.SUCCESS('Codex manifests written'))
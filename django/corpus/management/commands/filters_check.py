@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from corpus import models
+from corpus.tests import compiled_filter_queryset, filter_params, legacy_filter_queryset
+import random
+
+
+class Command(BaseCommand):
+    """
+    Checks that the EXISTS filters of Text objects (see corpus/filters.py) give the same results as the previous
+    joined filters (with DISTINCT), for every value of every filter field of the Text list, every 'Includes' filter,
+    the century range filters, and random combinations of these, using the current database.
+    The filters are the same as FiltersTest in corpus/tests.py, which checks them against the test fixture.
+    Raises an error listing any filters that differ, or that return a Text more than once
+
+    Usage: python manage.py filters_check [--combinations 200]
+    """
+
+    help = 'Checks that the EXISTS filters of Text objects give the same results as the previous joined filters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--combinations', type=int, default=200, help='Number of random combinations of filters to check')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random combinations')
+
+    def handle(self, *args, **options):
+        checks = filter_params()
+
+        # Random combinations of 2 or 3 filters
+        rng = random.Random(options['seed'])
+        combinations = []
+        for _ in range(options['combinations'] if len(checks) > 1 else 0):
+            combination = rng.sample(checks, min(len(checks), rng.choice((2, 3))))
+            combinations.append({key: value for params in combination for key, value in params.items()})
+
+        failures = []
+        for params in checks + combinations:
+            legacy_ids = set(legacy_filter_queryset(models.Text.objects.all(), params).values_list('id', flat=True))
+            compiled_ids = list(compiled_filter_queryset(models.Text.objects.all(), params).values_list('id', flat=True))
+            description = ' & '.join(f'{key}={value}' for key, value in params.items())
+            if len(compiled_ids) != len(set(compiled_ids)):
+                failures.append(f'{description}: returns duplicate Texts')
+            elif set(compiled_ids) != legacy_ids:
+                failures.append(f'{description}: {len(compiled_ids)} Texts, expected {len(legacy_ids)}')
+
+        checked = len(checks) + len(combinations)
+        if failures:
+            raise CommandError(f'{len(failures)} of {checked} filters differ:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(f'All {checked} filters give the same results'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from corpus import models, signals
+
+
+class Command(BaseCommand):
+    """
+    Refreshes the stored IIIF manifests (see IIIFManifest) of all codex Texts that are stale (older than IIIF_MANIFEST_TTL)
+    or not yet stored, so pages with codex images don't wait for (or fail on) the server of a manifest.
+    Run this regularly (e.g. hourly via cron), and after first deploying IIIFManifest to prefetch every manifest.
+    The list summary of each Text whose manifest images have changed is updated (e.g. its list image)
+
+    Usage: python manage.py iiif_manifests_refresh
+    Options:
+        --all (refresh every manifest, even if not stale)
+    """
+
+    help = 'Refreshes the stored IIIF manifests of all codex Texts that are stale or not yet stored'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Refresh every manifest, even if not stale')
+
+    def handle(self, *args, **options):
+        texts = [text for text in models.Text.objects.exclude(codex_images_location__isnull=True).only('id', 'codex_images_location') if text.is_codex_iiif]
+        urls = {}
+        for text in texts:
+            urls.setdefault(text.codex_images_location, []).append(text.id)
+        count, errors = len(urls), 0
+        for i, (url, text_ids) in enumerate(urls.items(), start=1):
+            manifest, _ = models.IIIFManifest.objects.get_or_create(url=url)
+            if options['all'] or manifest.is_stale:
+                if manifest.refresh():
+                    for text_id in text_ids:
+                        signals.text_updated(text_id, True)
+                if manifest.fetch_error:
+                    errors += 1
+                    self.stdout.write(self.style.WARNING(f'{url}: {manifest.fetch_error}'))
+            if i % 100 == 0 or i == count:
+                self.stdout.write(f'Checked {i} of {count} manifests')
+        self.stdout.write(self.style.SUCCESS(f'IIIF manifests refreshed ({errors} errors)'))
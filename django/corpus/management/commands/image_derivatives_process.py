@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from corpus import models, signals
+import time
+
+
+class Command(BaseCommand):
+    """
+    Processes the jobs that create the smaller versions of uploaded images (see ImageDerivativeJob), e.g. of TextFolio and Seal images.
+    Runs as a worker, waiting for new jobs, until stopped (e.g. run it as a service alongside the website), or with --once
+    processes the jobs that are due and exits (e.g. run it every minute via cron). Several workers can run at the same time.
+    The list summary and version of the Text of each job's object are updated once its smaller images are created (or its job has failed)
+
+    Usage: python manage.py image_derivatives_process
+    Options:
+        --once (process the jobs that are due, then exit)
+        --sleep (number of seconds to wait between checks for new jobs, default 5)
+        --retry-failed (retry the jobs that have failed IMAGE_DERIVATIVE_JOB_ATTEMPTS times, e.g. after fixing their cause)
+        --enqueue-missing (add jobs for images without smaller versions, e.g. after first deploying ImageDerivativeJob)
+    """
+
+    help = 'Processes the jobs that create the smaller versions of uploaded images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the jobs that are due, then exit')
+        parser.add_argument('--sleep', type=float, default=5, help='Number of seconds to wait between checks for new jobs')
+        parser.add_argument('--retry-failed', action='store_true', help='Retry the jobs that have failed')
+        parser.add_argument('--enqueue-missing', action='store_true', help='Add jobs for images without smaller versions')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            count = models.ImageDerivativeJob.objects.filter(status=models.ImageDerivativeJob.STATUS_FAILED).update(
+                status=models.ImageDerivativeJob.STATUS_PENDING, attempts=0
+            )
+            self.stdout.write(f'Retrying {count} failed jobs')
+        if options['enqueue_missing']:
+            count = 0
+            for model in (models.TextFolio, models.Seal):
+                for obj in model.objects.exclude(image='').exclude(image__isnull=True).only('id', 'image', *model.image_derivative_sizes):
+                    if models.image_derivatives_missing(obj):
+                        models.ImageDerivativeJob.enqueue(obj, reset=False)
+                        count += 1
+            self.stdout.write(f'Added jobs for {count} images without smaller versions')
+
+        processed, failed = 0, 0
+        while True:
+            job = models.ImageDerivativeJob.claim_next()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            attempts = job.attempts
+            # The Text is updated once the job has created the smaller images, or has failed for good
+            text_id = job.process()
+            if text_id is not None:
+                signals.text_updated(text_id, True)
+            if job.attempts > attempts:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'{job}: {job.error}'))
+            elif text_id is not None:
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(f'Image derivative jobs processed ({processed} processed, {failed} errors)'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from corpus import models
+
+
+class Command(BaseCommand):
+    """
+    Sets the plain text fields (e.g. TextFolio.transcription_plain) of all Text and TextFolio objects
+    from their rich text fields. Run this after first deploying the plain text fields (then run search_index_rebuild)
+
+    Uses bulk_update() rather than save() to avoid reprocessing TextFolio images and re-indexing every Text
+
+    Usage: python manage.py plain_text_backfill
+    """
+
+    help = 'Sets the plain text fields of all Text and TextFolio objects from their rich text fields'
+    batch_size = 500
+
+    def backfill(self, model):
+        plain_fields = [f'{field}_plain' for field in model.plain_text_fields]
+        objects = model.objects.only('id', *model.plain_text_fields)
+        count = objects.count()
+        batch = []
+        for i, obj in enumerate(objects.iterator(chunk_size=self.batch_size), start=1):
+            models.set_plain_text_fields(obj)
+            batch.append(obj)
+            if len(batch) == self.batch_size or i == count:
+                model.objects.bulk_update(batch, plain_fields)
+                batch = []
+                self.stdout.write(f'Updated {i} of {count} {model._meta.verbose_name_plural}')
+
+    def handle(self, *args, **options):
+        self.backfill(models.Text)
+        self.backfill(models.TextFolio)
+        self.stdout.write(self.style.SUCCESS('Plain text fields set'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from corpus import search
+
+
+class Command(BaseCommand):
+    """
+    Builds the RegEx search corpus (see corpus/regex_search.py) of the current search index (TextSearchIndex), if it isn't built yet.
+    Until it's built, RegEx searches use the previous corpus, so run this regularly (e.g. every minute via cron)
+    and after search_index_rebuild
+
+    Usage: python manage.py regex_search_corpus_build
+    """
+
+    help = 'Builds the RegEx search corpus of the current search index, if it isn\'t built yet'
+
+    def handle(self, *args, **options):
+        if search.regex_search_corpus_build():
+            self.stdout.write(self.style.SUCCESS('RegEx search corpus built'))
+        else:
+            self.stdout.write(self.style.SUCCESS('RegEx search corpus is up to date'))
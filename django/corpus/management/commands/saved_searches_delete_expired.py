@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from corpus import models
+
+
+class Command(BaseCommand):
+    """
+    Deletes the saved searches (see SavedSearch) that have expired, i.e. not saved again within SAVED_SEARCH_TIMEOUT.
+    Run this regularly (e.g. daily via cron)
+
+    Usage: python manage.py saved_searches_delete_expired
+    """
+
+    help = 'Deletes the saved searches that have expired'
+
+    def handle(self, *args, **options):
+        count, _ = models.SavedSearch.objects.filter(expires__lte=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} expired saved searches'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from corpus import models
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the full-text search index (TextSearchIndex) of all Text objects
+    Run this after first deploying the search index, or if the index is out of sync
+    (e.g. after renaming select list items, which doesn't re-index related Texts)
+
+    Usage: python manage.py search_index_rebuild
+    """
+
+    help = 'Rebuilds the full-text search index (TextSearchIndex) of all Text objects'
+
+    def handle(self, *args, **options):
+        texts = models.Text.objects.all().select_related(
+            'collection',
+            'corpus',
+            'primary_language__script',
+            'type'
+        )
+        count = texts.count()
+        for i, text in enumerate(texts.iterator(), start=1):
+            text.search_index_update()
+            if i % 100 == 0 or i == count:
+                self.stdout.write(f'Indexed {i} of {count} texts')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from corpus import text_lines
+import random
+import time
+
+
+def synthetic_folio(rng, lines, tables):
+    """
+    Returns the HTML of a synthetic trans text field with the number of lines (in lists, with headings) and tables (each with a nested table),
+    using the markup of real fields, e.g. line values and ranges, image parts, tags, entities, and formatting
+    """
+    words = ['wheat', 'barley', 'dinar', 'dirham', 'witness', 'Balkh', 'Bamiyan', 'خراج', 'گندم', '&amp;', '&nbsp;', '&lt;sic&gt;']
+    parts = []
+    line_number = 0
+    blocks = max(tables, 1)
+    for block in range(blocks):
+        parts.append(f'<h1>Section {block + 1}</h1><ol>')
+        for _ in range(lines // blocks):
+            line_number += rng.choice([1, 1, 1, 2])
+            attrs = f' value="{line_number}"' if rng.random() < 0.3 else ''
+            if rng.random() < 0.5:
+                attrs += ' data-imagepartleft="{}" data-imageparttop="{}" data-imagepartwidth="{}" data-imagepartheight="{}"'.format(*[rng.randint(0, 900) for _ in range(4)])
+            text = ' '.join(rng.choice(words) for _ in range(rng.randint(3, 12)))
+            if rng.random() < 0.3:
+                text += f' <var data-textfoliotag="{rng.randint(1, 500)}">{rng.choice(words)}</var>'
+            if rng.random() < 0.2:
+                text = f'<strong>{text}</strong><br />'
+            parts.append(f'<li{attrs}>{text}</li>\n')
+        parts.append('</ol>\n')
+        if block < tables:
+            rows = ''.join(
+                '<tr>' + ''.join(f'<td>{rng.choice(words)} {rng.choice(words)}</td>' for _ in range(3)) + '<td>&nbsp;</td></tr>\n' for _ in range(5)
+            )
+            nested = f'<table><tbody><tr><td>{rng.choice(words)}</td><td><em>{rng.choice(words)}</em></td></tr></tbody></table>'
+            parts.append(f'<table border="1" cellpadding="1" style="width:500px"><tbody>{rows}<tr><td>{nested}</td><td></td></tr></tbody></table>\n')
+    return ''.join(parts)
+
+
+class Command(BaseCommand):
+    """
+    Compares the speed of the parsers of trans text fields (see corpus/text_lines.py) when building the lines of synthetic folios
+    (with thousands of lines and nested tables), and checks that both parsers give the same lines
+
+    Usage: python manage.py text_lines_benchmark [--folios 5] [--lines 2000] [--tables 20] [--repeat 3]
+    """
+
+    help = 'Compares the speed of the parsers of trans text fields when building the lines of synthetic folios'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--folios', type=int, default=5, help='Number of synthetic folios')
+        parser.add_argument('--lines', type=int, default=2000, help='Number of lines of each folio')
+        parser.add_argument('--tables', type=int, default=20, help='Number of tables (each with a nested table) of each folio')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of times to time each parser (the fastest time is reported)')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic folios')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        folios = [synthetic_folio(rng, options['lines'], options['tables']) for _ in range(options['folios'])]
+        size = sum(len(folio) for folio in folios)
+        self.stdout.write(f"{len(folios)} synthetic folios of {options['lines']} lines and {options['tables']} nested tables ({size / 1024:.0f} KB)")
+
+        times, results = {}, {}
+        for parser in text_lines.PARSERS:
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                results[parser] = [text_lines.text_lines(text_lines.parse(folio, parser), 'transcription', 1, False) for folio in folios]
+                elapsed = time.perf_counter() - start
+                times[parser] = min(times.get(parser, elapsed), elapsed)
+            self.stdout.write(f'{parser}: {times[parser] * 1000:.0f}ms ({times[parser] * 1000 / len(folios):.1f}ms per folio)')
+
+        if results['stream'] != results['beautifulsoup']:
+            raise CommandError('The parsers give different lines')
+        self.stdout.write(self.style.SUCCESS(f"Same lines from both parsers. stream is {times['beautifulsoup'] / times['stream']:.1f}x the speed of beautifulsoup"))
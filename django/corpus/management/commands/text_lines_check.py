@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from corpus import models, text_lines
+
+
+def lines_or_error(folio, field, parser):
+    """ Returns the lines of the folio's field parsed by the parser, or the type and message of the error it raises """
+    try:
+        return folio.trans_text_lines(getattr(folio, field), field, parser)
+    except Exception as e:
+        return ('error', type(e).__name__, str(e))
+
+
+class Command(BaseCommand):
+    """
+    Checks that the 'stream' parser of trans text fields (see corpus/text_lines.py) gives the same lines as the 'beautifulsoup' parser,
+    for every trans text field (transcription, translation, transliteration) of every TextFolio in the current database.
+    Also reports the fields the 'stream' parser doesn't support (which are parsed by BeautifulSoup instead).
+    Raises an error listing any fields whose lines differ
+
+    Usage: python manage.py text_lines_check
+    """
+
+    help = "Checks that the 'stream' parser of trans text fields gives the same lines as the 'beautifulsoup' parser"
+
+    def handle(self, *args, **options):
+        folios = models.TextFolio.objects.select_related('text__primary_language__script').only(
+            'id', 'text__primary_language__script__is_written_right_to_left', *models.TextFolio.text_lines_fields
+        )
+        count, unsupported, failures = 0, [], []
+        for folio in folios.iterator(chunk_size=500):
+            for field in models.TextFolio.text_lines_fields:
+                value = getattr(folio, field)
+                if value:
+                    try:
+                        text_lines.stream_parse(value)
+                    except text_lines.StreamParseUnsupported as e:
+                        unsupported.append(f'TextFolio {folio.id} {field}: {e}')
+                if lines_or_error(folio, field, 'beautifulsoup') != lines_or_error(folio, field, 'stream'):
+                    failures.append(f'TextFolio {folio.id} {field}')
+                count += 1
+
+        for description in unsupported:
+            self.stdout.write(self.style.WARNING(f'Not supported by the stream parser (parsed by BeautifulSoup): {description}'))
+        if failures:
+            raise CommandError(f'{len(failures)} of {count} fields have different lines:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(f'All {count} fields have the same lines ({len(unsupported)} parsed by BeautifulSoup)'))
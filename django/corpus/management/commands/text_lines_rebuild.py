@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from corpus import models
+
+
+class Command(BaseCommand):
+    """
+    Sets the stored lines (e.g. TextFolio.transcription_lines) of all TextFolio objects whose lines
+    aren't stored in the current format (see TextFolio.text_lines_format_current)
+    Run this after first deploying the stored lines and after every change to the format (i.e. to TextFolio.trans_text_lines())
+
+    Usage: python manage.py text_lines_rebuild
+    Options:
+        --all (set the stored lines of all TextFolio objects, even if stored in the current format)
+    """
+
+    help = 'Sets the stored lines of all TextFolio objects whose lines are not stored in the current format'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Set the stored lines of all TextFolio objects')
+
+    def handle(self, *args, **options):
+        folios = models.TextFolio.objects.all()
+        if not options['all']:
+            current_format = models.TextFolio.text_lines_format_current
+            folios = folios.filter(Q(text_lines_format__isnull=True) | ~Q(text_lines_format=current_format))
+        count = models.TextFolio.text_lines_update(folios)
+        self.stdout.write(self.style.SUCCESS(f'Stored lines set for {count} folios'))
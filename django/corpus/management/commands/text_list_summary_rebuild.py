@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from corpus import models, versions
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the TextListSummary (the data shown on the Text list page) of all Text objects
+    Run this after first deploying TextListSummary, or if it gets out of sync
+    (e.g. after the images of codex Texts change, which doesn't save the Text)
+
+    Usage: python manage.py text_list_summary_rebuild
+    """
+
+    help = 'Rebuilds the TextListSummary (the data shown on the Text list page) of all Text objects'
+
+    def handle(self, *args, **options):
+        text_ids = list(models.Text.objects.values_list('id', flat=True))
+        count = len(text_ids)
+        for i, text_id in enumerate(text_ids, start=1):
+            models.TextListSummary.update_text(text_id)
+            versions.version_bump(versions.text_version_name(text_id))  # so its cached list item is updated
+            if i % 100 == 0 or i == count:
+                self.stdout.write(f'Updated {i} of {count} texts')
+        self.stdout.write(self.style.SUCCESS('Text list summaries rebuilt'))
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# SQLite: FTS5 virtual tables that index the content of corpus_textsearchindex (external content tables),
+# kept in sync via triggers. 'trigram' supports substring matching (general search) and
+# 'words' supports whole word matching (exact search)
+SQLITE_FTS_TABLES = {
+    'corpus_textsearchindex_trigram': 'trigram',
+    'corpus_textsearchindex_words': 'unicode61 remove_diacritics 0',
+}
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Creates the database specific full-text search structures for TextSearchIndex
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for table, tokenizer in SQLITE_FTS_TABLES.items():
+            schema_editor.execute(f"CREATE VIRTUAL TABLE {table} USING fts5(content, content='corpus_textsearchindex', content_rowid='id', tokenize='{tokenizer}')")
+            schema_editor.execute(f"CREATE TRIGGER {table}_ai AFTER INSERT ON corpus_textsearchindex BEGIN INSERT INTO {table}(rowid, content) VALUES (new.id, new.content); END")
+            schema_editor.execute(f"CREATE TRIGGER {table}_ad AFTER DELETE ON corpus_textsearchindex BEGIN INSERT INTO {table}({table}, rowid, content) VALUES ('delete', old.id, old.content); END")
+            schema_editor.execute(f"CREATE TRIGGER {table}_au AFTER UPDATE ON corpus_textsearchindex BEGIN INSERT INTO {table}({table}, rowid, content) VALUES ('delete', old.id, old.content); INSERT INTO {table}(rowid, content) VALUES (new.id, new.content); END")
+    elif vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        # General search (icontains, i.e. UPPER(content) LIKE UPPER(...))
+        schema_editor.execute("CREATE INDEX corpus_textsearchindex_trigram ON corpus_textsearchindex USING gin (UPPER(content) gin_trgm_ops)")
+        # Exact search (whole words)
+        schema_editor.execute("CREATE INDEX corpus_textsearchindex_words ON corpus_textsearchindex USING gin (to_tsvector('simple', content))")
+
+
+def delete_search_index(apps, schema_editor):
+    """
+    Reverses create_search_index()
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for table in SQLITE_FTS_TABLES:
+            for trigger in ['ai', 'ad', 'au']:
+                schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_{trigger}")
+            schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS corpus_textsearchindex_trigram")
+        schema_editor.execute("DROP INDEX IF EXISTS corpus_textsearchindex_words")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corpus', '0010_text_gregorian_date_sort'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextSearchIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(db_index=True, max_length=255)),
+                ('content', models.TextField()),
+                ('text', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_index', to='corpus.text')),
+                ('text_folio', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_index', to='corpus.textfolio')),
+            ],
+            options={
+                'verbose_name_plural': 'text search index',
+            },
+        ),
+        migrations.RunPython(create_search_index, delete_search_index),
+    ]
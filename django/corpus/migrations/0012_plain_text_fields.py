@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corpus', '0011_textsearchindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='text',
+            name='summary_of_content_plain',
+            field=models.TextField(blank=True, editable=False, help_text='Plain text version of summary_of_content, set automatically on save', null=True),
+        ),
+        migrations.AddField(
+            model_name='textfolio',
+            name='palaeography_plain',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='textfolio',
+            name='transcription_plain',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='textfolio',
+            name='translation_plain',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='textfolio',
+            name='transliteration_plain',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+    ]
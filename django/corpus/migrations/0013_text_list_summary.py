@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corpus', '0012_plain_text_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextListSummary',
+            fields=[
+                ('text', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='list_summary', serialize=False, to='corpus.text')),
+                ('has_transcription', models.BooleanField(default=False)),
+                ('has_translation', models.BooleanField(default=False)),
+                ('has_transliteration', models.BooleanField(default=False)),
+                ('tags', models.JSONField(blank=True, default=list, help_text='A list of the tags of all folios, as {"id": ..., "name": ...}')),
+                ('list_image_url', models.CharField(blank=True, max_length=2000, null=True)),
+                ('summary_of_content_preview', models.TextField(blank=True, null=True)),
+                ('gregorian_date_listview', models.CharField(blank=True, max_length=1000, null=True)),
+                ('count_text_folios', models.PositiveIntegerField(default=0)),
+                ('count_seals', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'text list summaries',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corpus', '0013_text_list_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IIIFManifest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=2000, unique=True)),
+                ('images', models.JSONField(blank=True, help_text='A list of the images of the manifest, as {"image_thumbnail": ..., "image_large": ..., "image_full": ...}', null=True)),
+                ('fetched', models.DateTimeField(blank=True, help_text='When the manifest was last fetched (successfully or not)', null=True)),
+                ('fetch_error', models.TextField(blank=True, null=True)),
+                ('fetch_started', models.DateTimeField(blank=True, help_text='When the fetch in progress (if any) started', null=True)),
+            ],
+            options={
+                'verbose_name': 'IIIF manifest',
+            },
+        ),
+    ]
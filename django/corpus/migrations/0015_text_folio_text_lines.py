@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corpus', '0014_iiif_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='textfolio',
+            name='text_lines_format',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='textfolio',
+            name='text_lines_rtl',
+            field=models.BooleanField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='textfolio',
+            name='transcription_lines',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='textfolio',
+            name='translation_lines',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='textfolio',
+            name='transliteration_lines',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
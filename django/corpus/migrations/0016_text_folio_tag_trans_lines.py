@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corpus', '0015_text_folio_text_lines'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='textfoliotag',
+            name='trans_lines',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
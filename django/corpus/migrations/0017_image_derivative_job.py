@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corpus', '0016_text_folio_tag_trans_lines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivativeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(help_text='The model of the object, e.g. "textfolio"', max_length=100)),
+                ('object_id', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, help_text='The error of the last failed attempt', null=True)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, help_text="The job isn't processed before this time (e.g. before retrying)")),
+                ('started', models.DateTimeField(blank=True, help_text='When the running attempt (if any) started', null=True)),
+                ('generation', models.PositiveIntegerField(default=0, help_text='Increased when the job is added again (e.g. the image changed while running)')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='corpus_imag_status_d0389c_idx')],
+                'constraints': [models.UniqueConstraint(fields=('model_name', 'object_id'), name='unique_image_derivative_job')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:33
+
+from django.db import migrations, models
+
+
+def tags_to_ids(apps, schema_editor):
+    """ Replace the tags of each TextListSummary ({"id": ..., "name": ...}) with their ids """
+    TextListSummary = apps.get_model('corpus', 'TextListSummary')
+    for summary in TextListSummary.objects.all().only('text', 'tags'):
+        summary.tags = [tag['id'] if isinstance(tag, dict) else tag for tag in summary.tags]
+        summary.save(update_fields=['tags'])
+
+
+def ids_to_tags(apps, schema_editor):
+    """ Replace the tag ids of each TextListSummary with {"id": ..., "name": ...} (reverses tags_to_ids()) """
+    TextListSummary = apps.get_model('corpus', 'TextListSummary')
+    tag_names = dict(apps.get_model('corpus', 'SlTextFolioTag').objects.values_list('id', 'name'))
+    for summary in TextListSummary.objects.all().only('text', 'tags'):
+        summary.tags = [{'id': tag_id, 'name': tag_names.get(tag_id)} for tag_id in summary.tags]
+        summary.save(update_fields=['tags'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corpus', '0017_image_derivative_job'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='textlistsummary',
+            name='tags',
+            field=models.JSONField(blank=True, default=list, help_text='A list of the ids of the tags of all folios'),
+        ),
+        migrations.RunPython(tags_to_ids, ids_to_tags),
+    ]
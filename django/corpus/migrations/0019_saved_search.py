@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corpus', '0018_text_list_summary_tag_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('token', models.CharField(max_length=16, primary_key=True, serialize=False)),
+                ('params', models.JSONField(help_text='A list of the URL params of the search, as [key, value]')),
+                ('expires', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'saved searches',
+            },
+        ),
+    ]
@@ -1,7 +1,10 @@
+from django.apps import apps
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from ckeditor_uploader.fields import RichTextUploadingField
 from django.utils.html import mark_safe
+from django.utils.functional import cached_property
+from django.utils import timezone
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
 from PIL import Image, ImageOps
@@ -9,21 +12,28 @@ from django.core.files import File
 from io import BytesIO
 from django.db.models.functions import Upper
 from account.models import User
+from .codex_manifests import codex_manifest
+from . import text_lines
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.urls import reverse
-from bs4 import BeautifulSoup
 from unidecode import unidecode
 import os
+import html
 import textwrap
 import re
-import json
 import requests
+import datetime
 
 
-# Three main sections:
+# Seven main sections:
 # 1. Reusable code
 # 2. Select List Models
 # 3. Main models
+# 4. Search index
+# 5. List summary
+# 6. IIIF manifests
+# 7. Image derivative jobs
+# 8. Saved searches
 
 
 #
@@ -31,17 +41,41 @@ import requests
 #
 
 date_help_text = 'Format: "YYYY-MM-DD" - e.g. "0608-01-31". Please ensure years before 1000 are 4 digits long using 0s at start, e.g. 0608 not 608, 0056 not 56, etc.'
-CLEANR = re.compile('<.*?>|&([a-z0-9]+|#[0-9]{1,6}|#x[0-9a-f]{1,6});')
+HTML_LINE_END = re.compile(r'</(li|p|h[1-6]|tr|div|table|ol|ul)>|<br\s*/?>', re.IGNORECASE)
+HTML_CELL_END = re.compile(r'</t[dh]>', re.IGNORECASE)
+HTML_TAG = re.compile(r'<[^>]*>')
 
 
-def clean_html(raw_html):
+def html_to_plain_text(raw_html):
     """
-    Removes HTML tags from provided raw_html, e.g. <strong>Example</strong> --> Example
+    Converts rich text HTML (e.g. from a RichTextUploadingField) to plain text,
+    e.g. '<ol><li>A <var data-textfoliotag="1">tag</var> &amp; more</li><li>Line 2</li></ol>' --> 'A tag & more\nLine 2'
+        - lines (e.g. <li>, <p>, <h1>, <br>, table rows) are put on separate lines and table cells are separated by a tab
+        - all tags are removed, including <var data-textfoliotag> wrappers (keeping their content)
+        - entities are decoded (e.g. &amp; --> &, &nbsp; --> ' ')
+    Returns None if raw_html is empty
     """
-    # Manual replacements
-    raw_html = raw_html.replace('&rsquo;', "'").replace('&lsquo;', "'").replace('&nbsp;', ' ')
-    # Regex to strip out remaining HTML
-    return re.sub(CLEANR, '', raw_html) if raw_html else None
+    if raw_html:
+        text = re.sub(HTML_LINE_END, '\n', raw_html)
+        text = re.sub(HTML_CELL_END, '\t', text)
+        text = html.unescape(re.sub(HTML_TAG, '', text)).replace('\xa0', ' ')
+        lines = [' '.join(line.split()) for line in text.split('\n')]
+        return '\n'.join(line for line in lines if line) or None
+
+
+def set_plain_text_fields(obj):
+    """ Set the value of the object's plain text fields (e.g. TextFolio.transcription_plain) from their rich text fields (see plain_text_fields) """
+    for field in obj.plain_text_fields:
+        setattr(obj, f'{field}_plain', html_to_plain_text(getattr(obj, field)))
+
+
+def rich_text_fields(model):
+    """
+    Returns the names of the rich text fields of the model (e.g. TextFolio.transcription) and of their plain text copies
+    (e.g. TextFolio.transcription_plain), which can be large, e.g. to defer() them when they aren't needed
+    """
+    fields = [field.name for field in model._meta.get_fields() if isinstance(field, RichTextUploadingField)]
+    return fields + [f'{field}_plain' for field in getattr(model, 'plain_text_fields', [])]
 
 
 class SlAbstract(models.Model):
@@ -103,6 +137,53 @@ def image_compress(image_field_original, image_field_compressed, image_size):
         return None
 
 
+def image_derivatives_missing(obj):
+    """ Returns True if an object (e.g. a TextFolio) has an image without all of its smaller versions (see image_derivative_sizes) """
+    return bool(obj.image) and not all(getattr(obj, field) for field in obj.image_derivative_sizes)
+
+
+def image_derivatives_error(obj):
+    """
+    Returns the error of the job of an object whose image is missing smaller versions, if the job has failed
+    (i.e. after IMAGE_DERIVATIVE_JOB_ATTEMPTS, see ImageDerivativeJob), otherwise None
+    """
+    if not image_derivatives_missing(obj):
+        return None
+    return ImageDerivativeJob.objects.filter(
+        model_name=obj._meta.model_name, object_id=obj.id, status=ImageDerivativeJob.STATUS_FAILED
+    ).values_list('error', flat=True).first()
+
+
+def image_derivatives_save(obj, image_name_old):
+    """
+    Called after saving an object with smaller versions of its image (see image_derivative_sizes, e.g. TextFolio),
+    where image_name_old is the name of its image before saving
+
+    If the image has changed, deletes the smaller versions of the previous image and adds a job to create those of the new image
+    in the background (see ImageDerivativeJob), rather than creating them while saving (which can take many seconds)
+    A job is also added for an image that's missing smaller versions (e.g. saved before jobs existed), if it doesn't have one yet
+    """
+    fields = list(obj.image_derivative_sizes)
+    if (obj.image.name or '') != (image_name_old or ''):
+        for field in fields:
+            if getattr(obj, field):
+                getattr(obj, field).delete(save=False)
+        type(obj).objects.filter(id=obj.id).update(**{field: None for field in fields})
+        if obj.image:
+            ImageDerivativeJob.enqueue(obj, reset=True)
+        else:
+            ImageDerivativeJob.objects.filter(model_name=obj._meta.model_name, object_id=obj.id).delete()
+    elif image_derivatives_missing(obj):
+        ImageDerivativeJob.enqueue(obj, reset=False)
+
+
+def image_derivatives_create(obj):
+    """ Creates and stores the smaller versions of the image of an object (see image_derivative_sizes, e.g. TextFolio) """
+    type(obj).objects.filter(id=obj.id).update(**{
+        field: image_compress(obj.image, getattr(obj, field), size) for field, size in obj.image_derivative_sizes.items()
+    })
+
+
 def image_is_wider_than_tall(image_field):
     """
     Takes in a Django image_field
@@ -274,6 +355,13 @@ class SlTextScript(SlAbstract):
     """
     is_written_right_to_left = models.BooleanField(default=False)
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        # The stored lines of transcriptions depend on the direction of the script (a new script isn't used by any Text yet)
+        if not adding:
+            TextFolio.text_lines_rtl_update(TextFolio.objects.all())
+
 
 class SlTextLanguage(SlAbstract):
     """
@@ -288,6 +376,13 @@ class SlTextLanguage(SlAbstract):
         else:
             return self.name
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        # The stored lines of transcriptions depend on the direction of the script of the language (a new language isn't used by any Text yet)
+        if not adding:
+            TextFolio.text_lines_rtl_update(TextFolio.objects.all())
+
 
 class SlTranslationLanguage(SlAbstract):
     """
@@ -510,6 +605,7 @@ class Text(models.Model):
 
     # Content
     summary_of_content = RichTextUploadingField(blank=True, null=True)
+    summary_of_content_plain = models.TextField(blank=True, null=True, editable=False, help_text='Plain text version of summary_of_content, set automatically on save')
 
     # Codex
     codex_images_location = models.TextField(
@@ -769,8 +865,8 @@ class Text(models.Model):
 
     @property
     def summary_of_content_preview(self):
-        if self.summary_of_content:
-            return clean_html(textwrap.shorten(self.summary_of_content, width=350, placeholder="..."))
+        if self.summary_of_content_plain:
+            return textwrap.shorten(self.summary_of_content_plain, width=350, placeholder="...")
 
     @property
     def list_image_url(self):
@@ -781,7 +877,7 @@ class Text(models.Model):
             # If text has folios, return the first image
             for folio in self.text_folios.all():
                 if folio.image and not folio.image_hide:
-                    return folio.image_small.url
+                    return folio.image_small.url if folio.image_small else None
 
     @property
     def details_html_dates(self):
@@ -927,50 +1023,80 @@ class Text(models.Model):
     def codex_images(self):
         if self.is_codex:
             if self.is_codex_iiif:
-                try:
-                    response = requests.get(self.codex_images_location)
-                    # Raise an HTTPError for bad responses (4xx or 5xx)
-                    response.raise_for_status()
-                    images = []
-                    for canvas in response.json()['sequences'][0]['canvases']:
-                        image_url = canvas['images'][0]['resource']['@id']
-                        image_full_url = f"{image_url}/full/max/0/default.jpg"
-                        images.append({
-                            'image_thumbnail': image_full_url.replace('max', '60,'),
-                            'image_large': image_full_url.replace('max', '1500,'),
-                            'image_full': image_full_url
-                        })
-                    return images
-                except requests.exceptions.RequestException as e:
-                    print(f"Error fetching data: {e}")
-                    return None
-                except json.JSONDecodeError as e:
-                    print(f"Error decoding JSON: {e}")
-                    return None
+                # Read from the persisted manifest cache, rather than fetching the manifest on every request
+                return IIIFManifest.get_images(self.codex_images_location)
             else:
-                codex_images_files = [file for file in os.listdir(self.codex_images_dir) if file.lower().endswith(".jpg") and '_thumbnail.' not in file.lower()]
-                codex_images_files.sort()
-                return codex_images_files
+                # Read from the manifest of the directory, rather than listing the directory on every request
+                images = codex_manifest(self.codex_images_dir)
+                if images is not None:
+                    return [image['file'] for image in images]
 
     @property
     def codex_default_image_thumbnail_url(self):
-        # Default image thumbnail from IIIF
-        if self.is_codex_iiif:
-            return self.codex_images[0]['image_thumbnail']
-        # Default image thumbnail from locally stored images
-        elif self.codex_images_thumbnails_url and self.codex_images:
-            return self.codex_images_thumbnails_url + self.codex_images[0]
+        codex_images = self.codex_images
+        if codex_images:
+            # Default image thumbnail from IIIF
+            if self.is_codex_iiif:
+                return codex_images[0]['image_thumbnail']
+            # Default image thumbnail from locally stored images
+            elif self.codex_images_thumbnails_url:
+                return self.codex_images_thumbnails_url + codex_images[0]
+
+    @property
+    def is_written_right_to_left(self):
+        script = self.primary_language.script
+        return bool(script and script.is_written_right_to_left)
 
     @property
     def title(self):
         return f"{self.collection}: {self.shelfmark}"
 
+    def search_index_update(self):
+        """
+        Replaces this Text's rows in TextSearchIndex with the current (HTML-stripped) content
+        of each searchable field, so that the database's full-text index stays in sync.
+        Called when saving this Text, its TextFolio objects, and their TextFolioTag objects.
+        """
+        # Fields of this Text, as (field name, value)
+        fields = [
+            ('shelfmark', self.shelfmark),
+            ('collection', self.collection.name if self.collection_id else None),
+            ('corpus', self.corpus.name if self.corpus_id else None),
+            ('primary_language', self.primary_language.name if self.primary_language_id else None),
+            ('primary_language_script', self.primary_language.script.name if self.primary_language_id and self.primary_language.script else None),
+            ('type', self.type.name if self.type_id else None),
+            ('summary_of_content', self.summary_of_content_plain),
+        ]
+        entries = [TextSearchIndex(text=self, field=field, content=value) for field, value in fields if value]
+        # Fields of each TextFolio in this Text
+        for folio in self.text_folios.all().prefetch_related('text_folio_tags__tag'):
+            folio_fields = [
+                ('transcription', folio.transcription_plain),
+                ('translation', folio.translation_plain),
+                ('transliteration', folio.transliteration_plain),
+                ('tags', '\n'.join(dict.fromkeys(t.tag.name for t in folio.text_folio_tags.all()))),
+            ]
+            entries += [TextSearchIndex(text=self, text_folio=folio, field=field, content=value) for field, value in folio_fields if value]
+
+        with transaction.atomic():
+            TextSearchIndex.objects.filter(text=self).delete()
+            TextSearchIndex.objects.bulk_create(entries)
+
     def get_absolute_url(self):
         return reverse('corpus:text-detail', args=[str(self.id)])
 
     def __str__(self):
         return self.title
 
+    plain_text_fields = ['summary_of_content']
+
+    def save(self, *args, **kwargs):
+        set_plain_text_fields(self)
+        super().save(*args, **kwargs)
+        self.search_index_update()
+        # The stored lines of transcriptions depend on the direction of the primary language's script
+        TextFolio.text_lines_rtl_update(self.text_folios.all())
+
     class Meta:
         verbose_name = 'Corpus Text'
 
@@ -1108,159 +1234,128 @@ Please note that the heading text must appear outside of a list and not as a num
 
     palaeography = RichTextUploadingField(blank=True, null=True, help_text='<br>Optional. Only relevant to some texts.')
 
-    def trans_text_lines(self, text_field, field_name):
+    # Plain text versions of the above rich text fields, set automatically on save (see set_plain_text_fields())
+    transcription_plain = models.TextField(blank=True, null=True, editable=False)
+    translation_plain = models.TextField(blank=True, null=True, editable=False)
+    transliteration_plain = models.TextField(blank=True, null=True, editable=False)
+    palaeography_plain = models.TextField(blank=True, null=True, editable=False)
+
+    plain_text_fields = ['transcription', 'translation', 'transliteration', 'palaeography']
+
+    # Lines of the trans text fields (see trans_text_lines()), set automatically on save (see set_text_lines())
+    # so the detail page and Word exports don't parse the HTML of each field on every request
+    transcription_lines = models.JSONField(blank=True, null=True, editable=False)
+    translation_lines = models.JSONField(blank=True, null=True, editable=False)
+    transliteration_lines = models.JSONField(blank=True, null=True, editable=False)
+    text_lines_format = models.PositiveSmallIntegerField(blank=True, null=True, editable=False)
+    text_lines_rtl = models.BooleanField(blank=True, null=True, editable=False)
+
+    text_lines_fields = ['transcription', 'translation', 'transliteration']
+    text_lines_update_fields = ['transcription_lines', 'translation_lines', 'transliteration_lines', 'text_lines_format', 'text_lines_rtl']
+    # The format of the stored lines. Increase this whenever trans_text_lines() changes
+    # then run: python manage.py text_lines_rebuild (until then, lines of an older format are parsed when read)
+    text_lines_format_current = 2
+
+    def trans_text_lines(self, text_field, field_name, parser=None):
         """
         Takes the specified trans text field (e.g. one of transcription, translation, transliteration)
         and generates a list of dictionaries containing data about each line that's necessary
-        to generate the HTML to display on the public interface
+        to generate the HTML to display on the public interface (see text_lines.py)
+
+        The HTML is parsed by the named parser (see text_lines.PARSERS), by default the TEXT_LINES_PARSER setting
 
-        Each of these fields should have a related property that calls this method like so:
+        The lines of each of these fields are stored on save (see set_text_lines()) and read by a related property like so:
         @property
         def transcription_text_lines(self):
-            return self.trans_text_lines(self.transcription, 'transcription')
+            return self.text_lines('transcription')
         """
 
         # Ensure the text field includes a HTML ordered list with items or a table
-        if (('<ol' in text_field and '</li>' in text_field) or '<table' in text_field or '<h1' in text_field) and field_name in ['transcription', 'translation', 'transliteration']:
-            lines_data = []
-            soup = BeautifulSoup(text_field, features="html.parser")
-            lines = soup.find_all(['li', 'table', 'h1'])
-            rtl = self.text.primary_language.script.is_written_right_to_left and field_name == 'transcription'
-            line_number = 0
-            line_index = -1
-
+        if text_field and (('<ol' in text_field and '</li>' in text_field) or '<table' in text_field or '<h1' in text_field) and field_name in ['transcription', 'translation', 'transliteration']:
+            rtl = self.text.is_written_right_to_left and field_name == 'transcription'
+            lines = text_lines.text_lines(text_lines.parse(text_field, parser), field_name, self.id, rtl)
+            # The plain text of each line, stored with the lines for the Word export (see trans_text_lines_str())
             for line in lines:
-                # Lines that are <li> elements (aka list items in a <ol> element, aka standard lines of text)
-                if str(line).startswith('<li'):
-                    # Increase the line index for each line
-                    line_index += 1
-                    # Line number
-                    try:
-                        line_number = int(line.attrs['value'])
-                    except KeyError:
-                        line_number += 1
-                    # Line number range end
-                    line_number_range_end = None
-                    try:
-                        # If the next line has a value attribute that's greater than 1 more than current line count then
-                        next_line_number = int(lines[line_index + 1].attrs['value'])
-                        if line_number < (next_line_number - 1):
-                            line_number_range_end = next_line_number - 1
-                    except (IndexError, KeyError):
-                        try:
-                            # Try getting the current line's 'data-range-end' attribute (valid if this is the last line)
-                            line_number_range_end = int(line.attrs['data-range-end'])
-                        except KeyError:
-                            line_number_range_end = None
-                    # Line number label
-                    line_number_label = f'{line_number}-{line_number_range_end}' if line_number_range_end else str(line_number)
-                    # Line numbers (e.g. if line number label is 4-6 then line numbers is 4,5,6)
-                    line_numbers = ','.join([str(ln) for ln in range(line_number, line_number_range_end + 1)]) if line_number_range_end else line_number
-
-                    # Image part data
-                    try:
-                        # Get attr values from line li element
-                        image_part_left = line.attrs['data-imagepartleft']
-                        image_part_top = line.attrs['data-imageparttop']
-                        image_part_width = line.attrs['data-imagepartwidth']
-                        image_part_height = line.attrs['data-imagepartheight']
-
-                        # Build new attributes to add to new line div element (if provided)
-                        image_part_left_attr = f' data-imagepartleft={image_part_left}' if image_part_left else ''
-                        image_part_top_attr = f' data-imageparttop={image_part_top}' if image_part_top else ''
-                        image_part_width_attr = f' data-imagepartwidth={image_part_width}' if image_part_width else ''
-                        image_part_height_attr = f' data-imagepartheight={image_part_height}' if image_part_height else ''
-                    except KeyError:
-                        # Set empty attributes
-                        image_part_left_attr = ''
-                        image_part_top_attr = ''
-                        image_part_width_attr = ''
-                        image_part_height_attr = ''
-
-                    # Build dict for this line and add to list of lines data
-                    lines_data.append({
-                        'lineNumbers': line_numbers,
-                        'lineIndex': line_index,
-                        'trans': field_name,
-                        'folio': self.id,
-                        'image_part_left_attr': image_part_left_attr,
-                        'image_part_top_attr': image_part_top_attr,
-                        'image_part_width_attr': image_part_width_attr,
-                        'image_part_height_attr': image_part_height_attr,
-                        'lineNumberLabel': line_number_label,
-                        'rtl': rtl,
-                        'text': "".join([str(t) for t in line.contents])
-                    })
-
-                # Lines that are a <table> element (e.g. witness tables, etc.)
-                elif str(line).startswith('<table'):
-                    # Process all <td> elements in table
-                    for td in line.find_all('td'):
-                        # Increase the line index for each td, as each td is considered a 'line'
-                        # (i.e. can draw each td on an image and highlight each td on hover)
-                        line_index += 1
-                        # If the cell has a valid value (is not empty)
-                        if len(td.text.strip()):
-                            # Assign
-                            td['class'] = 'folio-lines-line'
-                            td['dir'] = 'auto'
-                            td['data-linenumbers'] = ''
-                            td['data-lineindex'] = line_index
-                            td['data-trans'] = field_name
-                            td['data-folio'] = self.id
-                        # Ignore empty cells
-                        else:
-                            td['class'] = 'empty'
-                    # Add a new td containing the line number at the start of each row
-                    tr_number = 0
-                    for tr_index, tr in enumerate(line.find_all('tr')):
-                        line_number_td = soup.new_tag('td', **{'class': 'line-number', 'dir': f'{"rtl" if rtl else "auto"}'})
-                        # Line number: if this <table> is first element in whole trans text
-                        if len(lines_data) == 0:
-                            tr_number = 1 + tr_index
-                        # Line number: if previous item in lines_data is a <li>
-                        elif 'lineNumbers' in lines_data[-1]:
-                            tr_number = int(str(lines_data[-1]['lineNumbers']).split(',')[-1]) + 1 + tr_index
-                        # Line number: all other cases (e.g. if previous item in lines_data is another table)
-                        else:
-                            tr_number += 1
-                        line_number_td.string = str(tr_number)
-                        tr.insert(0, line_number_td)
-
-                    # Build the html for the table and add it to lines_data
-                    table_html = f'<table class="folio-table{(" rtl" if rtl else "")}">{"".join([str(tag) for tag in line])}</table>'
-
-                    # Add related lines
-                    if field_name != 'transcription':
-                        table_html += '<div class="related-lines" data-trans="transcription"></div>'
-                    if field_name != 'translation':
-                        table_html += '<div class="related-lines" data-trans="translation"></div>'
-                    if field_name != 'transliteration':
-                        table_html += '<div class="related-lines" data-trans="transliteration"></div>'
-
-                    lines_data.append({'table': table_html})
-
-                # Lines that are a <h1> element (e.g. subtitles)
-                elif str(line).startswith('<h1'):
-                    lines_data.append({'h1': str(line)})
-
-            return lines_data
+                if 'text' in line:
+                    line['textPlain'] = html_to_plain_text(line['text'])
+            return lines
+
+    def text_lines(self, field_name):
+        """ Returns the lines of the trans text field (see trans_text_lines()) as stored on save, or parsed if stored in an older format """
+        if self.text_lines_format == self.text_lines_format_current:
+            return getattr(self, f'{field_name}_lines')
+        return self.trans_text_lines(getattr(self, field_name), field_name)
 
     @property
     def transliteration_text_lines(self):
-        return self.trans_text_lines(self.transliteration, 'transliteration')
+        return self.text_lines('transliteration')
 
     @property
     def transcription_text_lines(self):
-        return self.trans_text_lines(self.transcription, 'transcription')
+        return self.text_lines('transcription')
 
     @property
     def translation_text_lines(self):
-        return self.trans_text_lines(self.translation, 'translation')
+        return self.text_lines('translation')
+
+    def set_text_lines(self):
+        """ Set the value of this object's stored lines (e.g. transcription_lines) from their trans text fields """
+        for field in self.text_lines_fields:
+            setattr(self, f'{field}_lines', self.trans_text_lines(getattr(self, field), field))
+        self.text_lines_format = self.text_lines_format_current
+        self.text_lines_rtl = self.text.is_written_right_to_left
+
+    @classmethod
+    def text_lines_update(cls, folios, batch_size=500):
+        """
+        Sets the stored lines of each TextFolio in the queryset, using bulk_update() rather than save()
+        to avoid reprocessing images and re-indexing Texts. Returns the number of TextFolio objects updated
+        """
+        folios = folios.select_related('text__primary_language__script').defer(*[f'text__{field}' for field in rich_text_fields(Text)])
+        batch, count = [], 0
+        for folio in folios.iterator(chunk_size=batch_size):
+            folio.set_text_lines()
+            folio.text_folio_tags_update()
+            batch.append(folio)
+            if len(batch) == batch_size:
+                cls.objects.bulk_update(batch, cls.text_lines_update_fields)
+                count, batch = count + len(batch), []
+        if batch:
+            cls.objects.bulk_update(batch, cls.text_lines_update_fields)
+            count += len(batch)
+        return count
+
+    def text_folio_tags_trans_lines(self):
+        """
+        Returns the trans text fields that link to each TextFolioTag (see TextFolioTagCreateView),
+        and the indexes of their lines that link to it, as {TextFolioTag id: {field: [line indexes]}}
+        """
+        tags_trans_lines = {}
+        for field in self.text_lines_fields:
+            for tag_id, line_indexes in text_lines.text_folio_tags_lines(getattr(self, field), getattr(self, f'{field}_lines')).items():
+                tags_trans_lines.setdefault(tag_id, {})[field] = line_indexes
+        return tags_trans_lines
+
+    def text_folio_tags_update(self):
+        """ Set the trans_lines of each TextFolioTag of this object (see TextFolioTag.trans_lines), updating those that have changed """
+        tags_trans_lines = self.text_folio_tags_trans_lines()
+        tags = []
+        for tag in self.text_folio_tags.only('id', 'trans_lines'):
+            trans_lines = tags_trans_lines.get(tag.id, {})
+            if tag.trans_lines != trans_lines:
+                tag.trans_lines = trans_lines
+                tags.append(tag)
+        TextFolioTag.objects.bulk_update(tags, ['trans_lines'])
+
+    @classmethod
+    def text_lines_rtl_update(cls, folios):
+        """ Sets the stored lines of each TextFolio in the queryset whose Text's script direction has changed since they were stored """
+        rtl = models.functions.Coalesce('text__primary_language__script__is_written_right_to_left', False)
+        return cls.text_lines_update(folios.alias(rtl=rtl).exclude(text_lines_rtl=models.F('rtl')))
 
     def trans_text_lines_str(self, trans_text_lines):
         if trans_text_lines:
-            return f"[{self.name_short}]\n" + "\n".join([f"{lne['lineNumbers']}: {lne['text']}" for lne in trans_text_lines if 'lineNumbers' in lne]) + "\n"
+            return f"[{self.name_short}]\n" + "\n".join([f"{lne['lineNumbers']}: {lne['textPlain'] or ''}" for lne in trans_text_lines if 'lineNumbers' in lne]) + "\n"
         else:
             return '-'
 
@@ -1286,8 +1381,25 @@ Please note that the heading text must appear outside of a list and not as a num
     def image_is_wider_than_tall(self):
         return image_is_wider_than_tall(self.image)
 
+    # Sizes (maximum width/height in pixels) of the smaller versions of the image, created in the background (see ImageDerivativeJob)
+    image_derivative_sizes = {'image_small': 640, 'image_medium': 1920, 'image_large': 5000}
+
+    @cached_property
+    def image_processing_error(self):
+        """ The error of the job that failed to create the smaller versions of the image (see ImageDerivativeJob), if any """
+        return image_derivatives_error(self)
+
+    @property
+    def image_is_processing(self):
+        """ Whether the smaller versions of the image are still being created (see ImageDerivativeJob) """
+        return image_derivatives_missing(self) and not self.image_processing_error
+
     @property
     def image_preview(self):
+        if self.image_processing_error:
+            return f'The smaller versions of this image could not be created: {self.image_processing_error}'
+        if self.image_is_processing:
+            return 'The smaller versions of this image are being created. Please check back soon.'
         return mark_safe(f'<img src="{self.image_small.url}" alt="image of this folio" />')
 
     @property
@@ -1298,19 +1410,22 @@ Please note that the heading text must appear outside of a list and not as a num
         return f'{self.text}: Folio ({self.name_short})'
 
     def save(self, *args, **kwargs):
+        set_plain_text_fields(self)
+        image_name_old = TextFolio.objects.filter(id=self.id).values_list('image', flat=True).first() if self.id else None
         # Must save now, so image is saved before working with it
         super().save(*args, **kwargs)
 
-        # Create small, medium, and large versions of the original image
-        # Update the object (must use update() not save() to avoid unique ID error)
-        try:
-            TextFolio.objects.filter(id=self.id).update(
-                image_small=image_compress(self.image, self.image_small, 640),
-                image_medium=image_compress(self.image, self.image_medium, 1920),
-                image_large=image_compress(self.image, self.image_large, 5000)
-            )
-        except FileNotFoundError as f:
-            print(f)
+        # Create small, medium, and large versions of the original image in the background, if it has changed
+        image_derivatives_save(self, image_name_old)
+
+        # Store the lines of the trans text fields (after saving, as lines include the id of the folio)
+        self.set_text_lines()
+        TextFolio.objects.filter(id=self.id).update(**{field: getattr(self, field) for field in self.text_lines_update_fields})
+        # Store where the trans text fields link to each tag (e.g. after a link has been added, see TextFolioTagCreateView)
+        self.text_folio_tags_update()
+
+        # Keep the search index of the parent Text up to date
+        self.text.search_index_update()
 
     class Meta:
         ordering = ['text', 'open_state', 'side', 'id']
@@ -1334,6 +1449,9 @@ class TextFolioTag(models.Model):
     image_part_top = models.FloatField(blank=True, null=True)
     image_part_width = models.FloatField(blank=True, null=True)
     image_part_height = models.FloatField(blank=True, null=True)
+    # The trans text fields of the TextFolio that link to this tag, and the indexes of their lines that link to it,
+    # as {field: [line indexes]}, set automatically when this object or its TextFolio is saved (see TextFolio.text_folio_tags_trans_lines())
+    trans_lines = models.JSONField(blank=True, null=True, editable=False)
     # Metadata
     meta_created_by = models.ForeignKey(
         User,
@@ -1358,17 +1476,37 @@ class TextFolioTag(models.Model):
     def is_drawn_on_text_folio_image(self):
         return self.image_part_left is not None
 
+    def is_in_text_folio(self, field):
+        """ Returns True if the trans text field of the TextFolio links to this tag (searching the field if trans_lines isn't set yet) """
+        if self.trans_lines is None:
+            trans_text = getattr(self.text_folio, field)
+            return bool(trans_text) and f'data-textfoliotag="{self.id}"' in trans_text
+        return field in self.trans_lines
+
     @property
     def is_in_text_folio_transcription(self):
-        return self.text_folio.transcription and f'data-textfoliotag="{self.id}"' in self.text_folio.transcription
+        return self.is_in_text_folio('transcription')
 
     @property
     def is_in_text_folio_translation(self):
-        return self.text_folio.translation and f'data-textfoliotag="{self.id}"' in self.text_folio.translation
+        return self.is_in_text_folio('translation')
 
     @property
     def is_in_text_folio_transliteration(self):
-        return self.text_folio.transliteration and f'data-textfoliotag="{self.id}"' in self.text_folio.transliteration
+        return self.is_in_text_folio('transliteration')
+
+    def save(self, *args, **kwargs):
+        # A new tag isn't linked to yet, and an existing tag may have been moved to another TextFolio
+        self.trans_lines = self.text_folio.text_folio_tags_trans_lines().get(self.id, {}) if self.id else {}
+        super().save(*args, **kwargs)
+        # Tag names are searchable, so keep the search index of the related Text up to date
+        self.text_folio.text.search_index_update()
+
+    def delete(self, *args, **kwargs):
+        text = self.text_folio.text
+        result = super().delete(*args, **kwargs)
+        text.search_index_update()
+        return result
 
     class Meta:
         ordering = ['text_folio', Upper('tag__category__name'), Upper('tag__name'), 'id']
@@ -1459,19 +1597,34 @@ class Seal(models.Model):
     def imprints_html_list(self):
         return queryset_to_html_list(self.imprints.all())
 
+    # Sizes (maximum width/height in pixels) of the smaller versions of the image, created in the background (see ImageDerivativeJob)
+    image_derivative_sizes = {'image_small': 1000}
+
+    @cached_property
+    def image_processing_error(self):
+        """ The error of the job that failed to create the smaller version of the image (see ImageDerivativeJob), if any """
+        return image_derivatives_error(self)
+
+    @property
+    def image_is_processing(self):
+        """ Whether the smaller version of the image is still being created (see ImageDerivativeJob) """
+        return image_derivatives_missing(self) and not self.image_processing_error
+
     @property
     def image_preview(self):
+        if self.image_processing_error:
+            return f'The smaller version of this image could not be created: {self.image_processing_error}'
+        if self.image_is_processing:
+            return 'The smaller version of this image is being created. Please check back soon.'
         return mark_safe(f'<img src="{self.image_small.url}" alt="image of this seal" />')
 
     def save(self, *args, **kwargs):
+        image_name_old = Seal.objects.filter(id=self.id).values_list('image', flat=True).first() if self.id else None
         # Must save now, so image is saved before working with it
         super().save(*args, **kwargs)
 
-        # Create small versions of the original image
-        # Update the object (must use update() not save() to avoid unique ID error)
-        Seal.objects.filter(id=self.id).update(
-            image_small=image_compress(self.image, self.image_small, 1000)
-        )
+        # Create a small version of the original image in the background, if it has changed
+        image_derivatives_save(self, image_name_old)
 
     class Meta:
         ordering = ['text', 'type', 'id']
@@ -1500,3 +1653,334 @@ class M2MTextToText(models.Model):
     text_2 = models.ForeignKey(Text, related_name='text_2', on_delete=models.CASCADE, verbose_name='text')
     relationship_type = models.ForeignKey(SlM2MTextToTextRelationshipType, on_delete=models.SET_NULL, blank=True, null=True)
     relationship_details = models.CharField(max_length=1000, blank=True, null=True)
+
+
+#
+# 4. Search index
+#
+
+
+class TextSearchIndex(models.Model):
+    """
+    The HTML-stripped content of a searchable field of a Text (or of one of its TextFolio objects)
+
+    Rows are maintained by Text.search_index_update() and are indexed by the database for full-text search:
+    FTS5 virtual tables on SQLite and GIN indexes on PostgreSQL (see migration 0011 and corpus/search.py)
+    """
+
+    related_name = 'search_index'
+
+    text = models.ForeignKey('Text', on_delete=models.CASCADE, related_name=related_name)
+    text_folio = models.ForeignKey('TextFolio', on_delete=models.CASCADE, blank=True, null=True, related_name=related_name)
+    field = models.CharField(max_length=255, db_index=True)
+    content = models.TextField()
+
+    def __str__(self):
+        return f'{self.text_id}: {self.field}'
+
+    class Meta:
+        verbose_name_plural = 'text search index'
+
+
+#
+# 5. List summary
+#
+
+
+class TextListSummary(models.Model):
+    """
+    The data shown on the card of a Text on the Text list page (and the counts used by 'count_' sorts),
+    so the list page doesn't loop over the folios and tags of each Text (or read the images of codex Texts)
+
+    Rows are kept up to date by TextListSummary.update_text(), called by signals when a Text, TextFolio, TextFolioTag,
+    or Seal is saved or deleted (see signals.py). To rebuild all rows run: python manage.py text_list_summary_rebuild
+    """
+
+    related_name = 'list_summary'
+
+    text = models.OneToOneField('Text', on_delete=models.CASCADE, primary_key=True, related_name=related_name)
+    has_transcription = models.BooleanField(default=False)
+    has_translation = models.BooleanField(default=False)
+    has_transliteration = models.BooleanField(default=False)
+    # Only the ids of tags are stored, as their names are read from the 'tags' select list when rendering (see TextListView.list_items_html()),
+    # so renaming a tag doesn't need every summary with the tag to be updated
+    tags = models.JSONField(default=list, blank=True, help_text='A list of the ids of the tags of all folios')
+    list_image_url = models.CharField(max_length=2000, blank=True, null=True)
+    summary_of_content_preview = models.TextField(blank=True, null=True)
+    gregorian_date_listview = models.CharField(max_length=1000, blank=True, null=True)
+    count_text_folios = models.PositiveIntegerField(default=0)
+    count_seals = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def build(cls, text):
+        """
+        Returns a new (unsaved) TextListSummary of the Text, e.g. to show a Text whose summary doesn't exist yet
+        Returns None if the Text no longer exists (e.g. when called while the Text is being deleted)
+        """
+        # Only the columns that are needed are fetched: rich text is never loaded (folio flags are EXISTS subqueries)
+        folios = TextFolio.objects.filter(text=models.OuterRef('pk'))
+        deferred_fields = [field for field in rich_text_fields(Text) if field != 'summary_of_content_plain']  # plain summary is previewed
+        text = Text.objects.filter(id=getattr(text, 'id', text)).defer(*deferred_fields).annotate(
+            **{
+                f'folios_have_{field}': models.Exists(folios.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''}))
+                for field in ('transcription', 'translation', 'transliteration')
+            }
+        ).first()
+        if text is None:
+            return None
+        # The first image (of a TextFolio, or of a codex) and the tags of all folios, in order of folio
+        if text.is_codex:
+            list_image_url = text.codex_default_image_thumbnail_url
+        else:
+            folio = TextFolio.objects.filter(text=text).exclude(image='').exclude(image__isnull=True).exclude(image_hide=True).only('id', 'image', 'image_small').first()
+            list_image_url = folio.image_small.url if folio and folio.image_small else None
+        tags = dict.fromkeys(TextFolioTag.objects.filter(text_folio__text=text).values_list('tag_id', flat=True))
+        return cls(
+            text=text,
+            has_transcription=text.folios_have_transcription,
+            has_translation=text.folios_have_translation,
+            has_transliteration=text.folios_have_transliteration,
+            tags=list(tags),
+            list_image_url=list_image_url,
+            summary_of_content_preview=text.summary_of_content_preview,
+            gregorian_date_listview=text.gregorian_date_listview,
+            count_text_folios=TextFolio.objects.filter(text=text).count(),
+            count_seals=Seal.objects.filter(text=text).count(),
+        )
+
+    @classmethod
+    def update_text(cls, text):
+        """
+        Creates or updates the TextListSummary of the Text (see build()) and returns it
+        Returns None if the Text no longer exists
+        """
+        summary = cls.build(text)
+        if summary is not None:
+            summary.save()
+        return summary
+
+    def __str__(self):
+        return str(self.text_id)
+
+    class Meta:
+        verbose_name_plural = 'text list summaries'
+
+
+#
+# 6. IIIF manifests
+#
+
+
+class IIIFManifest(models.Model):
+    """
+    A persisted copy of the images (canvases) of the IIIF manifest of a codex Text (see Text.codex_images),
+    so manifests aren't fetched from their (external) server on every request
+
+    Manifests are fetched when first needed and then served from here, even once stale (i.e. older than IIIF_MANIFEST_TTL).
+    Stale manifests are refreshed in the background by: python manage.py iiif_manifests_refresh
+    A manifest that has never been fetched successfully is stale after IIIF_MANIFEST_ERROR_RETRY instead, so it's retried soon
+    Only one process fetches a manifest at a time (see fetch_claim()), others serve the stored images meanwhile
+    """
+
+    url = models.CharField(max_length=2000, unique=True)
+    images = models.JSONField(blank=True, null=True, help_text='A list of the images of the manifest, as {"image_thumbnail": ..., "image_large": ..., "image_full": ...}')
+    fetched = models.DateTimeField(blank=True, null=True, help_text='When the manifest was last fetched (successfully or not)')
+    fetch_error = models.TextField(blank=True, null=True)
+    fetch_started = models.DateTimeField(blank=True, null=True, help_text='When the fetch in progress (if any) started')
+
+    @property
+    def is_stale(self):
+        ttl = settings.IIIF_MANIFEST_TTL if self.images is not None else settings.IIIF_MANIFEST_ERROR_RETRY
+        return self.fetched is None or self.fetched < timezone.now() - datetime.timedelta(seconds=ttl)
+
+    @staticmethod
+    def fetch_images(url):
+        """
+        Fetches the IIIF manifest at the URL and returns a list of its images (as dicts of thumbnail, large, and full image URLs)
+        Raises an exception if the manifest can't be fetched (or takes longer than IIIF_MANIFEST_FETCH_TIMEOUT) or parsed
+        """
+        response = requests.get(url, timeout=settings.IIIF_MANIFEST_FETCH_TIMEOUT)
+        # Raise an HTTPError for bad responses (4xx or 5xx)
+        response.raise_for_status()
+        images = []
+        for canvas in response.json()['sequences'][0]['canvases']:
+            image_url = canvas['images'][0]['resource']['@id']
+            image_full_url = f"{image_url}/full/max/0/default.jpg"
+            images.append({
+                'image_thumbnail': image_full_url.replace('max', '60,'),
+                'image_large': image_full_url.replace('max', '1500,'),
+                'image_full': image_full_url
+            })
+        return images
+
+    def fetch_claim(self):
+        """
+        Claims the fetch of this manifest for the current process, returning False if another process is already fetching it
+        A claim expires (e.g. if its process was killed) after twice the fetch timeout
+        """
+        now = timezone.now()
+        claim_expired = now - datetime.timedelta(seconds=settings.IIIF_MANIFEST_FETCH_TIMEOUT * 2)
+        claimed = IIIFManifest.objects.filter(id=self.id).filter(
+            models.Q(fetch_started__isnull=True) | models.Q(fetch_started__lt=claim_expired)
+        ).update(fetch_started=now)
+        return claimed == 1
+
+    def refresh(self):
+        """
+        Fetches the manifest (if no other process is fetching it) and stores its images, keeping the previous images if it fails
+        Returns True if the images have changed
+        """
+        if not self.fetch_claim():
+            return False
+        previous_images = self.images
+        try:
+            self.images, self.fetch_error = self.fetch_images(self.url), None
+        except (requests.exceptions.RequestException, ValueError, LookupError, TypeError) as e:
+            self.fetch_error = f"Error fetching data: {e}"
+        self.fetched, self.fetch_started = timezone.now(), None
+        # update() rather than save(), as the manifest cache isn't part of the corpus (so doesn't change its version)
+        IIIFManifest.objects.filter(id=self.id).update(
+            images=self.images, fetched=self.fetched, fetch_error=self.fetch_error, fetch_started=None
+        )
+        return self.images != previous_images
+
+    @classmethod
+    def get_images(cls, url):
+        """
+        Returns the images of the IIIF manifest at the URL (see fetch_images()), or None if they aren't available
+        Manifests are only fetched here if they have no images yet (and haven't been tried within IIIF_MANIFEST_ERROR_RETRY),
+        otherwise their stored images are returned, even if stale (they're refreshed by the iiif_manifests_refresh command)
+        """
+        manifest = cls.objects.filter(url=url).first()
+        if manifest is None:
+            manifest, _ = cls.objects.get_or_create(url=url)
+        if manifest.images is None and manifest.is_stale:
+            manifest.refresh()
+        return manifest.images
+
+    def __str__(self):
+        return self.url
+
+    class Meta:
+        verbose_name = 'IIIF manifest'
+
+
+#
+# 7. Image derivative jobs
+#
+
+
+class ImageDerivativeJob(models.Model):
+    """
+    A job to create the smaller versions (derivatives) of the image of an object (see image_derivative_sizes, e.g. of a TextFolio or Seal)
+    Added when the image of an object changes (see image_derivatives_save()), and processed in the background by a worker:
+    python manage.py image_derivatives_process
+
+    Only one worker processes a job at a time (see claim_next()). A job that fails is retried (after a delay that doubles each attempt)
+    until IMAGE_DERIVATIVE_JOB_ATTEMPTS, after which it's kept as failed. A job is deleted once its derivatives are created
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [(STATUS_PENDING, 'Pending'), (STATUS_RUNNING, 'Running'), (STATUS_FAILED, 'Failed')]
+
+    model_name = models.CharField(max_length=100, help_text='The model of the object, e.g. "textfolio"')
+    object_id = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, null=True, help_text='The error of the last failed attempt')
+    run_after = models.DateTimeField(default=timezone.now, help_text="The job isn't processed before this time (e.g. before retrying)")
+    started = models.DateTimeField(blank=True, null=True, help_text='When the running attempt (if any) started')
+    generation = models.PositiveIntegerField(default=0, help_text='Increased when the job is added again (e.g. the image changed while running)')
+
+    @classmethod
+    def enqueue(cls, obj, reset):
+        """
+        Adds a job for the object, if it doesn't have one. If reset (e.g. its image has changed), an existing job is processed again
+        (even if running or failed), and a running attempt won't delete the job once done (see process())
+        """
+        model_name = obj._meta.model_name
+        if reset and cls.objects.filter(model_name=model_name, object_id=obj.id).update(
+            status=cls.STATUS_PENDING, attempts=0, error=None, run_after=timezone.now(), started=None, generation=models.F('generation') + 1
+        ):
+            return
+        cls.objects.get_or_create(model_name=model_name, object_id=obj.id)
+
+    @classmethod
+    def claimable(cls):
+        """
+        Returns a Q of the jobs that can be claimed by a worker: pending jobs that are due,
+        and running jobs that have run for longer than IMAGE_DERIVATIVE_JOB_TIMEOUT (e.g. if their worker was killed)
+        """
+        now = timezone.now()
+        return (
+            models.Q(status=cls.STATUS_PENDING, run_after__lte=now)
+            | models.Q(status=cls.STATUS_RUNNING, started__lt=now - datetime.timedelta(seconds=settings.IMAGE_DERIVATIVE_JOB_TIMEOUT))
+        )
+
+    @classmethod
+    def claim_next(cls):
+        """ Claims the next job that can be claimed (see claimable()) for the current worker and returns it, or None if there's none """
+        for job_id in cls.objects.filter(cls.claimable()).order_by('run_after', 'id').values_list('id', flat=True)[:10]:
+            # Another worker may claim the job first, in which case the update doesn't match it
+            if cls.objects.filter(cls.claimable(), id=job_id).update(status=cls.STATUS_RUNNING, started=timezone.now()):
+                return cls.objects.get(id=job_id)
+        return None
+
+    def process(self):
+        """
+        Creates the derivatives of the image of the job's object (see image_derivatives_create()) and deletes the job,
+        or if it fails, sets the job to be retried (or as failed, after IMAGE_DERIVATIVE_JOB_ATTEMPTS)
+        Returns the id of the Text of the object if its derivatives were created or the job has failed
+        (to update the Text, e.g. so its pages show the image, or that it couldn't be processed), otherwise None
+        """
+        job = ImageDerivativeJob.objects.filter(id=self.id, generation=self.generation)
+        obj = apps.get_model('corpus', self.model_name).objects.filter(id=self.object_id).first()
+        # The object has been deleted since the job was added
+        if obj is None:
+            job.delete()
+            return None
+        try:
+            image_derivatives_create(obj)
+        except Exception as e:
+            self.attempts += 1
+            self.status = self.STATUS_FAILED if self.attempts >= settings.IMAGE_DERIVATIVE_JOB_ATTEMPTS else self.STATUS_PENDING
+            self.error = f'{type(e).__name__}: {e}'
+            self.run_after = timezone.now() + datetime.timedelta(seconds=settings.IMAGE_DERIVATIVE_JOB_RETRY_DELAY * 2 ** (self.attempts - 1))
+            job.update(status=self.status, attempts=self.attempts, error=self.error, run_after=self.run_after, started=None)
+            return obj.text_id if self.status == self.STATUS_FAILED else None
+        # Only deleted if the job hasn't been added again while running (e.g. the image changed), otherwise it's processed again
+        job.delete()
+        return obj.text_id
+
+    def __str__(self):
+        return f'{self.model_name} {self.object_id} ({self.status})'
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['model_name', 'object_id'], name='unique_image_derivative_job')]
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+
+#
+# 8. Saved searches
+#
+
+
+class SavedSearch(models.Model):
+    """
+    A search of the Text list page (its search, filter, and sort params) saved under a short token,
+    so the download links of the page don't include the id of every Text in its results (see saved_searches.py)
+
+    Expired saved searches are deleted by: python manage.py saved_searches_delete_expired
+    """
+
+    token = models.CharField(max_length=16, primary_key=True)
+    params = models.JSONField(help_text='A list of the URL params of the search, as [key, value]')
+    expires = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.token
+
+    class Meta:
+        verbose_name_plural = 'saved searches'
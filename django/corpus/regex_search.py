@@ -0,0 +1,249 @@
+"""
+RegEx search engine, used by search.py for 'regex' search types
+
+Rather than running a RegEx over every row of the database (which on SQLite calls back into Python
+for every row of the TextFolio join), the searchable content of all Texts is written to a compact
+plain text corpus file, which is memory-mapped (so it's shared by all processes via the OS page cache)
+and scanned in parallel by a pool of worker processes, with a hard deadline.
+
+A corpus is made of 2 files, named with a signature of the content they were built from:
+    - regex-corpus-<signature>.txt: the UTF-8 content of every record, one after another
+    - regex-corpus-<signature>.offsets: an offset table of (text_id, text_folio_id, start, end) per record,
+      stored as 64-bit integers and sorted by text_id
+
+This module doesn't import Django, so the worker processes can import it whatever the multiprocessing start method.
+"""
+
+from array import array
+import atexit
+import mmap
+import multiprocessing
+import os
+import re
+
+try:
+    # Python 3.11+
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:
+    import sre_constants
+    import sre_parse
+
+
+OFFSET_COLUMNS = 4  # text_id, text_folio_id, start, end
+OFFSET_TYPECODE = 'q'
+CORPUS_PREFIX = 'regex-corpus-'
+
+
+class RegexSearchTimeout(Exception):
+    """ Raised when a RegEx search doesn't complete before its deadline """
+
+
+def corpus_paths(directory, signature):
+    """ Returns the paths of the content and offsets files of the corpus with the provided signature """
+    name = os.path.join(directory, f'{CORPUS_PREFIX}{signature}')
+    return f'{name}.txt', f'{name}.offsets'
+
+
+def corpus_build(directory, signature, records):
+    """
+    Writes a new corpus to the provided directory, from an iterable of (text_id, text_folio_id, content) records
+    that's ordered by text_id. Files are written under temporary names and then moved into place,
+    so a process never sees a partially written corpus. Older corpora are then deleted, except the previous one,
+    which processes may have found (see corpus_signatures()) but not yet opened
+    (processes that have an older corpus memory-mapped can continue to use it until they load a newer corpus)
+    """
+    os.makedirs(directory, exist_ok=True)
+    content_path, offsets_path = corpus_paths(directory, signature)
+    offsets = array(OFFSET_TYPECODE)
+    position = 0
+    tmp_suffix = f'.tmp{os.getpid()}'
+
+    with open(content_path + tmp_suffix, 'wb') as content_file:
+        for text_id, text_folio_id, content in records:
+            content = (content or '').encode('utf8')
+            content_file.write(content)
+            offsets.extend((text_id, text_folio_id or 0, position, position + len(content)))
+            position += len(content)
+    with open(offsets_path + tmp_suffix, 'wb') as offsets_file:
+        offsets.tofile(offsets_file)
+
+    os.replace(content_path + tmp_suffix, content_path)
+    os.replace(offsets_path + tmp_suffix, offsets_path)
+
+    # Delete old corpora
+    keep_signatures = {signature, *corpus_signatures(directory)[:2]}
+    for file_name in os.listdir(directory):
+        if file_name.startswith(CORPUS_PREFIX) and '.tmp' not in file_name and os.path.splitext(file_name)[0][len(CORPUS_PREFIX):] not in keep_signatures:
+            try:
+                os.remove(os.path.join(directory, file_name))
+            # Already deleted by another process building a corpus
+            except FileNotFoundError:
+                pass
+
+
+def corpus_exists(directory, signature):
+    return all(os.path.exists(path) for path in corpus_paths(directory, signature))
+
+
+def corpus_signatures(directory):
+    """ Returns a list of the signatures of the corpora in the directory, the most recently built first """
+    built = {}
+    for file_name in os.listdir(directory) if os.path.isdir(directory) else []:
+        # The offsets file is moved into place last, so its time is when the corpus was built
+        if file_name.startswith(CORPUS_PREFIX) and file_name.endswith('.offsets'):
+            signature = file_name[len(CORPUS_PREFIX):-len('.offsets')]
+            try:
+                if corpus_exists(directory, signature):
+                    built[signature] = os.path.getmtime(corpus_paths(directory, signature)[1])
+            except FileNotFoundError:
+                pass
+    return sorted(built, key=built.get, reverse=True)
+
+
+# Corpora memory-mapped by this process, keyed by content path
+_open_corpora = {}
+
+
+def corpus_open(content_path, offsets_path):
+    """
+    Returns the (content, offsets) of a corpus, memory-mapped and cached for the lifetime of this process
+    content is an mmap of bytes and offsets is a flat memoryview of integers (OFFSET_COLUMNS per record)
+    """
+    if content_path not in _open_corpora:
+        # Only the current corpus is kept open in each process
+        _open_corpora.clear()
+        mapped = []
+        for path in (content_path, offsets_path):
+            with open(path, 'rb') as f:
+                # mmap can't map an empty file, so an empty corpus is an empty bytes object
+                mapped.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b'')
+        _open_corpora[content_path] = (mapped[0], memoryview(mapped[1]).cast('B').cast(OFFSET_TYPECODE))
+    return _open_corpora[content_path]
+
+
+def required_literals(pattern):
+    """
+    Returns a list of literal strings that any match of the RegEx pattern must contain,
+    e.g. 'wh.at (garden|land)' --> ['wh', 'at ']
+    Only literals at the top level of the pattern are used (i.e. not within groups, alternations, or repeats),
+    so the list can be empty (e.g. for 'garden|land'), in which case every record is a candidate
+    """
+    literals = []
+    current = []
+    for op, value in sre_parse.parse(pattern):
+        if op == sre_constants.LITERAL:
+            current.append(chr(value))
+        else:
+            literals.append(''.join(current))
+            current = []
+    literals.append(''.join(current))
+    return [literal for literal in literals if literal]
+
+
+def scan(content_path, offsets_path, pattern, record_start, record_end, candidate_text_ids):
+    """
+    Returns a set of text_ids of records within the range [record_start, record_end) of the corpus that match the RegEx
+    pattern (case insensitive, as per Django's iregex). Only records of candidate_text_ids are searched (all if None).
+    Run in the worker processes
+    """
+    content, offsets = corpus_open(content_path, offsets_path)
+    regex = re.compile(pattern, re.IGNORECASE)
+    matches = set()
+    for record in range(record_start, record_end):
+        i = record * OFFSET_COLUMNS
+        text_id = offsets[i]
+        if text_id in matches or (candidate_text_ids is not None and text_id not in candidate_text_ids):
+            continue
+        if regex.search(content[offsets[i + 2]:offsets[i + 3]].decode('utf8')):
+            matches.add(text_id)
+    return matches
+
+
+def _scan(args):
+    return scan(*args)
+
+
+# Pool of worker processes, created on first use and replaced if a search times out
+_pool = None
+
+
+def _pool_get(processes):
+    global _pool
+    if _pool is None:
+        _pool = multiprocessing.Pool(processes)
+        atexit.register(_pool_terminate)
+    return _pool
+
+
+def _pool_terminate():
+    global _pool
+    if _pool is not None:
+        _pool.terminate()
+        _pool = None
+
+
+def match_spans(regex, contents, limit):
+    """
+    Returns a list of the (start, end) spans of up to limit matches of the compiled RegEx in each string of contents
+    (ignoring zero-length matches, e.g. from RegEx 'a*'). Run in the worker processes by match_spans_with_deadline()
+    """
+    spans = []
+    for content in contents:
+        content_spans = []
+        for match in regex.finditer(content):
+            if match.start() != match.end():
+                content_spans.append(match.span())
+                if len(content_spans) == limit:
+                    break
+        spans.append(content_spans)
+    return spans
+
+
+def match_spans_with_deadline(regex, contents, limit, processes=2, timeout=5):
+    """
+    Returns match_spans() of the compiled RegEx, found by the pool of worker processes (see search()),
+    so a catastrophically backtracking RegEx is stopped after timeout seconds, raising RegexSearchTimeout
+    """
+    result = _pool_get(processes).apply_async(match_spans, (regex, contents, limit))
+    try:
+        return result.get(timeout)
+    except multiprocessing.TimeoutError:
+        _pool_terminate()
+        raise RegexSearchTimeout(f'RegEx matches exceeded {timeout} seconds: {regex.pattern}')
+
+
+def search(content_path, offsets_path, pattern, candidate_text_ids=None, processes=2, timeout=5):
+    """
+    Returns a set of text_ids of all records in the corpus that match the RegEx pattern,
+    optionally limited to records of candidate_text_ids
+
+    The records are split into ranges (keeping all records of a text within one range) which are scanned
+    in parallel by a pool of worker processes. If the scan isn't complete within timeout seconds
+    the worker processes are terminated (e.g. to stop a catastrophically backtracking RegEx) and RegexSearchTimeout is raised
+
+    Raises re.error if the pattern is invalid
+    """
+    re.compile(pattern)
+    _, offsets = corpus_open(content_path, offsets_path)
+    record_count = len(offsets) // OFFSET_COLUMNS
+    if not record_count or candidate_text_ids is not None and not candidate_text_ids:
+        return set()
+
+    # Split into more ranges than processes, so a slow range doesn't hold up the rest
+    range_size = max(1, -(-record_count // (processes * 4)))
+    ranges = []
+    start = 0
+    while start < record_count:
+        end = min(start + range_size, record_count)
+        # Move the end of the range past any remaining records of the same text
+        while end < record_count and offsets[end * OFFSET_COLUMNS] == offsets[(end - 1) * OFFSET_COLUMNS]:
+            end += 1
+        ranges.append((content_path, offsets_path, pattern, start, end, candidate_text_ids))
+        start = end
+
+    result = _pool_get(processes).map_async(_scan, ranges)
+    try:
+        return set().union(*result.get(timeout))
+    except multiprocessing.TimeoutError:
+        _pool_terminate()
+        raise RegexSearchTimeout(f'RegEx search exceeded {timeout} seconds: {pattern}')
@@ -0,0 +1,44 @@
+"""
+Saved searches of the Text list page, used to download the data of all Texts in the results of a search
+
+Rather than the list page including the id of every Text in its results within the download links,
+the search (i.e. its search, filter, and sort params) is saved in the database (see SavedSearch) under a short token,
+which the downloaddata views use to perform the search again (see downloaddata_text_queryset() in views.py)
+"""
+
+from django.conf import settings
+from django.http import QueryDict
+from django.utils import timezone
+from .models import SavedSearch
+import datetime
+import hashlib
+import json
+
+
+def saved_search_save(params):
+    """
+    Saves a search, provided as a list of (key, value) URL params (e.g. [('search', '["wheat"]'), ('filter_fk_collection', '1')])
+    and returns its token. The same params always have the same token, and saving them again resets their expiry
+    once less than half of SAVED_SEARCH_TIMEOUT is left, so rendering a page with the same search doesn't write every time
+    """
+    params = [[str(key), str(value)] for key, value in params]
+    token = hashlib.sha1(json.dumps(params).encode()).hexdigest()[:16]
+    timeout = datetime.timedelta(seconds=settings.SAVED_SEARCH_TIMEOUT)
+    now = timezone.now()
+    expires = SavedSearch.objects.filter(token=token).values_list('expires', flat=True).first()
+    if expires is None:
+        SavedSearch.objects.update_or_create(token=token, defaults={'params': params, 'expires': now + timeout})
+    elif expires - now < timeout / 2:
+        SavedSearch.objects.filter(token=token).update(expires=now + timeout)
+    return token
+
+
+def saved_search_get(token):
+    """ Returns the URL params (a QueryDict) of the saved search with the token, or None if it doesn't exist or has expired """
+    params = SavedSearch.objects.filter(token=token, expires__gt=timezone.now()).values_list('params', flat=True).first() if token.isalnum() else None
+    if params is None:
+        return None
+    query = QueryDict(mutable=True)
+    for key, value in params:
+        query.appendlist(key, value)
+    return query
@@ -0,0 +1,252 @@
+"""
+Search of Text objects, used by TextListView
+
+General and exact searches use full-text search indexes and RegEx searches use the RegEx search engine (see regex_search.py)
+
+Searches are performed against TextSearchIndex (see models.py), which holds the HTML-stripped
+content of each searchable field of a Text, rather than against the raw rich text of every TextFolio.
+The database indexes these rows (see migration 0011):
+    - SQLite: FTS5 virtual tables (trigram tokenizer for general searches, unicode61 for exact searches)
+    - PostgreSQL: GIN indexes (pg_trgm for general searches, tsvector for exact searches)
+"""
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max
+from functools import reduce
+from operator import (or_, and_)
+from . import models, regex_search, versions
+import re
+
+
+# Shortest general search term that the SQLite FTS5 trigram tokenizer can match
+TRIGRAM_MIN_LENGTH = 3
+
+# Keyword in context (KWIC) snippets: max number of snippets per Text and max characters of context either side of a match
+SNIPPETS_MAX = 5
+SNIPPET_CONTEXT_LENGTH = 60
+
+
+def fts5_phrase(search):
+    """
+    Returns the search term as an FTS5 phrase string (wrapped in double quotes, with inner double quotes doubled)
+    so that any special characters in the search term are treated as literal text
+    """
+    return '"{}"'.format(search.replace('"', '""'))
+
+
+def text_ids_matching_search(search, search_type):
+    """
+    Returns a set of ids of all Text objects that have a field matching the search term
+    search_type can be '' (general: matches any part of a word) or 'exact' (matches whole words)
+    """
+    index = models.TextSearchIndex.objects.all()
+    vendor = connection.vendor
+
+    # Exact search (whole words)
+    if search_type == 'exact':
+        if vendor == 'sqlite':
+            index = index.extra(
+                where=['corpus_textsearchindex.id IN (SELECT rowid FROM corpus_textsearchindex_words WHERE corpus_textsearchindex_words MATCH %s)'],
+                params=[fts5_phrase(search)]
+            )
+        elif vendor == 'postgresql':
+            index = index.extra(
+                where=["to_tsvector('simple', corpus_textsearchindex.content) @@ phraseto_tsquery('simple', %s)"],
+                params=[search]
+            )
+        else:
+            index = index.filter(content__iregex=r'\y{}\y'.format(re.escape(search)))
+    # General search (any part of a word)
+    else:
+        if vendor == 'sqlite' and len(search) >= TRIGRAM_MIN_LENGTH:
+            index = index.extra(
+                where=['corpus_textsearchindex.id IN (SELECT rowid FROM corpus_textsearchindex_trigram WHERE corpus_textsearchindex_trigram MATCH %s)'],
+                params=[fts5_phrase(search)]
+            )
+        # PostgreSQL uses its trigram index for icontains, SQLite falls back to LIKE for short search terms
+        else:
+            index = index.filter(content__icontains=search)
+
+    return set(index.values_list('text_id', flat=True))
+
+
+def text_ids_matching_searches(searches, search_type, search_operator):
+    """
+    Returns a set of ids of all Text objects that match the provided list of search terms,
+    connected via the search_operator ('or' / 'and')
+    """
+    operator = or_ if search_operator == 'or' else and_
+    return reduce(operator, (text_ids_matching_search(search.strip(), search_type) for search in searches))
+
+
+def regex_search_corpus_signature():
+    """
+    Returns the signature of the RegEx search corpus of the current TextSearchIndex
+
+    As the TextSearchIndex rows of a Text are replaced whenever it's re-indexed (and ids are never reused)
+    the count and max id of the rows identify the content of the index
+    """
+    index = models.TextSearchIndex.objects.aggregate(count=Count('id'), max_id=Max('id'))
+    return f"{index['count']}-{index['max_id'] or 0}"
+
+
+def regex_search_corpus_build():
+    """
+    Builds the RegEx search corpus of the current TextSearchIndex, if it isn't built yet (see regex_search_corpus_build command)
+    and bumps the version of the corpus, as results (and pages) cached since the TextSearchIndex changed used the previous corpus
+    Returns True if it was built
+    """
+    signature = regex_search_corpus_signature()
+    if regex_search.corpus_exists(settings.REGEX_SEARCH_DIR, signature):
+        return False
+    records = models.TextSearchIndex.objects.order_by('text_id', 'id').values_list('text_id', 'text_folio_id', 'content')
+    regex_search.corpus_build(settings.REGEX_SEARCH_DIR, signature, records.iterator(chunk_size=2000))
+    versions.version_bump('corpus')
+    return True
+
+
+def regex_search_corpus():
+    """
+    Returns the (content_path, offsets_path) of the RegEx search corpus of the current TextSearchIndex
+    or, until it's built (by: python manage.py regex_search_corpus_build), of the most recently built corpus,
+    so a search doesn't wait for a corpus to be built. A corpus is only built here if there isn't one yet (e.g. when first deployed)
+    """
+    signature = regex_search_corpus_signature()
+    directory = settings.REGEX_SEARCH_DIR
+    if not regex_search.corpus_exists(directory, signature):
+        signatures = regex_search.corpus_signatures(directory)
+        if signatures:
+            signature = signatures[0]
+        else:
+            regex_search_corpus_build()
+    return regex_search.corpus_paths(directory, signature)
+
+
+def text_ids_matching_regex(search, candidate_text_ids=None):
+    """
+    Returns a set of ids of all Text objects that have a field matching the RegEx search (case insensitive)
+
+    Texts are first narrowed down to those containing the literal text required by the RegEx (e.g. 'wh' and 'eat' in 'wh.?eat')
+    using the trigram search index, then only those Texts are scanned by the RegEx search engine
+    Raises re.error if the RegEx is invalid, or regex_search.RegexSearchTimeout if it takes too long
+    """
+    re.compile(search)
+    for literal in regex_search.required_literals(search):
+        if len(literal) >= TRIGRAM_MIN_LENGTH:
+            literal_text_ids = text_ids_matching_search(literal, '')
+            candidate_text_ids = literal_text_ids if candidate_text_ids is None else candidate_text_ids & literal_text_ids
+    if candidate_text_ids is not None and not candidate_text_ids:
+        return set()
+    search_options = {'candidate_text_ids': candidate_text_ids, 'processes': settings.REGEX_SEARCH_PROCESSES, 'timeout': settings.REGEX_SEARCH_TIMEOUT}
+    try:
+        return regex_search.search(*regex_search_corpus(), search, **search_options)
+    # The corpus was deleted after it was found (i.e. 2 newer corpora have been built since), so search the latest one
+    except FileNotFoundError:
+        return regex_search.search(*regex_search_corpus(), search, **search_options)
+
+
+def text_ids_matching_regexes(searches, search_operator):
+    """
+    Returns a set of ids of all Text objects that match the provided list of RegEx searches,
+    connected via the search_operator ('or' / 'and')
+    With 'and', each RegEx only scans the Texts matched by the previous RegExes
+    """
+    text_ids = None
+    for search in searches:
+        if search_operator == 'or':
+            text_ids = text_ids_matching_regex(search.strip()) | (text_ids or set())
+        else:
+            text_ids = text_ids_matching_regex(search.strip(), candidate_text_ids=text_ids)
+    return text_ids
+
+
+def search_regex(search, search_type):
+    """
+    Returns a compiled RegEx that finds matches of the search term in plain text, as per the search_type:
+    '' (general: any part of a word), 'exact' (whole words), or 'regex' (the search term is a RegEx)
+    """
+    if search_type == 'regex':
+        return re.compile(search, re.IGNORECASE)
+    elif search_type == 'exact':
+        return re.compile(r'\b{}\b'.format(re.escape(search)), re.IGNORECASE)
+    return re.compile(re.escape(search), re.IGNORECASE)
+
+
+def search_snippets(text_ids, searches, search_type):
+    """
+    Returns a dict of keyword in context (KWIC) snippets of where the search terms occur in each Text,
+    e.g. {text_id: [snippet, ...]} where each snippet is a dict of:
+        - folio: name of the TextFolio (None if the match is in a field of the Text, e.g. summary_of_content)
+        - field / field_label: name of the field (as per TextSearchIndex.field) and a readable version of it
+        - rtl: whether the snippet is written right to left (transcriptions of Texts in a right to left script, as per their stored lines)
+        - line: line number within the field (from 1)
+        - start / end: character offsets of the match within the field
+        - before / match / after: the matched text and its context within the line
+
+    Snippets are taken from the TextSearchIndex, so only the provided text_ids (e.g. the current page of results)
+    need to be given. Each Text has up to SNIPPETS_MAX snippets, with 'more' set on the last if there are further matches
+
+    The matches of RegEx searches are found by the RegEx search engine's worker processes, with the same deadline as the search
+    (see regex_search.match_spans_with_deadline()). If that deadline passes, there are no snippets
+    """
+    regexes = [search_regex(search.strip(), search_type) for search in searches if search.strip()]
+    snippets = {text_id: [] for text_id in text_ids}
+    if not regexes:
+        return snippets
+
+    rows = list(models.TextSearchIndex.objects.filter(text_id__in=text_ids).exclude(content='').order_by('text_id', 'id').values_list(
+        'text_id', 'text_folio_id', 'field', 'content'
+    ))
+    contents = [content for _, _, _, content in rows]
+    # Spans of the matches of each regex in each row, e.g. [[[(start, end), ...] for each row] for each regex]
+    # (up to one more than SNIPPETS_MAX, to know if a Text has further matches)
+    if search_type == 'regex':
+        try:
+            regexes_spans = [
+                regex_search.match_spans_with_deadline(
+                    regex, contents, SNIPPETS_MAX + 1, processes=settings.REGEX_SEARCH_PROCESSES, timeout=settings.REGEX_SEARCH_TIMEOUT
+                )
+                for regex in regexes
+            ]
+        except regex_search.RegexSearchTimeout:
+            return snippets
+    else:
+        regexes_spans = [regex_search.match_spans(regex, contents, SNIPPETS_MAX + 1) for regex in regexes]
+    folio_names = {
+        folio.id: folio.name_short for folio in
+        models.TextFolio.objects.filter(text_id__in=text_ids).select_related('side', 'open_state').only('id', 'side', 'open_state')
+    }
+    texts_rtl = set(models.Text.objects.filter(id__in=text_ids, primary_language__script__is_written_right_to_left=True).values_list('id', flat=True))
+    # Texts that already have SNIPPETS_MAX snippets
+    texts_complete = set()
+    for row_index, (text_id, text_folio_id, field, content) in enumerate(rows):
+        text_snippets = snippets[text_id]
+        if text_id in texts_complete:
+            continue
+        for regex_spans in regexes_spans:
+            for start, end in regex_spans[row_index]:
+                if len(text_snippets) == SNIPPETS_MAX:
+                    text_snippets[-1]['more'] = True
+                    texts_complete.add(text_id)
+                    break
+                line_start = content.rfind('\n', 0, start) + 1
+                line_end = content.find('\n', end)
+                line_end = len(content) if line_end == -1 else line_end
+                before_start = max(line_start, start - SNIPPET_CONTEXT_LENGTH)
+                after_end = min(line_end, end + SNIPPET_CONTEXT_LENGTH)
+                text_snippets.append({
+                    'folio': folio_names.get(text_folio_id),
+                    'field': field,
+                    'field_label': field.replace('_', ' ').capitalize(),
+                    'rtl': text_id in texts_rtl and field == 'transcription',
+                    'line': content.count('\n', 0, start) + 1,
+                    'start': start,
+                    'end': end,
+                    'before': ('...' if before_start > line_start else '') + content[before_start:start],
+                    'match': content[start:end],
+                    'after': content[end:after_end] + ('...' if after_end < line_end else ''),
+                })
+            if text_id in texts_complete:
+                break
+    return snippets
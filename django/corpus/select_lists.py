@@ -0,0 +1,41 @@
+"""
+Select list options of the filters of the Text list page (e.g. collections, types, languages), used by TextListView,
+and of the Tag Manager form of the Text detail page (see textfoliotag_options())
+
+Each process keeps the options of each select list once loaded, so the filters don't need database queries on every request.
+The options are reloaded when the version of the corpus changes, i.e. when any object of the corpus app
+(including every select list model, as they all inherit from SlAbstract) is saved or deleted (see versions.py and signals.py)
+
+The options are shared by all requests of the process, so must be copied before being changed (e.g. to add a facet count)
+"""
+
+from . import models, versions
+
+
+# Querysets of the options of each select list
+SELECT_LISTS = {
+    'centuries': lambda: models.SlTextGregorianCentury.objects.all(),
+    'tags': lambda: models.SlTextFolioTag.objects.all().select_related('category'),
+    'tag_categories': lambda: models.SlTextFolioTagCategory.objects.all(),
+    'primary_languages': lambda: models.SlTextLanguage.objects.filter(texts_primary__isnull=False).distinct().select_related('script'),
+    'additional_languages': lambda: models.SlTextLanguage.objects.filter(texts__isnull=False).distinct().select_related('script'),
+    'collections': lambda: models.SlTextCollection.objects.all(),
+    'corpora': lambda: models.SlTextCorpus.objects.all(),
+    'types': lambda: models.SlTextType.objects.all().select_related('category'),
+    'writing_supports': lambda: models.SlTextWritingSupport.objects.all(),
+}
+
+# The version of the corpus of the options loaded by this process, and the options of each select list loaded so far
+_version = None
+_select_lists = {}
+
+
+def select_list(name):
+    """ Returns a list of the options of the named select list (see SELECT_LISTS), loading them if the corpus has changed """
+    global _version, _select_lists
+    version = versions.version_get('corpus')
+    if _version != version:
+        _version, _select_lists = version, {}
+    if name not in _select_lists:
+        _select_lists[name] = list(SELECT_LISTS[name]())
+    return _select_lists[name]
@@ -0,0 +1,143 @@
+"""
+Signal receivers of the corpus app (connected in apps.py)
+"""
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from . import facets, models, versions
+
+
+def corpus_changed(sender, **kwargs):
+    """
+    Bump the version of the corpus whenever any of its data changes
+    Bumped once the transaction is committed, otherwise another request could rebuild data cached by version (e.g. the facet index)
+    from the previous data before it's committed and cache it under the new version
+    """
+    transaction.on_commit(lambda: versions.version_bump('corpus'))
+
+
+def select_lists_changed(sender, **kwargs):
+    """
+    Bump the version of the select lists (e.g. collections, types) whenever any of them change
+    Bumped once the transaction is committed (see corpus_changed())
+    """
+    transaction.on_commit(lambda: versions.version_bump('select_lists'))
+
+
+# Models of a Text and its related data, and how to get the ids of the Texts from an object of each
+TEXT_MODELS = {
+    'text': lambda obj: [obj.id],
+    'textfolio': lambda obj: [obj.text_id],
+    'textfoliotag': lambda obj: list(models.TextFolio.objects.filter(id=obj.text_folio_id).values_list('text_id', flat=True)),
+    'seal': lambda obj: [obj.text_id],
+    'personintext': lambda obj: [obj.text_id],
+    'textdate': lambda obj: [obj.text_id],
+    'textrelatedpublication': lambda obj: [obj.text_id],
+    'm2mtexttotext': lambda obj: [obj.text_1_id, obj.text_2_id],
+}
+# Models that are shown on the card of a Text on the Text list page (see TextListSummary)
+TEXT_LIST_SUMMARY_MODELS = ['text', 'textfolio', 'textfoliotag', 'seal']
+# Models that are also shown on the detail pages of other Texts, and how to get the ids of those Texts from an object of each
+# e.g. the title of a Text is shown on the pages of its related Texts and of Texts with the same toponyms (on the map)
+TEXT_DETAIL_MODELS = {
+    'text': lambda obj: list(
+        models.Text.objects.filter(
+            Q(text_1__text_2=obj) | Q(text_2__text_1=obj) | Q(toponyms__in=obj.toponyms.all())
+        ).exclude(id=obj.id).values_list('id', flat=True).distinct()
+    ),
+    'person': lambda obj: list(
+        models.PersonInText.objects.filter(Q(person=obj) | Q(person__person_1__person_2=obj)).values_list('text_id', flat=True).distinct()
+    ),
+    'm2mpersontoperson': lambda obj: list(models.PersonInText.objects.filter(person_id=obj.person_1_id).values_list('text_id', flat=True).distinct()),
+}
+
+
+def text_updated(text_id, update_list_summary):
+    """
+    Update the TextListSummary of the Text (if needed) and then bump the version of the Text
+    The version of the list summaries is also bumped, as the Text list page (see TextListView.get()) can change without the corpus changing
+    (e.g. the list image of a Text, once the small version of its image is created)
+    Saving a TextListSummary doesn't change the corpus version (see connect()), except when its counts change, as 'count_' sorts
+    of the facet index are ordered by them (and the corpus version was bumped before the summary was updated)
+    """
+    if update_list_summary:
+        counts = models.TextListSummary.objects.filter(text_id=text_id).values_list(*facets.TEXT_LIST_SUMMARY_COUNTS).first()
+        summary = models.TextListSummary.update_text(text_id)
+        versions.version_bump('text_list_summaries')
+        if summary is not None and counts != tuple(getattr(summary, field) for field in facets.TEXT_LIST_SUMMARY_COUNTS):
+            versions.version_bump('corpus')
+    versions.version_bump(versions.text_version_name(text_id))
+
+
+def texts_updated(text_ids, update_list_summary):
+    """
+    Update each Text (see text_updated()) once the transaction is committed,
+    as some data (e.g. the small image of a TextFolio) is set after the object is saved
+    """
+    for text_id in set(text_ids):
+        if text_id is not None:
+            transaction.on_commit(lambda text_id=text_id: text_updated(text_id, update_list_summary))
+
+
+def text_changed(sender, instance, **kwargs):
+    """ Update the Texts of the saved/deleted object (see texts_updated()) """
+    model_name = sender._meta.model_name
+    texts_updated(TEXT_MODELS[model_name](instance), model_name in TEXT_LIST_SUMMARY_MODELS)
+
+
+def text_detail_changed(sender, instance, **kwargs):
+    """
+    Bump the version of each other Text whose detail page shows the object being saved/deleted (see TEXT_DETAIL_MODELS)
+    Connected to pre_delete rather than post_delete, as the relationships to the Texts are deleted with the object
+    """
+    texts_updated(TEXT_DETAIL_MODELS[sender._meta.model_name](instance), False)
+
+
+def text_m2m_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Bump the version of each Text whose many to many relationships (e.g. toponyms, or the colours of its seals) have changed
+    Also bumps the versions of the Texts whose detail pages show the Text, i.e. its related Texts and Texts with the same toponyms
+    """
+    if action.startswith('post_'):
+        owner_model = model if reverse else type(instance)
+        owners = model.objects.filter(pk__in=pk_set or []) if reverse else [instance]
+        text_ids = [text_id for owner in owners for text_id in TEXT_MODELS[owner_model._meta.model_name](owner)]
+        if sender is models.Text.toponyms.through:
+            toponym_ids = [instance.id] if reverse else (pk_set or [])
+            text_ids += models.Text.objects.filter(toponyms__in=toponym_ids).values_list('id', flat=True)
+        elif sender is models.Text.texts.through:
+            text_ids += pk_set or []
+        texts_updated(text_ids, False)
+
+
+def connect():
+    """
+    Connect the receivers to the models of the corpus app
+    Receivers are connected to each model, rather than to all senders, so that models without receivers
+    (e.g. TextSearchIndex, which is rebuilt on every save of a Text) can still be deleted in bulk without signals
+    IIIFManifest is a cache of external data rather than part of the corpus, so doesn't change the corpus version,
+    and neither do ImageDerivativeJob objects (the Text of each job's object is updated once it's processed, see image_derivatives_process)
+    or TextListSummary objects (which are derived from the corpus, and have their own versions, see text_updated()),
+    or SavedSearch objects (which are saved when rendering the Text list page)
+    """
+    for model in apps.get_app_config('corpus').get_models():
+        model_name = model._meta.model_name
+        if model_name in ('textsearchindex', 'iiifmanifest', 'imagederivativejob', 'textlistsummary', 'savedsearch'):
+            continue
+        post_save.connect(corpus_changed, sender=model, dispatch_uid=f'corpus_changed_save_{model_name}')
+        post_delete.connect(corpus_changed, sender=model, dispatch_uid=f'corpus_changed_delete_{model_name}')
+        for field in model._meta.local_many_to_many:
+            m2m_changed.connect(corpus_changed, sender=field.remote_field.through, dispatch_uid=f'corpus_changed_m2m_{model_name}_{field.name}')
+            if model_name in TEXT_MODELS:
+                m2m_changed.connect(text_m2m_changed, sender=field.remote_field.through, dispatch_uid=f'text_m2m_changed_{model_name}_{field.name}')
+        if model_name in TEXT_MODELS:
+            post_save.connect(text_changed, sender=model, dispatch_uid=f'text_changed_save_{model_name}')
+            post_delete.connect(text_changed, sender=model, dispatch_uid=f'text_changed_delete_{model_name}')
+        if model_name in TEXT_DETAIL_MODELS:
+            post_save.connect(text_detail_changed, sender=model, dispatch_uid=f'text_detail_changed_save_{model_name}')
+            pre_delete.connect(text_detail_changed, sender=model, dispatch_uid=f'text_detail_changed_delete_{model_name}')
+        if issubclass(model, models.SlAbstract):
+            post_save.connect(select_lists_changed, sender=model, dispatch_uid=f'select_lists_changed_save_{model_name}')
+            post_delete.connect(select_lists_changed, sender=model, dispatch_uid=f'select_lists_changed_delete_{model_name}')
@@ -24,12 +24,47 @@ function setUrlParameter(parameter, value) {
 // Tabs
 //
 
+// Load the content of a tab, if it's not loaded yet (only the content of the active tab is rendered with the page)
+// The content is loaded from the URL in the data-tabcontent attribute of the tab's article (see TextDetailTabView)
+// Returns a promise that's resolved once the content is loaded
+var tabContentRequests = {};
+function loadTab(tabId){
+    let article = $('article.tabbed#corpus-text-detail-content-' + tabId);
+    let url = article.attr('data-tabcontent');
+    // Already loaded (or the Text doesn't have this tab)
+    if (!url) return $.when();
+    if (!tabContentRequests[tabId]){
+        // The codex tab shows the current page of codex images
+        if (tabId === 'codex' && getUrlParameter('codex_pagination')) url += '?codex_pagination=' + encodeURIComponent(getUrlParameter('codex_pagination'));
+        tabContentRequests[tabId] = $.ajax({
+            url: url,
+            success: function(html){
+                article.removeAttr('data-tabcontent').html(html);
+                initTabContent(article);
+            },
+            error: function(){
+                delete tabContentRequests[tabId];
+                article.html('<p>Failed to load. Please try again.</p>');
+            }
+        });
+    }
+    return tabContentRequests[tabId];
+}
+
+// Open a tab, returning a promise that's resolved once its content is loaded (e.g. to then go to an element within it)
+function openTab(tabId){
+    $(`#corpus-text-detail-content-tabs li#${tabId}`).trigger('click');
+    return loadTab(tabId);
+}
+
 // Tabbed sections
 $('#corpus-text-detail-content-tabs li').on('click', function(){
     // Show/hide the appropriate sections
     var activeTabId = $(this).attr('id');
     $('article.tabbed#corpus-text-detail-content-' + activeTabId).scrollTop(0).addClass('active');
     $('article.tabbed:not(#corpus-text-detail-content-' + activeTabId + ')').removeClass('active');
+    // Load the content of the section (if not loaded yet)
+    loadTab(activeTabId);
     // Alter active state of tab button
     $('#corpus-text-detail-content-tabs li').removeClass('active');
     $(this).addClass('active');
@@ -58,8 +93,27 @@ function setTabFromUrl(){
 }
 setTabFromUrl();  // Set initial tab on page load
 
-// On print show all tabs
+// Print all tabs, once the content of any that aren't loaded yet is loaded
+function printTabs(){
+    let requests = $('article.tabbed[data-tabcontent]').map(function(){
+        return loadTab($(this).attr('id').replace('corpus-text-detail-content-', ''));
+    }).get();
+    $.when(...requests).always(function(){ window.print(); });
+}
+$('#corpus-text-detail-content-title-print').on('click', printTabs);
+// Ctrl/Cmd + P also loads all tabs before printing
+$(document).on('keydown', function(e){
+    if ((e.ctrlKey || e.metaKey) && e.key === 'p'){
+        e.preventDefault();
+        printTabs();
+    }
+});
+
+// On print show all tabs (printing from the browser's menu doesn't wait for tabs that aren't loaded yet, so starts loading them)
 $(window).bind("beforeprint", function(){
+    $('article.tabbed[data-tabcontent]').each(function(){
+        loadTab($(this).attr('id').replace('corpus-text-detail-content-', ''));
+    });
     $('article.tabbed').show();
 });
 
@@ -69,14 +123,23 @@ $(window).bind("afterprint", function(){
 });
 
 
-//
-// Detail
-//
-
-// Hide a section if it's empty (otherwise the h3 section title will show but with no content)
-$('.corpus-text-detail-content-details-datagroup').each(function(){
-    if ($(this).find('div').length < 1) $(this).hide();
-});
+// Set up the content of a tab once it's loaded (e.g. show the active folio, add image parts of its lines of text)
+function initTabContent(article){
+    // Details: hide a section if it's empty (otherwise the h3 section title will show but with no content)
+    article.find('.corpus-text-detail-content-details-datagroup').each(function(){
+        if ($(this).find('div').length < 1) $(this).hide();
+    });
+    // Codex: set current page value in select list
+    if (getUrlParameter('codex_pagination')) article.find('#codex-pagination-select').val(getUrlParameter('codex_pagination'));
+    // Trans fields
+    if (article.is('[data-trans]')) initTransContent(article);
+    // Highlight search terms (see highlight.js)
+    highlightSearchTerms(article);
+    // Show only the active folio (or the first folio of the tab, if no folio is active yet)
+    let folioSelect = article.find('.corpus-text-detail-folio-select');
+    if (activeFolioId !== undefined) setActiveFolio(activeFolioId);
+    else if (folioSelect.length) setActiveFolio(folioSelect.val());
+}
 
 
 //
@@ -86,13 +149,10 @@ $('.corpus-text-detail-content-details-datagroup').each(function(){
 // Pagination:
 
 // Selecting a page
-$('#codex-pagination select').on('change', function(){
+$('body').on('change', '#codex-pagination select', function(){
     $(this).closest('form').submit();
 });
 
-// Setting current page value in select list
-if (getUrlParameter('codex_pagination')) $('#codex-pagination-select').val(getUrlParameter('codex_pagination'));
-
 // Click a thumbnail to make that image active in the image viewer
 $('body').on('click', '.codex-thumbnails-item', function(){
     // Get the url of the main, high-res image
@@ -149,23 +209,25 @@ $('#corpus-text-detail-images-image-codex-img').on("load", function(){
 //
 
 // Load folio when clicking on it
-$('.corpus-text-detail-content-folios-folio-imagecontainer').on('click', function(){
+$('body').on('click', '.corpus-text-detail-content-folios-folio-imagecontainer', function(){
     let folioId = $(this).closest('.corpus-text-detail-content-folios-folio').attr('data-folio');
     $('#corpus-text-detail-images-controls-chooseimage select').val(folioId).trigger('change');
 });
 
 // Load folio in another tab
-$('.corpus-text-detail-content-folios-folio-links div').on('click', function(){
+$('body').on('click', '.corpus-text-detail-content-folios-folio-links div', function(){
     let folioId = $(this).closest('.corpus-text-detail-content-folios-folio').attr('data-folio');
     let tab = $(this).attr('data-tab');
     // Select this folio in the specified trans tab
-    $(`#corpus-text-detail-content-tabs #${tab}`).trigger('click');
-    $(`article#corpus-text-detail-content-${tab}`).find('.corpus-text-detail-folio-select').val(folioId).trigger('change');
+    openTab(tab).then(function(){
+        $(`article#corpus-text-detail-content-${tab}`).find('.corpus-text-detail-folio-select').val(folioId).trigger('change');
+    });
 });
 
-// Select folio (this appears in other tabs, e.g. tags, transcription, etc)
-$('.corpus-text-detail-folio-select').on('change', function(){
-    let folioId = $(this).val();
+// Set the active folio, shown in all tabs (e.g. tags, transcription, etc) and in the image
+var activeFolioId;
+function setActiveFolio(folioId){
+    activeFolioId = folioId;
     // Show only this folio in the tags tab
     $('.corpus-text-detail-content-tags-folio').hide();
     $(`.corpus-text-detail-content-tags-folio[data-folio="${folioId}"`).show();
@@ -182,15 +244,44 @@ $('.corpus-text-detail-folio-select').on('change', function(){
     // Show this folio in palaeography
     $('.corpus-text-detail-content-palaeography-folio').hide();
     $(`.corpus-text-detail-content-palaeography-folio[data-folio="${folioId}"`).show();
-}).trigger('change');
+}
+
+// Select folio (this appears in other tabs, e.g. tags, transcription, etc)
+$('body').on('change', '.corpus-text-detail-folio-select', function(){
+    setActiveFolio($(this).val());
+});
 
 
 //
 // Tags
 //
 
+// Load the options of the category and tag select lists of the Tag Manager form (once, when it's first shown)
+// The options are loaded from the URL in the data-options attribute of the form (see textfoliotag_options())
+var tagManagerOptionsRequest;
+function loadTagManagerOptions(){
+    let form = $('#corpus-text-detail-content-tags-textfoliotag-form');
+    if (!tagManagerOptionsRequest){
+        tagManagerOptionsRequest = $.getJSON(form.attr('data-options'), function(options){
+            let categorySelect = form.find('select[name="category"]');
+            let tagExistingSelect = form.find('select[name="tag_existing"]');
+            options.categories.forEach(function(category){
+                categorySelect.append($('<option>').val(category.id).text(category.name));
+            });
+            options.tags.forEach(function(tag){
+                tagExistingSelect.append($('<option>').val(tag.id).attr('data-tagcategory', tag.category).text(tag.name));
+            });
+            categorySelect.trigger('change');
+        }).fail(function(){
+            tagManagerOptionsRequest = undefined;
+        });
+    }
+    return tagManagerOptionsRequest;
+}
+
 // Show Tag Manager form
 $('#corpus-text-detail-content-tags-textfoliotag-form-show').on('click', function(){
+    loadTagManagerOptions();
     $('#corpus-text-detail-content-tags-textfoliotag-form').slideDown();
 });
 
@@ -262,7 +353,7 @@ $('#corpus-text-detail-content-tags-textfoliotag-form input[name="tag_new"]').on
 }).trigger('change');
 
 // Clicking on a tag when linking text will create a link to that tag
-$('.corpus-text-detail-content-tags-folio-tagcategory-tag').on('click', function(){
+$('body').on('click', '.corpus-text-detail-content-tags-folio-tagcategory-tag', function(){
     if (linkTransTextToTagData){
         // Add this text folio tag ID to the data and submit form
         linkTransTextToTagData.textFolioTagExistingId = $(this).attr('data-textfoliotag');
@@ -272,21 +363,22 @@ $('.corpus-text-detail-content-tags-folio-tagcategory-tag').on('click', function
 });
 
 // Hovering over a tag will highlight it in the tag list and on the image
-$('.corpus-text-detail-content-tags-folio-tagcategory-tag, .corpus-text-detail-images-image-parts-part').on('mouseover', function(){
+$('body').on('mouseover', '.corpus-text-detail-content-tags-folio-tagcategory-tag, .corpus-text-detail-images-image-parts-part[data-textfoliotag]', function(){
     let tagId = $(this).attr('data-textfoliotag');
     $(`.corpus-text-detail-content-tags-folio-tagcategory-tag[data-textfoliotag="${tagId}"], .corpus-text-detail-images-image-parts-part[data-textfoliotag="${tagId}"]`).addClass('active');
-}).on('mouseout', function(){
+}).on('mouseout', '.corpus-text-detail-content-tags-folio-tagcategory-tag, .corpus-text-detail-images-image-parts-part[data-textfoliotag]', function(){
     let tagId = $(this).attr('data-textfoliotag');
     $(`.corpus-text-detail-content-tags-folio-tagcategory-tag[data-textfoliotag="${tagId}"], .corpus-text-detail-images-image-parts-part[data-textfoliotag="${tagId}"]`).removeClass('active');
 });
 
 // Link from tag in tags tab to tag in trans text
-$('.corpus-text-detail-content-tags-folio-tagcategory-tag-links-link').on('click', function(){
+$('body').on('click', '.corpus-text-detail-content-tags-folio-tagcategory-tag-links-link', function(){
     let trans = $(this).attr('data-trans');
     let textfoliotag = $(this).closest('.corpus-text-detail-content-tags-folio-tagcategory-tag').attr('data-textfoliotag');
-    $(`#corpus-text-detail-content-tabs li#${trans}`).trigger('click');
-    $(`article[data-trans="${trans}"]`).find('.corpus-text-detail-trans-linktranstexttotag-checkbox').prop('checked', false).trigger('change');
-    $(`article[data-trans="${trans}"]`).find(`var[data-textfoliotag="${textfoliotag}"]`).addClass('active');
+    openTab(trans).then(function(){
+        $(`article[data-trans="${trans}"]`).find('.corpus-text-detail-trans-linktranstexttotag-checkbox').prop('checked', false).trigger('change');
+        $(`article[data-trans="${trans}"]`).find(`var[data-textfoliotag="${textfoliotag}"]`).addClass('active');
+    });
 });
 
 
@@ -294,58 +386,93 @@ $('.corpus-text-detail-content-tags-folio-tagcategory-tag-links-link').on('click
 // Trans fields (i.e. transcription, translation, transliteration)
 //
 
-// Options: Show related trans
-$('.corpus-text-detail-inline-trans-checkbox').on('change', function(){
-    related_trans_lines = $(this).closest('article').find(`.related-lines[data-trans="${$(this).attr('data-trans')}"]`);
-    if ($(this).is(':checked')) related_trans_lines.show();
-    else related_trans_lines.hide();
-}).each(function(){
-    // Ensure all checkboxes are unchecked on page load
-    $(this).prop('checked', false);
+// Options: Show related trans (loading the related trans tab first, if it's not loaded yet)
+$('body').on('change', '.corpus-text-detail-inline-trans-checkbox', function(){
+    let checkbox = $(this);
+    loadTab(checkbox.attr('data-trans')).then(function(){
+        related_trans_lines = checkbox.closest('article').find(`.related-lines[data-trans="${checkbox.attr('data-trans')}"]`);
+        if (checkbox.is(':checked')) related_trans_lines.show();
+        else related_trans_lines.hide();
+    });
 });
 
 // Options: Show links to tags
-$('.corpus-text-detail-trans-linktranstexttotag-checkbox').on('change', function(){
+$('body').on('change', '.corpus-text-detail-trans-linktranstexttotag-checkbox', function(){
     links = $(this).closest('article').find(`var[data-textfoliotag]`);
     if ($(this).is(':checked')) links.addClass('active');
     else links.removeClass('active');
-}).each(function(){
-    // Ensure all checkboxes are unchecked on page load
-    $(this).prop('checked', false);
 });
 
 // Add related trans lines to trans lines (e.g. add related translation and transliteration to the transcription lines)
+// Called each time the content of a trans tab is loaded, so the lines of all loaded trans tabs are related to each other
 var transFields = ['transcription', 'translation', 'transliteration'];
-transFields.forEach(function(transField){
-    $(`article[data-trans="${transField}"] .folio-lines-line`).each(function(i, trans){
-        var transMainLineNumbers = $(trans).attr('data-linenumbers').split(',');
-        var transFolio = $(trans).attr('data-folio');
-        transFields.forEach(function(transFieldRelated){
-            if (transField !== transFieldRelated){
-                $(`article[data-trans="${transFieldRelated}"] .folio-lines-line[data-folio="${transFolio}"]`).each(function(i, transRelated){
-                    var transRelatedLineNumbers = $(transRelated).attr('data-linenumbers').split(',');
-                    var transRelatedLineIndex = $(transRelated).attr('data-lineindex').split(',');
-                    if (transRelatedLineNumbers.some(transRelatedLineNumber => transMainLineNumbers.includes(transRelatedLineNumber))){
-                        var relatedLineHtml = `<div class="related-lines-line" data-trans="${transFieldRelated}" data-folio="${transFolio}" data-lineindex="${transRelatedLineIndex}">${$(transRelated).html()}</div>`;
-                        $(trans).parent().find(`.related-lines[data-trans="${transFieldRelated}"]`).append(relatedLineHtml);
-                    }
-                });
-            }
+function addRelatedTransLines(){
+    $('.related-lines').empty();
+    transFields.forEach(function(transField){
+        $(`article[data-trans="${transField}"] .folio-lines-line`).each(function(i, trans){
+            var transMainLineNumbers = $(trans).attr('data-linenumbers').split(',');
+            var transFolio = $(trans).attr('data-folio');
+            transFields.forEach(function(transFieldRelated){
+                if (transField !== transFieldRelated){
+                    $(`article[data-trans="${transFieldRelated}"] .folio-lines-line[data-folio="${transFolio}"]`).each(function(i, transRelated){
+                        var transRelatedLineNumbers = $(transRelated).attr('data-linenumbers').split(',');
+                        var transRelatedLineIndex = $(transRelated).attr('data-lineindex').split(',');
+                        if (transRelatedLineNumbers.some(transRelatedLineNumber => transMainLineNumbers.includes(transRelatedLineNumber))){
+                            var relatedLineHtml = `<div class="related-lines-line" data-trans="${transFieldRelated}" data-folio="${transFolio}" data-lineindex="${transRelatedLineIndex}">${$(transRelated).html()}</div>`;
+                            $(trans).parent().find(`.related-lines[data-trans="${transFieldRelated}"]`).append(relatedLineHtml);
+                        }
+                    });
+                }
+            });
         });
     });
-});
+}
 
-// Add a drawing button to all folio-lines-line within transcription (if permitted)
-$('#corpus-text-detail-content-transcription .corpus-text-detail-content-transcription-folio-lines[data-showfoliolinedraw="1"]').each(function(){
-    $(this).find('.folio-lines-line').each(function(){
-        $(this).append(`<span class="folio-lines-line-draw-container"><span class="folio-lines-line-draw"><input class="folio-lines-line-draw-start" title="Click to start drawing this part of the table on the image" type="checkbox"/> <i class="fas fa-pencil-alt"></i></span></span>`);
+// Set up the content of a trans tab once it's loaded
+function initTransContent(article){
+    // Ensure all option checkboxes are unchecked
+    article.find('.corpus-text-detail-inline-trans-checkbox, .corpus-text-detail-trans-linktranstexttotag-checkbox').prop('checked', false);
+
+    addRelatedTransLines();
+
+    // Add a drawing button to all folio-lines-line within transcription (if permitted)
+    article.find('.corpus-text-detail-content-transcription-folio-lines[data-showfoliolinedraw="1"]').each(function(){
+        $(this).find('.folio-lines-line').each(function(){
+            $(this).append(`<span class="folio-lines-line-draw-container"><span class="folio-lines-line-draw"><input class="folio-lines-line-draw-start" title="Click to start drawing this part of the table on the image" type="checkbox"/> <i class="fas fa-pencil-alt"></i></span></span>`);
+        });
     });
-});
 
-// Add a delete drawing button to all folio-lines-line that have an existing drawing
-$('.folio-lines-line').each(function(){
-    if (typeof $(this).attr('data-imagepartheight') !== 'undefined') $(this).find('.folio-lines-line-draw').append(' <i class="folio-lines-line-draw-delete fas fa-times-circle" title="Delete the drawing of this line on the image"></i>')
-});
+    // Add a delete drawing button to all folio-lines-line that have an existing drawing
+    article.find('.folio-lines-line').each(function(){
+        if (typeof $(this).attr('data-imagepartheight') !== 'undefined') $(this).find('.folio-lines-line-draw').append(' <i class="folio-lines-line-draw-delete fas fa-times-circle" title="Delete the drawing of this line on the image"></i>')
+    });
+
+    // Ensure all folio trans lines draw start checkboxes are unchecked
+    article.find('.folio-lines-line-draw-start').prop('checked', false);
+
+    // Inject the Text Folio lines of text image parts
+    article.find('.folio-lines-line').each(function(){
+        // Attempt to get attribute values
+        let folio = $(this).attr('data-folio');
+        let lineIndex = $(this).attr('data-lineindex');
+        let lineNumbers = $(this).attr('data-linenumbers');
+        let lineNumbersLabel = (lineNumbers ? `<label>Line ${lineNumbers}</label>` : '');
+        let trans = $(this).attr('data-trans');
+        let imagePartLeft = $(this).attr('data-imagepartleft');
+        let imagePartTop = $(this).attr('data-imageparttop');
+        let imagePartWidth = $(this).attr('data-imagepartwidth');
+        let imagePartHeight = $(this).attr('data-imagepartheight');
+
+        // If all required data attributes provided
+        if (imagePartLeft && imagePartTop && imagePartWidth && imagePartHeight){
+            $(`#corpus-text-detail-images-image-${folio} .corpus-text-detail-images-image-parts`).append(
+                `<div class="corpus-text-detail-images-image-parts-part" data-folio="${folio}" data-lineindex="${lineIndex}" data-trans="${trans}" style="left: ${imagePartLeft}px; top: ${imagePartTop}px; width: ${imagePartWidth}px; height: ${imagePartHeight}px;">${lineNumbersLabel}</div>`
+            );
+        }
+    });
+    // Apply the 'only show' select list to the new image parts
+    $('#corpus-text-detail-images-controls-onlyshowcertainimageparts select').trigger('change');
+}
 
 // Submit form to add or delete a part on the image. To delete set deleteImagePartDrawing to true
 function submitDrawLineOnImageForm(deleteImagePartDrawing=false){
@@ -403,12 +530,9 @@ $('body').on('mouseover', '.folio-lines-line[data-trans="transcription"], .relat
     }
 });
 
-// Ensure all folio trans lines draw start checkboxes are unchecked on page load
-$('.folio-lines-line-draw-start').prop('checked', false);
-
 // When admin user highlights/selects text within the trans text
 var linkTransTextToTagData;
-$('.folio-lines').on('mouseup', function(){
+$('body').on('mouseup', '.folio-lines', function(){
     let selection = window.getSelection();
     let linkTransTextToTag = $(this).closest('article').find('.corpus-text-detail-trans-linktranstexttotag')
 
@@ -454,42 +578,45 @@ $('.folio-lines').on('mouseup', function(){
 });
 
 // Take user to choose a tag (new or existing) to link the selected text to
-$('.corpus-text-detail-trans-linktranstexttotag').on('click', function(){
+$('body').on('click', '.corpus-text-detail-trans-linktranstexttotag', function(){
     if (linkTransTextToTagData){
+        let trans = $(this).attr('data-trans');
         // Go to the 'tags' tab
-        $('#corpus-text-detail-content-tabs li#tags').trigger('click');
-        // Show the tag manager and pass the data to its hidden field
-        $('#corpus-text-detail-content-tags-textfoliotag-form-show').trigger('click');
-        $('#corpus-text-detail-content-tags-textfoliotag-form input[name="linktranstexttotag"]').val(JSON.stringify(linkTransTextToTagData));
-        // Populate content of the 'linking text to tag' box and show it
-        $('#corpus-text-detail-content-tags-textfoliotag-linktranstexttotag').html(`
-            <p>
-                Link a Tag to the ${$(this).attr('data-trans')} text: <strong>&ldquo;${linkTransTextToTagData.textSelected}&rdquo;</strong> from the line <strong>&ldquo;${linkTransTextToTagData.textWholeLine}&rdquo;</strong>
-            </p>
-            <p>
-                To link a NEW tag, complete the 'Tag Manager' form and click Save.
-            </p>
-            <p>
-                To link an EXISTING tag, simply click on the tag in the list below.
-            </p>
-        `).show();
+        openTab('tags').then(function(){
+            // Show the tag manager and pass the data to its hidden field
+            $('#corpus-text-detail-content-tags-textfoliotag-form-show').trigger('click');
+            $('#corpus-text-detail-content-tags-textfoliotag-form input[name="linktranstexttotag"]').val(JSON.stringify(linkTransTextToTagData));
+            // Populate content of the 'linking text to tag' box and show it
+            $('#corpus-text-detail-content-tags-textfoliotag-linktranstexttotag').html(`
+                <p>
+                    Link a Tag to the ${trans} text: <strong>&ldquo;${linkTransTextToTagData.textSelected}&rdquo;</strong> from the line <strong>&ldquo;${linkTransTextToTagData.textWholeLine}&rdquo;</strong>
+                </p>
+                <p>
+                    To link a NEW tag, complete the 'Tag Manager' form and click Save.
+                </p>
+                <p>
+                    To link an EXISTING tag, simply click on the tag in the list below.
+                </p>
+            `).show();
+        });
     }
 });
 
 // Link from tag in trans text to tag in tags tab
-$('var[data-textfoliotag]').on('click', function(){
+$('body').on('click', 'var[data-textfoliotag]', function(){
     if ($(this).hasClass('active')){
         let textfoliotag = $(this).attr('data-textfoliotag');
-        $('#corpus-text-detail-content-tabs li#tags').trigger('click');
-        $(`.corpus-text-detail-content-tags-folio-tagcategory-tag[data-textfoliotag="${textfoliotag}"]`).trigger('mouseover');
+        openTab('tags').then(function(){
+            $(`.corpus-text-detail-content-tags-folio-tagcategory-tag[data-textfoliotag="${textfoliotag}"]`).trigger('mouseover');
+        });
     }
 });
 
 // Show tag in image
-$('var[data-textfoliotag]').on('mouseover', function(){
+$('body').on('mouseover', 'var[data-textfoliotag]', function(){
     let tagId = $(this).attr('data-textfoliotag')
     $(`.corpus-text-detail-images-image-parts-part[data-textfoliotag="${tagId}"]`).addClass('active');
-}).on('mouseout', function(){
+}).on('mouseout', 'var[data-textfoliotag]', function(){
     let tagId = $(this).attr('data-textfoliotag')
     $(`.corpus-text-detail-images-image-parts-part[data-textfoliotag="${tagId}"]`).removeClass('active');
 });
@@ -633,7 +760,7 @@ $('#corpus-text-detail-images-controls-chooseimage select').on('change', functio
     // Mark this image as 'active'
     $('#corpus-text-detail-images-image-' + imageId).addClass('active');
     // Update folio select lists in trans tabs
-    $('.corpus-text-detail-folio-select').val(imageId).trigger('change');
+    setActiveFolio(imageId);
     // Set the 'Download image' link location
     var imageUrl = $('#corpus-text-detail-images-image-' + imageId).find('img').attr('src');
     $('#corpus-text-detail-images-controls-downloadimage a').attr('href', imageUrl);
@@ -722,7 +849,7 @@ var isDrawingNewTextFolioImagePart = false;  // User is in the process of drawin
 var newImagePartDrawData;  // top, left, width, height values of the new part
 
 // Can start drawing rectangle
-$('#corpus-text-detail-content-tags-textfoliotag-form-draw-start, .folio-lines-line-draw-start').on('change', function(){
+$('body').on('change', '#corpus-text-detail-content-tags-textfoliotag-form-draw-start, .folio-lines-line-draw-start', function(){
     // Remove any new parts that may have been drawn
     $('.corpus-text-detail-images-image-parts-part.new').remove();
     // If can draw state is active, deactivate it
@@ -842,27 +969,6 @@ $('.corpus-text-detail-images-image-drawlayer').on('mouseup', function(){
 // Stop the Text Folio image img object from dragging/selecting when trying to draw a rectangle
 $('.corpus-text-detail-images-image').bind('dragstart', function(){ return false; });
 
-// Inject the Text Folio lines of text image parts
-$('.folio-lines-line').each(function(){
-    // Attempt to get attribute values
-    let folio = $(this).attr('data-folio');
-    let lineIndex = $(this).attr('data-lineindex');
-    let lineNumbers = $(this).attr('data-linenumbers');
-    let lineNumbersLabel = (lineNumbers ? `<label>Line ${lineNumbers}</label>` : '');
-    let trans = $(this).attr('data-trans');
-    let imagePartLeft = $(this).attr('data-imagepartleft');
-    let imagePartTop = $(this).attr('data-imageparttop');
-    let imagePartWidth = $(this).attr('data-imagepartwidth');
-    let imagePartHeight = $(this).attr('data-imagepartheight');
-
-    // If all required data attributes provided
-    if (imagePartLeft && imagePartTop && imagePartWidth && imagePartHeight){
-        $(`#corpus-text-detail-images-image-${folio} .corpus-text-detail-images-image-parts`).append(
-            `<div class="corpus-text-detail-images-image-parts-part" data-folio="${folio}" data-lineindex="${lineIndex}" data-trans="${trans}" style="left: ${imagePartLeft}px; top: ${imagePartTop}px; width: ${imagePartWidth}px; height: ${imagePartHeight}px;">${lineNumbersLabel}</div>`
-        );
-    }
-});
-
 // Click on an image part to show the relevant data
 $('body').on('click', '.corpus-text-detail-images-image-parts-part.active', function(){
     // Determine tab to go to
@@ -873,27 +979,36 @@ $('body').on('click', '.corpus-text-detail-images-image-parts-part.active', func
     // Go to tab
     if (tab) $(`#corpus-text-detail-content-tabs li#${tab}:not(.active)`).trigger('click');
 
-    // Scroll to relevant element (e.g. tag or line of text) within tab
-    // Tag
-    if (tab === 'tags'){
-        $('#corpus-text-detail-content-tags').animate({
-            scrollTop: $('.corpus-text-detail-content-tags-folio-tagcategory-tag.active').first().offset().top
-        });
-    }
-    // Line of Text
-    else if (tab === 'transcription'){
-        $('#corpus-text-detail-content-transcription').animate({
-            scrollTop: $('.folio-lines-line.active').first().offset().top - 300
-        });
-    }
+    // Scroll to relevant element (e.g. tag or line of text) within tab, once its content is loaded
+    let tagId = $(this).attr('data-textfoliotag');
+    loadTab(tab).then(function(){
+        // Tag
+        if (tab === 'tags'){
+            $(`.corpus-text-detail-content-tags-folio-tagcategory-tag[data-textfoliotag="${tagId}"]`).addClass('active');
+            $('#corpus-text-detail-content-tags').animate({
+                scrollTop: $('.corpus-text-detail-content-tags-folio-tagcategory-tag.active').first().offset().top
+            });
+        }
+        // Line of Text
+        else if (tab === 'transcription'){
+            $('#corpus-text-detail-content-transcription').animate({
+                scrollTop: $('.folio-lines-line.active').first().offset().top - 300
+            });
+        }
+    });
 });
 
+// Set up the content of the active tab, rendered with the page
+initTabContent($('article.tabbed:not([data-tabcontent])'));
+
 // Apply the select list image controls once page is loaded, for either Text Folio images or Codex images
 // Text Folio Images
 if ($('#corpus-text-detail-images-controls-chooseimage').length){
     if (getUrlParameter('textfolio')) $('#corpus-text-detail-images-controls-chooseimage select').val(getUrlParameter('textfolio'));
     $('#corpus-text-detail-images-controls-chooseimage select').trigger('change');
     $('#corpus-text-detail-images-controls-onlyshowcertainimageparts select').trigger('change');
+    // The image parts of the lines of text are added from the transcription, so load it (if it's not the active tab)
+    loadTab('transcription');
 }
 // Codex Images
 else {
@@ -902,7 +1017,10 @@ else {
     // Set default image (try to get from URL, if not in URL then use first)
     if (getUrlParameter('codex')) defaultCodexImage = getUrlParameter('codex');
     else defaultCodexImage = 1;
-    setActiveCodexImageByIndex(defaultCodexImage);
+    // The images are in the codex tab, so load it first (if it's not the active tab)
+    loadTab('codex').then(function(){
+        setActiveCodexImageByIndex(defaultCodexImage);
+    });
     // Use left/right keyboard arrow keys to navigate previous/next manuscript images
     $('body').on('keydown', function(e){
         if (e.keyCode === 37) $('#corpus-text-detail-images-controls-codeximagenav-previous').trigger('click');
@@ -93,6 +93,36 @@ $('#corpus-text-list-options').on('click', '.corpus-text-list-options-search-fie
     $(this).parent().remove();
 });
 
+// Autocomplete suggestions (e.g. tags, toponyms, persons, collections, and shelfmarks) when typing in a search box
+// Selecting a suggestion goes straight to its filtered list of Texts (or the Text, for shelfmarks) rather than searching for it
+let autocompleteRequest = null;
+let autocompleteTimeout = null;
+$('#corpus-text-list-options-search-fields').on('input', 'input', function(){
+    let input = $(this);
+    let q = input.val().trim();
+    clearTimeout(autocompleteTimeout);
+    if (autocompleteRequest) autocompleteRequest.abort();
+    $('.corpus-text-list-options-search-autocomplete').remove();
+    // Not relevant to RegEx searches
+    if (q.length < 2 || $('#corpus-text-list-options-search-type').val() === 'regex') return;
+    // Wait for the user to stop typing before requesting suggestions
+    autocompleteTimeout = setTimeout(function(){
+        autocompleteRequest = $.getJSON("{% url 'corpus:text-list-autocomplete' %}", {q: q}, function(data){
+            if (!data.suggestions.length) return;
+            let list = $('<ul class="corpus-text-list-options-search-autocomplete"></ul>');
+            data.suggestions.forEach(function(suggestion){
+                list.append($('<li>').append($('<a>').attr('href', suggestion.url).text(suggestion.label).append($('<em>').text(suggestion.type))));
+            });
+            input.parent().append(list);
+        });
+    }, 150);
+});
+
+// Hide autocomplete suggestions when clicking elsewhere
+$(document).on('click', function(e){
+    if (!$(e.target).closest('.corpus-text-list-options-search-autocomplete').length) $('.corpus-text-list-options-search-autocomplete').remove();
+});
+
 // Toggle search operator (or / and)
 $('#corpus-text-list-options').on('click', '.corpus-text-list-options-search-fields-instance-operator', function(){
     // Swap between 
@@ -135,6 +165,9 @@ $('#corpus-text-list-pagination-current-pageselector').on('change', function(){
     if (newPage > maxPage) newPage = maxPage;
     let url = new URL(window.location.href);
     url.searchParams.set('page', newPage);
+    // Go to the page by its number rather than a cursor (see TextListView.paginate_queryset())
+    url.searchParams.delete('after');
+    url.searchParams.delete('before');
     window.location.href = url.toString();
 });
 
@@ -43,14 +43,19 @@ L.tileLayer(
             markerPopupHtml += `<div class="map-iedctoponyms-popup-subtitle">${(langIsFa ? 'لینک‌ها' : 'Links')}</div>{{ toponym.urls_as_html_links }}`;
         {% endif %}
 
-        // Add texts
-        {% if toponym.texts.all %}
+        // Add texts (the first texts from the summary of the toponym, and a link to load the others)
+        {% if toponym.texts_summary.count %}
             // Add subtitle for texts, if there are any
-            markerPopupHtml += `<div class="map-iedctoponyms-popup-subtitle">${(langIsFa ? 'متون' : 'Texts')}</div>`;
-            // Loop through all Texts to build list of texts
-            {% for text in toponym.texts.all %}
-                markerPopupHtml += `<a href="${langUrlPrefix}/corpus/{{ text.id }}/" class="map-iedctoponyms-popup-text">{{ text }}</a>`;
+            markerPopupHtml += `<div class="map-iedctoponyms-popup-subtitle">${(langIsFa ? 'متون' : 'Texts')} ({{ toponym.texts_summary.count }})</div>`;
+            // Loop through the Texts in the summary to build list of texts
+            markerPopupHtml += `<div class="map-iedctoponyms-popup-texts">`;
+            {% for text in toponym.texts_summary.texts %}
+                markerPopupHtml += `<a href="${langUrlPrefix}/corpus/{{ text.id }}/" class="map-iedctoponyms-popup-text">{{ text.title }}</a>`;
             {% endfor %}
+            markerPopupHtml += `</div>`;
+            {% if toponym.texts_summary.count > toponym.texts_summary.texts|length %}
+                markerPopupHtml += `<a href="#" class="map-iedctoponyms-popup-texts-more" data-texts="{% url 'corpus:map-toponym-texts' toponym.id %}" data-start="{{ toponym.texts_summary.texts|length }}">${(langIsFa ? 'متون بیشتر' : 'Show more texts')}</a>`;
+            {% endif %}
         {% endif %}
 
         // Inject a marker for this toponym on the map, with a popup containing the HTML created above
@@ -59,6 +64,29 @@ L.tileLayer(
     {% endif %}
 {% endfor %}
 
+// Load the next page of the texts of a toponym into its popup (see map_toponym_texts() in views.py)
+var popupOpen;
+map.on('popupopen', function(e){
+    popupOpen = e.popup;
+});
+$('#{{ map_id }}').on('click', '.map-iedctoponyms-popup-texts-more', function(e){
+    e.preventDefault();
+    let more = $(this);
+    if (more.hasClass('loading')) return;
+    more.addClass('loading');
+    $.getJSON(more.attr('data-texts'), {start: more.attr('data-start')}, function(data){
+        let texts = more.siblings('.map-iedctoponyms-popup-texts');
+        data.texts.forEach(function(text){
+            texts.append($('<a class="map-iedctoponyms-popup-text">').attr('href', `${langUrlPrefix}/corpus/${text.id}/`).text(text.title));
+        });
+        if (data.next === null) more.remove();
+        else more.attr('data-start', data.next);
+        if (popupOpen) popupOpen.update();
+    }).always(function(){
+        more.removeClass('loading');
+    });
+});
+
 // Fix map
 $('#corpus-text-detail-content-tabs li#map').on('click', function(){
     map.invalidateSize(true);
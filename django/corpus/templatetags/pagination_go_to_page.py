@@ -5,7 +5,7 @@ register = template.Library()
 
 
 @register.simple_tag(takes_context=True)
-def pagination_go_to_page(context, page_number):
+def pagination_go_to_page(context, page_number, after=None, before=None):
     """
     This template tag takes the page number of the desired page as an input
     and returns a new URL with all existing parameters (everything after ? in the full url)
@@ -13,14 +13,19 @@ def pagination_go_to_page(context, page_number):
 
     It replaces the current page number param (if already exists)
     or appends a new page number param (if one is not yet set).
+
+    Optionally takes a cursor of keyset pagination (after or before: the id of a Text, see TextListView.paginate_queryset())
+    Any existing cursor is removed, so pages without a cursor are found by their page number
     """
     # All url parameters (everything after ? in the full url) as a list
     url_params = context['request'].GET.copy().urlencode().split('&')
-    # Remove existing page and empty params, if exists
-    for q in url_params:
-        if 'page=' in q or q == '':
-            url_params.remove(q)
-    # Add the new page to start of query
+    # Remove existing page, cursor, and empty params, if exists
+    url_params = [q for q in url_params if not (q.startswith(('page=', 'after=', 'before=')) or q == '')]
+    # Add the new cursor and page to start of query
+    if before is not None:
+        url_params.insert(0, f'before={before}')
+    if after is not None:
+        url_params.insert(0, f'after={after}')
     url_params.insert(0, f'page={page_number}')
     # Return new url
     return f"?{'&'.join(url_params)}"  # e.g. '?page=2&search=xxxx'
@@ -0,0 +1,541 @@
+from itertools import combinations
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, RequestFactory, override_settings
+from django.utils import timezone
+from corpus import facets, filters, models, regex_search, saved_searches, search, signals, text_lines, versions, views
+from corpus.management.commands.text_lines_benchmark import synthetic_folio
+import datetime
+import io
+import random
+import re
+import requests
+import shutil
+import tempfile
+
+
+def legacy_filter_queryset(queryset, params):
+    """
+    The previous filters of the Text list, which join the related tables of multi-valued relations
+    (so the queryset needs a DISTINCT), where params is a dict of filter_ params, e.g. {'filter_fk_collection': 1}
+    """
+    for filter_key, filter_value in params.items():
+        if filter_key.startswith(views.filter_pre_mm):
+            queryset = queryset.filter(**{f'{filter_key.replace(views.filter_pre_mm, "")}__in': [filter_value]})
+        elif filter_key.startswith(views.filter_pre_fk):
+            queryset = queryset.filter(**{filter_key.replace(views.filter_pre_fk, ''): filter_value})
+        elif filter_key.startswith(views.filter_pre_gt):
+            queryset = queryset.filter(**{f'{filter_key.replace(views.filter_pre_gt, "")}__gte': filter_value})
+        elif filter_key.startswith(views.filter_pre_lt):
+            queryset = queryset.filter(**{f'{filter_key.replace(views.filter_pre_lt, "")}__lte': filter_value})
+        elif filter_key.startswith(views.filter_pre_bl):
+            filter_field = filter_key.replace(views.filter_pre_bl, '')
+            try:
+                queryset = queryset.exclude(**{f'{filter_field}__isnull': True})
+            except Exception:
+                pass
+            try:
+                queryset = queryset.exclude(**{f'{filter_field}__exact': ''})
+            except Exception:
+                pass
+    return queryset.distinct()
+
+
+def compiled_filter_queryset(queryset, params):
+    """ Returns the queryset filtered by TextListView.filter_queryset() (see filters.py) for params, as per legacy_filter_queryset() """
+    view = views.TextListView()
+    view.request = RequestFactory().get('/corpus/', {k: 'on' if k.startswith(views.filter_pre_bl) else v for k, v in params.items()})
+    return view.filter_queryset(queryset, view.filter_keys())
+
+
+def filter_params():
+    """ Returns a list of dicts of each filter_ param of the Text list, for each value of the Texts in the database """
+    params = []
+    for field in facets.FILTER_FIELDS_VALUE:
+        for value in sorted(set(models.Text.objects.filter(**{f'{field}__isnull': False}).values_list(field, flat=True))):
+            params.append({f'{views.filter_pre_fk}{field}': value})
+            params.append({f'{views.filter_pre_mm}{field}': value})
+            if field == 'gregorian_date_century__century_number':
+                params.append({f'{views.filter_pre_gt}{field}': value})
+                params.append({f'{views.filter_pre_lt}{field}': value})
+    for field in facets.FILTER_FIELDS_BOOLEAN:
+        params.append({f'{views.filter_pre_bl}{field}': 'on'})
+    return params
+
+
+class CacheTestCase(TestCase):
+    """
+    A TestCase that starts each test with an empty cache, as the changes of tests are never committed
+    so don't set a new corpus version (see signals.py), which would otherwise keep the facet index and list items of previous tests
+    """
+
+    def setUp(self):
+        cache.clear()
+
+
+class FiltersTest(CacheTestCase):
+    """
+    Checks that the EXISTS filters of Text objects (see filters.py) give the same Texts as the previous joined filters,
+    for each form of filter_ param of the Text list (see TextListView.filter_queryset())
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        collections = [models.SlTextCollection.objects.create(name=name) for name in ('Collection A', 'Collection B')]
+        corpus = models.SlTextCorpus.objects.create(name='Corpus A')
+        text_type = models.SlTextType.objects.create(name='Type A')
+        writing_support = models.SlTextWritingSupport.objects.create(name='Paper')
+        script = models.SlTextScript.objects.create(name='Arabic', is_written_right_to_left=True)
+        languages = [
+            models.SlTextLanguage.objects.create(name='Arabic', script=script),
+            models.SlTextLanguage.objects.create(name='New Persian', script=script),
+            models.SlTextLanguage.objects.create(name='Bactrian'),
+        ]
+        centuries = {n: models.SlTextGregorianCentury.objects.create(name=f'{n}th Century CE', century_number=n) for n in (9, 10, 11)}
+        toponyms = [models.SlTextToponym.objects.create(name=name) for name in ('Balkh', 'Bamiyan')]
+        persons = [models.Person.objects.create(name=name) for name in ('Person A', 'Person B')]
+        tag_category = models.SlTextFolioTagCategory.objects.create(name='Places')
+        tags = [models.SlTextFolioTag.objects.create(name=name, category=tag_category) for name in ('Tag A', 'Tag B', 'Tag C')]
+        side = models.SlTextFolioSide.objects.create(name='recto')
+
+        def text_create(shelfmark, collection, primary_language, additional_languages=(), century=None, toponyms=(), persons=(), **kwargs):
+            text = models.Text.objects.create(
+                shelfmark=shelfmark,
+                collection=collection,
+                primary_language=primary_language,
+                gregorian_date_century=centuries.get(century),
+                **kwargs
+            )
+            text.additional_languages.set(additional_languages)
+            text.toponyms.set(toponyms)
+            for person in persons:
+                models.PersonInText.objects.create(text=text, person=person)
+            return text
+
+        def folio_create(text, tags=(), **kwargs):
+            folio = models.TextFolio.objects.create(text=text, side=side, **kwargs)
+            for tag in tags:
+                models.TextFolioTag.objects.create(text_folio=folio, tag=tag)
+            return folio
+
+        # Several folios (with and without content, sharing a tag), additional languages, toponyms and seals
+        text = text_create(
+            'Text 1', collections[0], languages[0], additional_languages=languages[1:], century=10, toponyms=toponyms,
+            persons=persons, corpus=corpus, type=text_type, codex_images_location='Codex'
+        )
+        folio_create(text, tags=tags[:2], transcription='<p>Line 1</p>', translation='<p>Line 1</p>')
+        folio_create(text, tags=tags[:1], transcription='', translation='<p>Line 1</p>', image='corpus/text_folios__original/1.jpg')
+        models.Seal.objects.create(text=text)
+        models.Seal.objects.create(text=text)
+
+        # A single folio with all content
+        text = text_create('Text 2', collections[1], languages[1], additional_languages=languages[:1], century=9, toponyms=toponyms[:1], writing_support=writing_support, codex_images_location='')
+        folio_create(
+            text, tags=tags[2:], transcription='<p>Line 1</p>', translation='<p>Line 1</p>', transliteration='<p>Line 1</p>',
+            palaeography='<p>Details</p>', image='corpus/text_folios__original/2.jpg'
+        )
+        models.Seal.objects.create(text=text)
+
+        # No folios, seals or other related objects
+        text_create('Text 3', collections[0], languages[2])
+
+        # Several folios that all have content, and a person in the Text twice
+        text = text_create('Text 4', collections[1], languages[0], additional_languages=languages[1:2], century=11, persons=persons[:1] * 2, corpus=corpus)
+        for i in range(3):
+            folio_create(text, tags=tags[1:2] if i else (), transcription=f'<p>Line {i}</p>', translation='<p>Line 1</p>' if i else None)
+
+    def compiled_filter_ids(self, params):
+        """ Returns a list of the ids of the Texts that TextListView.filter_queryset() returns for the params """
+        return list(compiled_filter_queryset(models.Text.objects.all(), params).values_list('id', flat=True))
+
+    def filter_params(self):
+        """ Returns filter_params(), checking that the fixture has values of every filter field """
+        params = filter_params()
+        for field in facets.FILTER_FIELDS_VALUE:
+            self.assertIn({f'{views.filter_pre_fk}{field}'}, [set(p) for p in params], f'No values of {field} in the fixture')
+        return params
+
+    def assertSameTexts(self, params):
+        compiled_ids = self.compiled_filter_ids(params)
+        self.assertEqual(len(compiled_ids), len(set(compiled_ids)), f'{params} returns duplicate Texts')
+        self.assertEqual(set(compiled_ids), set(legacy_filter_queryset(models.Text.objects.all(), params).values_list('id', flat=True)), params)
+
+    def test_filters(self):
+        for params in self.filter_params():
+            with self.subTest(params=params):
+                self.assertSameTexts(params)
+
+    def test_filter_combinations(self):
+        for params_1, params_2 in combinations(self.filter_params(), 2):
+            params = {**params_1, **params_2}
+            with self.subTest(params=params):
+                self.assertSameTexts(params)
+
+    def test_several_values(self):
+        # Several values of a filter match Texts with any of them, in the facet index and in the database
+        for field in ('collection', 'additional_languages'):
+            key = f'{views.filter_pre_mm if field == "additional_languages" else views.filter_pre_fk}{field}'
+            values = sorted(set(models.Text.objects.filter(**{f'{field}__isnull': False}).values_list(field, flat=True)))
+            expected_ids = set(models.Text.objects.filter(**{f'{field}__in': values}).values_list('id', flat=True))
+            view = views.TextListView()
+            request = RequestFactory().get('/corpus/', {key: values})
+            request.user = mock.Mock(is_authenticated=True)  # the Texts of the fixture aren't approved
+            view.setup(request)
+            view.get_queryset()
+            self.assertEqual(set(facets.ids_from_bitmap(view.filter_bitmap())), expected_ids)
+            self.assertEqual(set(view.filter_queryset(models.Text.objects.all(), [key]).values_list('id', flat=True)), expected_ids)
+            self.assertEqual([v for k, v in view.saved_search_params() if k == key], [str(value) for value in values])
+
+    def test_multi_valued_filters(self):
+        # Texts with several matching folios, seals or persons are returned once, and 'Includes' filters need content in every folio
+        self.assertEqual(models.Text.objects.filter(filters.filter_q('text_folios__text_folio_tags__tag', 'exact', models.SlTextFolioTag.objects.get(name='Tag A').id)).count(), 1)
+        self.assertEqual(models.Text.objects.filter(filters.filter_q('persons_in_texts__person', 'in', models.Person.objects.values_list('id', flat=True))).count(), 2)
+        self.assertEqual(set(models.Text.objects.filter(filters.filter_boolean_q('text_folios__transcription')).values_list('shelfmark', flat=True)), {'Text 2', 'Text 4'})
+        self.assertEqual(set(models.Text.objects.filter(filters.filter_boolean_q('seals__id')).values_list('shelfmark', flat=True)), {'Text 1', 'Text 2'})
+
+
+class TextListSummaryTest(CacheTestCase):
+    """
+    Checks that TextListSummary objects are kept up to date without changing the version of the corpus (see signals.text_updated())
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.text = models.Text.objects.create(
+            shelfmark='Text 1',
+            collection=models.SlTextCollection.objects.create(name='Collection A'),
+            primary_language=models.SlTextLanguage.objects.create(name='Bactrian'),
+            public_review_approved=True
+        )
+        cls.side = models.SlTextFolioSide.objects.create(name='recto')
+
+    def test_summary_update(self):
+        models.TextListSummary.update_text(self.text)
+        corpus_version = versions.version_get('corpus')
+        # e.g. once the small version of an image is created
+        signals.text_updated(self.text.id, True)
+        self.assertEqual(versions.version_get('corpus'), corpus_version)
+        # Adding a folio changes the counts that 'count_' sorts are ordered by
+        with self.captureOnCommitCallbacks(execute=True):
+            models.TextFolio.objects.create(text=self.text, side=self.side)
+        self.assertNotEqual(versions.version_get('corpus'), corpus_version)
+        self.assertEqual(models.TextListSummary.objects.get(text=self.text).count_text_folios, 1)
+
+    def test_list_without_summaries(self):
+        corpus_version = versions.version_get('corpus')
+        response = self.client.get('/corpus/')
+        self.assertContains(response, 'Text 1')
+        # Summaries that don't exist yet are shown, but not saved by the request
+        self.assertFalse(models.TextListSummary.objects.exists())
+        self.assertEqual(versions.version_get('corpus'), corpus_version)
+
+
+class SearchSnippetsTest(CacheTestCase):
+    """
+    Checks the keyword in context (KWIC) snippets of searches on the Text list page (see search.search_snippets())
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        collection = models.SlTextCollection.objects.create(name='Collection A')
+        side = models.SlTextFolioSide.objects.create(name='recto')
+        script = models.SlTextScript.objects.create(name='Arabic', is_written_right_to_left=True)
+        cls.texts = []
+        for shelfmark, language in (('Text 1', models.SlTextLanguage.objects.create(name='New Persian', script=script)), ('Text 2', models.SlTextLanguage.objects.create(name='Bactrian'))):
+            text = models.Text.objects.create(shelfmark=shelfmark, collection=collection, primary_language=language, public_review_approved=True)
+            models.TextFolio.objects.create(text=text, side=side, transcription=f'<ol><li>{"a" * 30}b wheat</li></ol>', translation='<p>wheat</p>')
+            cls.texts.append(text)
+
+    def test_rtl(self):
+        # The second response uses the cached list item of each Text, which doesn't have the Text's language
+        for _ in range(2):
+            content = self.client.get('/corpus/', {'search': '["wheat"]'}).content.decode()
+            snippets = re.findall(r'<span class="corpus-text-list-items-item-text-snippets-text( rtl" dir="rtl")?"?>[^<]*<strong', content)
+            self.assertEqual(sorted(snippets), ['', '', '', ' rtl" dir="rtl"'])
+
+    @override_settings(REGEX_SEARCH_TIMEOUT=0.5)
+    def test_regex_timeout(self):
+        text_ids = [text.id for text in self.texts]
+        self.assertEqual(len(search.search_snippets(text_ids, ['wh.at'], 'regex')[text_ids[0]]), 2)
+        # A catastrophically backtracking RegEx is stopped by the deadline, so has no snippets
+        self.assertEqual(search.search_snippets(text_ids, ['(a+)+$'], 'regex'), {text_id: [] for text_id in text_ids})
+
+
+class RegexSearchCorpusTest(CacheTestCase):
+    """
+    Checks that RegEx searches use the previous corpus until the current one is built (see search.regex_search_corpus())
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.collection = models.SlTextCollection.objects.create(name='Collection A')
+        cls.language = models.SlTextLanguage.objects.create(name='Bactrian')
+        cls.side = models.SlTextFolioSide.objects.create(name='recto')
+        cls.text_ids = [cls.text_create('Text 1')]
+
+    @classmethod
+    def text_create(cls, shelfmark):
+        text = models.Text.objects.create(shelfmark=shelfmark, collection=cls.collection, primary_language=cls.language, public_review_approved=True)
+        models.TextFolio.objects.create(text=text, side=cls.side, transcription='<p>wheat</p>')
+        return text.id
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(REGEX_SEARCH_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_corpus_build(self):
+        # Built by the first search if there's no corpus yet
+        self.assertEqual(search.text_ids_matching_regex('wh.at'), set(self.text_ids))
+        text_id = self.text_create('Text 2')
+        self.assertEqual(search.text_ids_matching_regex('wh.at'), set(self.text_ids))
+        corpus_version = versions.version_get('corpus')
+        call_command('regex_search_corpus_build', stdout=io.StringIO())
+        self.assertEqual(search.text_ids_matching_regex('wh.at'), {*self.text_ids, text_id})
+        self.assertNotEqual(versions.version_get('corpus'), corpus_version)
+        # Only the current and previous corpora are kept
+        signatures = [regex_search.corpus_signatures(settings.REGEX_SEARCH_DIR)[0]]
+        for shelfmark in ('Text 3', 'Text 4'):
+            self.text_create(shelfmark)
+            search.regex_search_corpus_build()
+            signatures.insert(0, search.regex_search_corpus_signature())
+        self.assertEqual(regex_search.corpus_signatures(settings.REGEX_SEARCH_DIR), signatures[:2])
+
+    def test_corpus_deleted(self):
+        deleted_paths = regex_search.corpus_paths(settings.REGEX_SEARCH_DIR, 'deleted')
+        with mock.patch.object(search, 'regex_search_corpus', side_effect=[deleted_paths, search.regex_search_corpus()]):
+            self.assertEqual(search.text_ids_matching_regex('wh.at'), set(self.text_ids))
+
+
+class ImageDerivativeJobTest(CacheTestCase):
+    """
+    Checks that an image whose smaller versions can't be created is shown as failed rather than as being processed
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.text = models.Text.objects.create(
+            shelfmark='Text 1',
+            collection=models.SlTextCollection.objects.create(name='Collection A'),
+            primary_language=models.SlTextLanguage.objects.create(name='Bactrian'),
+            public_review_approved=True
+        )
+        cls.folio = models.TextFolio.objects.create(text=cls.text, side=models.SlTextFolioSide.objects.create(name='recto'), image='corpus/text_folios__original/1.jpg')
+
+    @override_settings(IMAGE_DERIVATIVE_JOB_ATTEMPTS=1)
+    @mock.patch.object(models, 'image_derivatives_create', side_effect=OSError('Cannot identify image file'))
+    def test_failed(self, image_derivatives_create):
+        self.assertTrue(models.TextFolio.objects.get(id=self.folio.id).image_is_processing)
+        self.assertContains(self.client.get(f'/corpus/{self.text.id}/'), 'This image is being processed')
+        text_version = versions.version_get(versions.text_version_name(self.text.id))
+        call_command('image_derivatives_process', '--once', stdout=io.StringIO())
+        # The Text is updated once its job has failed, so its cached pages are replaced
+        self.assertNotEqual(versions.version_get(versions.text_version_name(self.text.id)), text_version)
+        folio = models.TextFolio.objects.get(id=self.folio.id)
+        self.assertFalse(folio.image_is_processing)
+        self.assertEqual(folio.image_processing_error, 'OSError: Cannot identify image file')
+        self.assertIn(folio.image_processing_error, folio.image_preview)
+        self.assertContains(self.client.get(f'/corpus/{self.text.id}/'), 'This image could not be processed')
+
+
+class KeysetPaginationTest(CacheTestCase):
+    """
+    Checks that keyset pages (see TextListView.paginate_keyset()) give the same Texts as offset pages, including for sparse results
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        collections = [models.SlTextCollection.objects.create(name=name) for name in ('Collection A', 'Collection B')]
+        language = models.SlTextLanguage.objects.create(name='Bactrian')
+        shelfmarks = [f'Text {i:02}' for i in range(70)]
+        random.Random(0).shuffle(shelfmarks)
+        for i, shelfmark in enumerate(shelfmarks):
+            # Only every 7th Text is in Collection B, so its results are sparse within the sort order
+            models.Text.objects.create(shelfmark=shelfmark, collection=collections[i % 7 == 0], primary_language=language, public_review_approved=True)
+        cls.collection = collections[1]
+
+    def test_seek(self):
+        index = facets.FacetIndex(versions.version_get('corpus'))
+        sorted_ids = index.sorted_ids(index.value('collection', self.collection.id), 'shelfmark')
+        sort_ids = index.sort_order('shelfmark')[0]
+        for cursor in sort_ids:
+            after = [text_id for text_id in sort_ids[sort_ids.index(cursor) + 1:] if text_id in sorted_ids]
+            self.assertEqual(sorted_ids[index.seek(sorted_ids, 'shelfmark', cursor):], after)
+            self.assertEqual(len(sorted_ids) - index.seek(sorted_ids, 'shelfmark', cursor, backwards=True), len(after) + (cursor in sorted_ids))
+        self.assertIsNone(index.seek(sorted_ids, 'shelfmark', 0))
+
+    def test_pages(self):
+        params = {'sort': 'shelfmark'}
+        pages = [self.client.get('/corpus/', {**params, 'page': number}).context['page_obj'] for number in (1, 2, 3)]
+        for i, page in enumerate(pages):
+            for param, cursor, other_page in (('after', page.cursor_next, i + 1), ('before', page.cursor_previous, i - 1)):
+                if 0 <= other_page < len(pages):
+                    keyset_page = self.client.get('/corpus/', {**params, param: cursor, 'page': other_page + 1}).context['page_obj']
+                    self.assertEqual([text.id for text in keyset_page], [text.id for text in pages[other_page]])
+                    self.assertEqual(keyset_page.has_previous(), other_page > 0)
+                    self.assertEqual(keyset_page.has_next(), other_page < len(pages) - 1)
+        # Sparse results, from a cursor that isn't in them
+        params[f'{views.filter_pre_fk}collection'] = self.collection.id
+        text_ids = [text.id for text in self.client.get('/corpus/', params).context['page_obj']]
+        sort_ids = facets.facet_index().sort_order('shelfmark')[0]
+        i = next(i for i in range(1, len(text_ids)) if sort_ids.index(text_ids[i]) - sort_ids.index(text_ids[i - 1]) > 1)
+        keyset_page = self.client.get('/corpus/', {**params, 'after': sort_ids[sort_ids.index(text_ids[i]) - 1]}).context['page_obj']
+        self.assertEqual([text.id for text in keyset_page], text_ids[i:])
+        self.assertTrue(keyset_page.has_previous())
+        self.assertFalse(keyset_page.has_next())
+
+
+class SavedSearchTest(CacheTestCase):
+    """
+    Checks that a saved search is only written again when it's close to expiring, and isn't found once expired
+    """
+
+    params = [('search', '["wheat"]'), ('sort', 'id')]
+
+    def set_expires(self, token, seconds):
+        models.SavedSearch.objects.filter(token=token).update(expires=timezone.now() + datetime.timedelta(seconds=seconds))
+        return models.SavedSearch.objects.get(token=token).expires
+
+    def test_expiry(self):
+        corpus_version = versions.version_get('corpus')
+        token = saved_searches.saved_search_save(self.params)
+        self.assertEqual(saved_searches.saved_search_get(token).getlist('search'), ['["wheat"]'])
+        self.assertEqual(versions.version_get('corpus'), corpus_version)
+        # Not reset while more than half of SAVED_SEARCH_TIMEOUT is left
+        expires = self.set_expires(token, settings.SAVED_SEARCH_TIMEOUT * 3 // 4)
+        self.assertEqual(saved_searches.saved_search_save(self.params), token)
+        self.assertEqual(models.SavedSearch.objects.get(token=token).expires, expires)
+        expires = self.set_expires(token, settings.SAVED_SEARCH_TIMEOUT // 4)
+        saved_searches.saved_search_save(self.params)
+        self.assertGreater(models.SavedSearch.objects.get(token=token).expires, expires)
+        # Expired
+        self.set_expires(token, -1)
+        self.assertIsNone(saved_searches.saved_search_get(token))
+        call_command('saved_searches_delete_expired', stdout=io.StringIO())
+        self.assertFalse(models.SavedSearch.objects.filter(token=token).exists())
+
+
+# HTML of trans text fields that the stream parser supports, e.g. {'nested tables': '<table>...'}
+TEXT_LINES_SUPPORTED_HTML = {
+    'lines': (
+        '<h1>Recto</h1><ol><li>First line</li><li value="3">Third line</li><li value="7">Seventh line</li><li>Eighth line</li></ol>'
+    ),
+    'lines with image parts and tags': (
+        '<ol><li data-imagepartleft="10" data-imageparttop="20" data-imagepartwidth="300" data-imagepartheight="40">'
+        'A <var data-textfoliotag="5">dinar</var> of <strong>Balkh</strong></li>\n<li><em>witness</em> <u>name</u></li></ol>'
+    ),
+    'nested tables': (
+        '<table border="1" cellpadding="1" style="width:500px"><tbody><tr><td>wheat</td><td>&nbsp;</td></tr>'
+        '<tr><td><table><tbody><tr><td>barley</td><td><em>dirham</em></td></tr></tbody></table></td><td></td></tr></tbody></table>'
+        '<ol><li>After the table</li></ol><table><tbody><tr><td>Second table</td></tr></tbody></table>'
+    ),
+    'entities': (
+        '<ol><li>&amp; &nbsp; &lt;sic&gt; &quot;&#39; &#1582;&#x62F; &eacute; &unknownentity;</li><li>خراج گندم</li></ol>'
+    ),
+    'void and unclosed tags': (
+        '<ol><li>Line<br>break</br><li>Unclosed<img src="a.jpg"><hr/>item<li>Stray end tag</div></span></ol><p>Unclosed <p>paragraph'
+    ),
+    'whitespace': (
+        '<ol>\n  <li>  Spaced   line  </li>\n\n<li>\t</li>  <li><pre>  preformatted\n  text </pre></li>\n</ol>\n'
+    ),
+    'attributes': (
+        '<OL><LI VALUE="2" class="first  second" title=\'Say "hello"\' data-empty>Upper case</LI>'
+        '<li title="It\'s &amp; that">Quotes</li><li hidden value = "4">Spaced attribute</li></OL>'
+    ),
+}
+
+# HTML of trans text fields that the stream parser doesn't support, so is parsed by BeautifulSoup (see StreamParseUnsupported)
+TEXT_LINES_UNSUPPORTED_HTML = {
+    'comment': '<ol><li>Line <!-- comment --></li></ol>',
+    'script': '<ol><li>Line</li></ol><script>var a = "<li>";</script>',
+    'style': '<style>li { color: red; }</style><ol><li>Line</li></ol>',
+    'unquoted attribute value': '<ol><li value=3>Line</li></ol>',
+    'stray less than': '<ol><li>1 < 2</li></ol>',
+    'entity without semicolon': '<ol><li>&copy 2024</li></ol>',
+}
+
+
+class TextLinesTest(SimpleTestCase):
+    """
+    Checks that the 'stream' parser of trans text fields gives the same lines as the 'beautifulsoup' parser (see text_lines.py)
+    for fixture HTML. To check every folio of a database run: python manage.py text_lines_check
+    """
+
+    def assertSameLines(self, raw_html):
+        for field_name in models.TextFolio.text_lines_fields:
+            for rtl in (False, True):
+                self.assertEqual(
+                    text_lines.text_lines(text_lines.parse(raw_html, 'stream'), field_name, 1, rtl),
+                    text_lines.text_lines(text_lines.parse(raw_html, 'beautifulsoup'), field_name, 1, rtl)
+                )
+
+    def test_supported_html(self):
+        for description, raw_html in TEXT_LINES_SUPPORTED_HTML.items():
+            with self.subTest(description):
+                # Parsed by the stream parser itself, rather than by BeautifulSoup
+                self.assertIsInstance(text_lines.parse(raw_html, 'stream'), text_lines.Document)
+                self.assertSameLines(raw_html)
+
+    def test_unsupported_html(self):
+        for description, raw_html in TEXT_LINES_UNSUPPORTED_HTML.items():
+            with self.subTest(description):
+                with self.assertRaises(text_lines.StreamParseUnsupported):
+                    text_lines.stream_parse(raw_html)
+                self.assertSameLines(raw_html)
+
+    def test_synthetic_folios(self):
+        rng = random.Random(0)
+        for i in range(5):
+            with self.subTest(folio=i):
+                self.assertSameLines(synthetic_folio(rng, 300, 5))
+
+    def test_text_folio_tags_lines(self):
+        for raw_html in [*TEXT_LINES_SUPPORTED_HTML.values(), synthetic_folio(random.Random(0), 300, 5)]:
+            with self.subTest(raw_html=raw_html[:50]):
+                self.assertEqual(
+                    text_lines.text_folio_tags_lines(raw_html, text_lines.text_lines(text_lines.parse(raw_html, 'stream'), 'transcription', 1, False)),
+                    text_lines.text_folio_tags_lines(raw_html, text_lines.text_lines(text_lines.parse(raw_html, 'beautifulsoup'), 'transcription', 1, False))
+                )
+
+
+class IIIFManifestTest(TestCase):
+    """
+    Checks that a manifest that fails to fetch keeps its previous images, and is retried soon if it has never been fetched
+    """
+
+    url = 'https://iiif.example.org/manifest.json'
+    images = [{'image_thumbnail': 'thumbnail.jpg', 'image_large': 'large.jpg', 'image_full': 'full.jpg'}]
+
+    def fetched_ago(self, manifest, seconds):
+        manifest.fetched = timezone.now() - datetime.timedelta(seconds=seconds)
+        models.IIIFManifest.objects.filter(id=manifest.id).update(fetched=manifest.fetched)
+
+    @mock.patch.object(models.IIIFManifest, 'fetch_images', side_effect=requests.exceptions.ConnectionError('Offline'))
+    def test_failed_first_fetch(self, fetch_images):
+        self.assertIsNone(models.IIIFManifest.get_images(self.url))
+        manifest = models.IIIFManifest.objects.get(url=self.url)
+        self.assertTrue(manifest.fetch_error)
+        # Not fetched again by each request, but retried after IIIF_MANIFEST_ERROR_RETRY (rather than IIIF_MANIFEST_TTL)
+        self.assertIsNone(models.IIIFManifest.get_images(self.url))
+        self.assertEqual(fetch_images.call_count, 1)
+        self.fetched_ago(manifest, settings.IIIF_MANIFEST_ERROR_RETRY + 1)
+        self.assertTrue(manifest.is_stale)
+        fetch_images.side_effect, fetch_images.return_value = None, self.images
+        self.assertEqual(models.IIIFManifest.get_images(self.url), self.images)
+        self.assertEqual(fetch_images.call_count, 2)
+
+    @mock.patch.object(models.IIIFManifest, 'fetch_images', side_effect=requests.exceptions.ConnectionError('Offline'))
+    def test_failed_refresh(self, fetch_images):
+        manifest = models.IIIFManifest.objects.create(url=self.url, images=self.images)
+        self.assertFalse(manifest.refresh())
+        self.assertEqual(models.IIIFManifest.get_images(self.url), self.images)
+        # Has images, so isn't stale until IIIF_MANIFEST_TTL
+        self.fetched_ago(manifest, settings.IIIF_MANIFEST_ERROR_RETRY + 1)
+        self.assertFalse(manifest.is_stale)
+        self.fetched_ago(manifest, settings.IIIF_MANIFEST_TTL + 1)
+        self.assertTrue(manifest.is_stale)
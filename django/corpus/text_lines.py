@@ -0,0 +1,427 @@
+"""
+Lines of the trans text fields (transcription, translation, transliteration) of a TextFolio, see TextFolio.trans_text_lines(),
+and the lines that link to each TextFolioTag, see text_folio_tags_lines()
+
+The lines are built by text_lines() from a tree of the HTML of the field, which is parsed by one of two parsers
+(chosen by the TEXT_LINES_PARSER setting, see parse()):
+    - 'beautifulsoup': BeautifulSoup, using Python's html.parser
+    - 'stream': a regex tokenizer that builds a lightweight tree of Element objects, reproducing how BeautifulSoup
+      (with html.parser) nests tags and serialises them, so the lines are identical. HTML that it doesn't support
+      (e.g. comments, <script>, unquoted attribute values, or a '<' or '&' that isn't a tag or entity) is parsed by BeautifulSoup
+
+TextLinesTest in corpus/tests.py checks that both parsers give the same lines (run: python manage.py test corpus)
+To check that both parsers give the same lines for every folio run: python manage.py text_lines_check
+To compare their speed run: python manage.py text_lines_benchmark
+"""
+
+from django.conf import settings
+from bs4 import BeautifulSoup
+from bs4.builder import HTMLTreeBuilder
+from bs4.dammit import EntitySubstitution
+from collections import Counter
+import html
+import re
+
+
+PARSERS = ['beautifulsoup', 'stream']
+
+
+#
+# Lines
+#
+
+
+def text_lines(soup, field_name, folio_id, rtl):
+    """
+    Returns a list of dictionaries containing data about each line of the parsed HTML (soup) of a trans text field
+    that's necessary to generate the HTML to display on the public interface
+    soup can be a BeautifulSoup object or a Document (see stream_parse()), as both provide the same methods
+    """
+    lines_data = []
+    lines = soup.find_all(['li', 'table', 'h1'])
+    line_number = 0
+    line_index = -1
+
+    for line in lines:
+        # Lines that are <li> elements (aka list items in a <ol> element, aka standard lines of text)
+        if line.name == 'li':
+            # Increase the line index for each line
+            line_index += 1
+            # Line number
+            try:
+                line_number = int(line.attrs['value'])
+            except KeyError:
+                line_number += 1
+            # Line number range end
+            line_number_range_end = None
+            try:
+                # If the next line has a value attribute that's greater than 1 more than current line count then
+                next_line_number = int(lines[line_index + 1].attrs['value'])
+                if line_number < (next_line_number - 1):
+                    line_number_range_end = next_line_number - 1
+            except (IndexError, KeyError):
+                try:
+                    # Try getting the current line's 'data-range-end' attribute (valid if this is the last line)
+                    line_number_range_end = int(line.attrs['data-range-end'])
+                except KeyError:
+                    line_number_range_end = None
+            # Line number label
+            line_number_label = f'{line_number}-{line_number_range_end}' if line_number_range_end else str(line_number)
+            # Line numbers (e.g. if line number label is 4-6 then line numbers is 4,5,6)
+            line_numbers = ','.join([str(ln) for ln in range(line_number, line_number_range_end + 1)]) if line_number_range_end else line_number
+
+            # Image part data
+            try:
+                # Get attr values from line li element
+                image_part_left = line.attrs['data-imagepartleft']
+                image_part_top = line.attrs['data-imageparttop']
+                image_part_width = line.attrs['data-imagepartwidth']
+                image_part_height = line.attrs['data-imagepartheight']
+
+                # Build new attributes to add to new line div element (if provided)
+                image_part_left_attr = f' data-imagepartleft={image_part_left}' if image_part_left else ''
+                image_part_top_attr = f' data-imageparttop={image_part_top}' if image_part_top else ''
+                image_part_width_attr = f' data-imagepartwidth={image_part_width}' if image_part_width else ''
+                image_part_height_attr = f' data-imagepartheight={image_part_height}' if image_part_height else ''
+            except KeyError:
+                # Set empty attributes
+                image_part_left_attr = ''
+                image_part_top_attr = ''
+                image_part_width_attr = ''
+                image_part_height_attr = ''
+
+            # Build dict for this line and add to list of lines data
+            lines_data.append({
+                'lineNumbers': line_numbers,
+                'lineIndex': line_index,
+                'trans': field_name,
+                'folio': folio_id,
+                'image_part_left_attr': image_part_left_attr,
+                'image_part_top_attr': image_part_top_attr,
+                'image_part_width_attr': image_part_width_attr,
+                'image_part_height_attr': image_part_height_attr,
+                'lineNumberLabel': line_number_label,
+                'rtl': rtl,
+                'text': "".join([str(t) for t in line.contents])
+            })
+
+        # Lines that are a <table> element (e.g. witness tables, etc.)
+        elif line.name == 'table':
+            # Process all <td> elements in table
+            for td in line.find_all('td'):
+                # Increase the line index for each td, as each td is considered a 'line'
+                # (i.e. can draw each td on an image and highlight each td on hover)
+                line_index += 1
+                # If the cell has a valid value (is not empty)
+                if len(td.text.strip()):
+                    # Assign
+                    td['class'] = 'folio-lines-line'
+                    td['dir'] = 'auto'
+                    td['data-linenumbers'] = ''
+                    td['data-lineindex'] = line_index
+                    td['data-trans'] = field_name
+                    td['data-folio'] = folio_id
+                # Ignore empty cells
+                else:
+                    td['class'] = 'empty'
+            # Add a new td containing the line number at the start of each row
+            tr_number = 0
+            for tr_index, tr in enumerate(line.find_all('tr')):
+                line_number_td = soup.new_tag('td', **{'class': 'line-number', 'dir': f'{"rtl" if rtl else "auto"}'})
+                # Line number: if this <table> is first element in whole trans text
+                if len(lines_data) == 0:
+                    tr_number = 1 + tr_index
+                # Line number: if previous item in lines_data is a <li>
+                elif 'lineNumbers' in lines_data[-1]:
+                    tr_number = int(str(lines_data[-1]['lineNumbers']).split(',')[-1]) + 1 + tr_index
+                # Line number: all other cases (e.g. if previous item in lines_data is another table)
+                else:
+                    tr_number += 1
+                line_number_td.string = str(tr_number)
+                tr.insert(0, line_number_td)
+
+            # Build the html for the table and add it to lines_data
+            table_html = f'<table class="folio-table{(" rtl" if rtl else "")}">{"".join([str(tag) for tag in line])}</table>'
+
+            # Add related lines
+            if field_name != 'transcription':
+                table_html += '<div class="related-lines" data-trans="transcription"></div>'
+            if field_name != 'translation':
+                table_html += '<div class="related-lines" data-trans="translation"></div>'
+            if field_name != 'transliteration':
+                table_html += '<div class="related-lines" data-trans="transliteration"></div>'
+
+            lines_data.append({'table': table_html})
+
+        # Lines that are a <h1> element (e.g. subtitles)
+        elif line.name == 'h1':
+            lines_data.append({'h1': str(line)})
+
+    return lines_data
+
+
+# A link from the trans text to a TextFolioTag (see TextFolioTagCreateView), and also the index of a line within a table
+TEXT_FOLIO_TAG_LINK = re.compile(r'data-textfoliotag="(\d+)"')
+TABLE_LINE_INDEX_OR_TEXT_FOLIO_TAG_LINK = re.compile(r'data-lineindex="(\d+)"|data-textfoliotag="(\d+)"')
+
+
+def text_folio_tags_lines(raw_html, lines_data):
+    """
+    Returns the ids of the TextFolioTags linked to from the raw HTML of a trans text field, and the indexes of the lines (see text_lines())
+    that link to each, as {TextFolioTag id: [line indexes]}. Links that aren't within a line (e.g. within a heading) have no line index
+    """
+    tags_lines = {int(tag_id): set() for tag_id in TEXT_FOLIO_TAG_LINK.findall(raw_html or '')}
+    for line in lines_data or []:
+        # Tables, where each td is a line (the td of each link is the last td with a line index before it)
+        if 'table' in line:
+            line_index = None
+            for match in TABLE_LINE_INDEX_OR_TEXT_FOLIO_TAG_LINK.finditer(line['table']):
+                if match.group(1):
+                    line_index = int(match.group(1))
+                elif line_index is not None and int(match.group(2)) in tags_lines:
+                    tags_lines[int(match.group(2))].add(line_index)
+        # Standard lines
+        elif 'lineIndex' in line:
+            for tag_id in TEXT_FOLIO_TAG_LINK.findall(line['text']):
+                if int(tag_id) in tags_lines:
+                    tags_lines[int(tag_id)].add(line['lineIndex'])
+    return {tag_id: sorted(line_indexes) for tag_id, line_indexes in tags_lines.items()}
+
+
+def parse(raw_html, parser=None):
+    """ Returns a tree of the raw HTML, parsed by the named parser (see PARSERS), by default the TEXT_LINES_PARSER setting """
+    if (parser or settings.TEXT_LINES_PARSER) == 'stream':
+        try:
+            return stream_parse(raw_html)
+        except StreamParseUnsupported:
+            pass
+    return BeautifulSoup(raw_html, features="html.parser")
+
+
+#
+# Stream parser
+#
+
+
+class StreamParseUnsupported(Exception):
+    """ Raised by stream_parse() for HTML that it doesn't parse the same as BeautifulSoup (so must be parsed by BeautifulSoup) """
+
+
+# Start/end tags (with quoted or empty attribute values), character and entity references, or any other '<' or '&' (unsupported)
+STREAM_TOKEN = re.compile(
+    r'''<(/?)([a-zA-Z][a-zA-Z0-9]*)((?:\s+[^\s"'<>/=]+(?:\s*=\s*(?:"[^"]*"|'[^']*'))?)*)\s*(/?)>'''
+    r'''|&(?:#([0-9]+)|#[xX]([0-9a-fA-F]+)|([a-zA-Z][a-zA-Z0-9]*));'''
+    r'''|[<&]'''
+)
+STREAM_ATTRIBUTE = re.compile(r'''([^\s"'<>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'))?''')
+# Tags whose content html.parser or BeautifulSoup treat differently (e.g. as raw text, or as a different type of string)
+STREAM_UNSUPPORTED_TAGS = {
+    'script', 'style', 'textarea', 'title', 'xmp', 'iframe', 'noembed', 'noframes', 'noscript', 'plaintext', 'meta',
+    *HTMLTreeBuilder.DEFAULT_STRING_CONTAINERS
+}
+VOID_ELEMENTS = HTMLTreeBuilder.empty_element_tags
+PRESERVE_WHITESPACE_TAGS = HTMLTreeBuilder.DEFAULT_PRESERVE_WHITESPACE_TAGS
+MULTI_VALUED_ATTRIBUTES = HTMLTreeBuilder.DEFAULT_CDATA_LIST_ATTRIBUTES
+NON_WHITESPACE = re.compile(r'\S+')
+ASCII_SPACES = ' \n\t\x0c\r'
+HTML_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+
+def attribute_html(value):
+    """ Returns an attribute value as BeautifulSoup outputs it: escaped and quoted (with single quotes if it contains double quotes) """
+    if isinstance(value, list):
+        value = ' '.join(value)
+    value = str(value).translate(HTML_ESCAPE)
+    if '"' in value:
+        if "'" in value:
+            return '"' + value.replace('"', '&quot;') + '"'
+        return "'" + value + "'"
+    return '"' + value + '"'
+
+
+class Element:
+    """ An element (tag) of HTML parsed by stream_parse(), with the methods of a BeautifulSoup Tag used by text_lines() """
+
+    __slots__ = ('name', 'attrs', 'contents')
+
+    def __init__(self, name, attrs=None):
+        self.name = name
+        self.attrs = attrs if attrs is not None else {}
+        self.contents = []  # strings and Element objects
+
+    def __iter__(self):
+        return iter(self.contents)
+
+    def __setitem__(self, key, value):
+        self.attrs[key] = value
+
+    def insert(self, position, element):
+        self.contents.insert(position, element)
+
+    @property
+    def string(self):
+        return self.contents[0] if len(self.contents) == 1 else None
+
+    @string.setter
+    def string(self, value):
+        self.contents = [str(value)]
+
+    @property
+    def text(self):
+        return ''.join(child if isinstance(child, str) else child.text for child in self.contents)
+
+    def find_all(self, name):
+        """ Returns a list of all descendant elements with the name (or one of a list of names), in document order """
+        names = {name} if isinstance(name, str) else set(name)
+        found = []
+        stack = [iter(self.contents)]
+        while stack:
+            for child in stack[-1]:
+                if not isinstance(child, str):
+                    if child.name in names:
+                        found.append(child)
+                    stack.append(iter(child.contents))
+                    break
+            else:
+                stack.pop()
+        return found
+
+    def __str__(self):
+        attrs = ''.join(f' {key}={attribute_html(value)}' for key, value in sorted(self.attrs.items()))
+        if not self.contents and self.name in VOID_ELEMENTS:
+            return f'<{self.name}{attrs}/>'
+        contents = ''.join(child.translate(HTML_ESCAPE) if isinstance(child, str) else str(child) for child in self.contents)
+        return f'<{self.name}{attrs}>{contents}</{self.name}>'
+
+
+class Document(Element):
+    """ The root of HTML parsed by stream_parse() """
+
+    def __init__(self):
+        super().__init__('[document]')
+
+    def new_tag(self, name, **attrs):
+        return Element(name, attrs)
+
+    def __str__(self):
+        return ''.join(child.translate(HTML_ESCAPE) if isinstance(child, str) else str(child) for child in self.contents)
+
+
+def character_reference(number):
+    """ Returns the character of a numeric character reference, as BeautifulSoup does (e.g. 150 is '–' in Windows-1252) """
+    character = None
+    if number < 256:
+        try:
+            character = bytearray([number]).decode('windows-1252')
+        except UnicodeDecodeError:
+            pass
+    if not character:
+        try:
+            character = chr(number)
+        except (ValueError, OverflowError):
+            pass
+    return character or "\N{REPLACEMENT CHARACTER}"
+
+
+def element_attributes(name, attributes):
+    """ Returns a dict of the attributes (as found in the start tag) of the named element, as BeautifulSoup stores them """
+    attrs = {}
+    if not attributes:
+        return attrs
+    for match in STREAM_ATTRIBUTE.finditer(attributes):
+        value = match.group(2) if match.group(2) is not None else match.group(3)
+        attrs[match.group(1).lower()] = html.unescape(value) if value else ''
+    multi_valued = MULTI_VALUED_ATTRIBUTES.get('*', []) + MULTI_VALUED_ATTRIBUTES.get(name, [])
+    for key in attrs:
+        if key in multi_valued:
+            attrs[key] = NON_WHITESPACE.findall(attrs[key])
+    return attrs
+
+
+def stream_parse(raw_html):
+    """
+    Parses the raw HTML into a tree of Element objects, the same as BeautifulSoup with html.parser would, and returns its Document
+    Elements are nested as by BeautifulSoup's tree builder, e.g. an end tag closes all elements opened after the matching start tag
+    and is ignored if there isn't one, and strings of only whitespace become a single space or newline (except within <pre>)
+    Raises StreamParseUnsupported for HTML that isn't supported (see STREAM_TOKEN and STREAM_UNSUPPORTED_TAGS)
+    """
+    document = Document()
+    stack = [document]
+    open_tags = Counter()
+    # Names of void elements (e.g. <br>) closed as soon as they started, whose next end tag (e.g. </br>) is ignored
+    already_closed = []
+    preserve_whitespace = []
+    data = []
+
+    def end_data():
+        if data:
+            string = ''.join(data)
+            data.clear()
+            if not preserve_whitespace and not string.strip(ASCII_SPACES):
+                string = '\n' if '\n' in string else ' '
+            stack[-1].contents.append(string)
+
+    def pop_to(name):
+        if open_tags[name]:
+            while True:
+                element = stack.pop()
+                open_tags[element.name] -= 1
+                if preserve_whitespace and element is preserve_whitespace[-1]:
+                    preserve_whitespace.pop()
+                if element.name == name:
+                    break
+
+    def end_tag(name):
+        if name in already_closed:
+            already_closed.remove(name)
+        else:
+            end_data()
+            pop_to(name)
+
+    position = 0
+    for match in STREAM_TOKEN.finditer(raw_html):
+        start = match.start()
+        if start > position:
+            data.append(raw_html[position:start])
+        position = match.end()
+        closing, name, attributes, self_closing, decimal, hexadecimal, entity = match.groups()
+
+        # Character and entity references
+        if name is None:
+            if decimal is not None:
+                data.append(character_reference(int(decimal)))
+            elif hexadecimal is not None:
+                data.append(character_reference(int(hexadecimal, 16)))
+            elif entity is not None:
+                data.append(EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(entity) or f'&{entity}')
+            else:
+                raise StreamParseUnsupported(f"'{match.group()}' at position {start}")
+            continue
+
+        # Tags
+        name = name.lower()
+        if name in STREAM_UNSUPPORTED_TAGS:
+            raise StreamParseUnsupported(f"<{name}> at position {start}")
+        if closing:
+            if attributes or self_closing:
+                raise StreamParseUnsupported(f"'{match.group()}' at position {start}")
+            end_tag(name)
+        else:
+            end_data()
+            element = Element(name, element_attributes(name, attributes))
+            stack[-1].contents.append(element)
+            stack.append(element)
+            open_tags[name] += 1
+            if name in PRESERVE_WHITESPACE_TAGS:
+                preserve_whitespace.append(element)
+            if self_closing:
+                end_tag(name)
+            elif name in VOID_ELEMENTS:
+                end_data()
+                pop_to(name)
+                already_closed.append(name)
+
+    if position < len(raw_html):
+        data.append(raw_html[position:])
+    end_data()
+    return document
@@ -0,0 +1,72 @@
+"""
+Summaries of the Texts of each toponym (their count and the first few Texts), shown in the popups of the maps of toponyms
+
+Rather than loading every Text of each toponym (hundreds for a common place, e.g. Balkh), a popup shows the summary
+of its toponym, which is kept in Django's cache until the version of the corpus changes (see versions.py).
+The other Texts of a toponym are loaded page by page when requested (see map_toponym_texts() in views.py)
+"""
+
+from django.core.cache import cache
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from . import models, versions
+
+
+# Number of Texts within the summary of each toponym
+SUMMARY_TEXTS_COUNT = 10
+# Number of seconds that each summary is cached for (it's also invalidated when the corpus changes)
+SUMMARY_CACHE_TIMEOUT = 60 * 60 * 24
+# Number of Texts within each page of the Texts of a toponym, loaded after its summary
+TEXTS_PAGE_SIZE = 50
+
+
+def toponym_texts(toponym_id):
+    """ Returns a queryset of the Texts of a toponym, in the order they're listed (by title, i.e. collection and shelfmark) """
+    return models.Text.objects.filter(toponyms=toponym_id).select_related('collection').order_by('collection__name', 'shelfmark', 'id')
+
+
+def toponym_texts_data(texts):
+    """ Returns a list of the id and title of each Text, as shown in the popup of a toponym """
+    return [{'id': text.id, 'title': text.title} for text in texts]
+
+
+def toponym_summary_key(toponym_id, version):
+    return f'corpus_toponymsummary_{toponym_id}_{version}'
+
+
+def toponym_summaries(toponym_ids):
+    """
+    Returns a dict of the summary of each toponym id, e.g. {1: {'count': 250, 'texts': [{'id': 3, 'title': 'Collection: Shelfmark'}, ...]}}
+    Summaries that aren't cached are loaded in 2 queries: a count of the Texts of each toponym, then the first Texts of each toponym
+    """
+    version = versions.version_get('corpus')
+    keys = {toponym_id: toponym_summary_key(toponym_id, version) for toponym_id in toponym_ids}
+    cached = cache.get_many(keys.values())
+    summaries = {toponym_id: cached[key] for toponym_id, key in keys.items() if key in cached}
+    missing = [toponym_id for toponym_id in toponym_ids if toponym_id not in summaries]
+    if missing:
+        counts = dict(
+            models.SlTextToponym.objects.filter(id__in=missing).annotate(texts_count=Count('texts')).values_list('id', 'texts_count')
+        )
+        summaries.update({toponym_id: {'count': counts.get(toponym_id, 0), 'texts': []} for toponym_id in missing})
+        # The first Texts of each toponym, numbered within each toponym in the order of toponym_texts()
+        text_toponyms = models.Text.toponyms.through.objects.filter(sltexttoponym_id__in=missing).annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('sltexttoponym_id'),
+                order_by=[F('text__collection__name').asc(), F('text__shelfmark').asc(), F('text_id').asc()]
+            )
+        ).filter(row_number__lte=SUMMARY_TEXTS_COUNT).select_related('text__collection').order_by('sltexttoponym_id', 'row_number')
+        for text_toponym in text_toponyms:
+            summaries[text_toponym.sltexttoponym_id]['texts'] += toponym_texts_data([text_toponym.text])
+        cache.set_many({keys[toponym_id]: summaries[toponym_id] for toponym_id in missing}, SUMMARY_CACHE_TIMEOUT)
+    return summaries
+
+
+def toponyms_with_summaries(toponyms):
+    """ Returns a list of the toponyms, each with its summary (see toponym_summaries()) as texts_summary """
+    toponyms = list(toponyms)
+    summaries = toponym_summaries([toponym.id for toponym in toponyms])
+    for toponym in toponyms:
+        toponym.texts_summary = summaries[toponym.id]
+    return toponyms
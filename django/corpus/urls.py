@@ -11,10 +11,13 @@ urlpatterns = [
 
     # Text
     path('', views.TextListView.as_view(), name='text-list'),
+    path('autocomplete/', views.text_list_autocomplete, name='text-list-autocomplete'),
     path('<pk>/', views.TextDetailView.as_view(), name='text-detail'),
+    path('<pk>/tab/<tab>/', views.TextDetailTabView.as_view(), name='text-detail-tab'),
 
     # TextFolioTag
     path('textfoliotag/create/', views.TextFolioTagCreateView.as_view(), name='textfoliotag-create'),
+    path('textfoliotag/options/', views.textfoliotag_options, name='textfoliotag-options'),
     path('textfoliotag/failed/', views.TextFolioTagFailedTemplateView.as_view(), name='textfoliotag-failed'),
 
     # TextFolioTransLineDrawnOnImage
@@ -23,6 +26,7 @@ urlpatterns = [
 
     # Maps
     path('map/texts/', views.MapTextsListView.as_view(), name='map-iedctoponyms'),
+    path('map/toponyms/<int:pk>/texts/', views.map_toponym_texts, name='map-toponym-texts'),
     path('map/find-spots/', views.MapFindSpotTemplateView.as_view(), name='map-findspots'),
 
     # Corpus Insights (data visualisations)
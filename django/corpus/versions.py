@@ -0,0 +1,39 @@
+"""
+Version stamps of content, used to invalidate cached data (e.g. the facet index in facets.py, and the list items of each Text)
+
+A version stamp is stored in Django's cache (so it's shared by all processes, see CACHES in settings.py)
+and is set to a new value whenever the content changes (see signals.py)
+"""
+
+from django.core.cache import cache
+import time
+
+
+def version_key(name):
+    return f'corpus_version_{name}'
+
+
+def version_get(name):
+    """ Returns the current version stamp of the named content (e.g. 'corpus'), setting one if it doesn't exist yet """
+    return cache.get_or_set(version_key(name), time.time_ns, timeout=None)
+
+
+def version_bump(name):
+    """ Sets a new version stamp of the named content, e.g. after it has changed """
+    cache.set(version_key(name), time.time_ns(), timeout=None)
+
+
+def versions_get(names):
+    """ Returns a dict of the current version stamp of each of the named content, setting any that don't exist yet """
+    keys = {name: version_key(name) for name in names}
+    stamps = cache.get_many(keys.values())
+    missing = {key: time.time_ns() for key in keys.values() if key not in stamps}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        stamps.update(missing)
+    return {name: stamps[key] for name, key in keys.items()}
+
+
+def text_version_name(text_id):
+    """ Returns the name of the version stamp of a Text, which is set to a new value when the Text or its related data changes """
+    return f'text_{text_id}'
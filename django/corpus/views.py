@@ -1,15 +1,23 @@
 from django.views.generic import (DetailView, ListView, TemplateView, View)
-from django.db.models.functions import Lower
-from django.db.models import (Count, Q, CharField, TextField, Prefetch)
-from django.http import HttpResponseRedirect, HttpResponse, JsonResponse
+from django.db.models import Exists, OuterRef, Prefetch
+from django.core.exceptions import PermissionDenied
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.functional import cached_property
+from django.utils.http import http_date, quote_etag
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+from django.template.loader import render_to_string
+from django.http import Http404, HttpResponseRedirect, HttpResponse, JsonResponse
 from django.urls import reverse
 from django.conf import settings
-from functools import reduce
-from operator import (or_, and_)
 from bs4 import BeautifulSoup
 from docx import Document
 from docx.shared import Cm
-from . import models
+from . import autocomplete, facets, filters, models, regex_search, saved_searches, search, select_lists, toponym_summaries, versions
+import copy
+import hashlib
 import json
 import math
 import re
@@ -190,6 +198,14 @@ def downloaddata_text_queryset(view_request):
     if text_ids:
         texts = texts.filter(id__in=text_ids.split(','))
 
+    # Limit to the results of a saved search of the Text list page, if provided (see saved_searches.py)
+    saved_search = view_request.GET.get('saved_search', None)
+    if saved_search:
+        query = saved_searches.saved_search_get(saved_search)
+        if query is None:
+            raise Http404('This download has expired. Please search again and download the results.')
+        texts = texts.filter(id__in=TextListView.saved_search_text_ids(view_request, query))
+
     return texts
 
 
@@ -201,6 +217,35 @@ def json_str(value):
     return str(value) if value else None
 
 
+def conditional_validators(stamps, *keys):
+    """
+    Returns the ETag and Last-Modified (a Unix timestamp) of a response whose content only changes when the
+    version stamps (see versions.py) or keys (e.g. its URL and language) change, for conditional GET requests
+    The ETag also includes the release of the website (settings.VERSION), as the templates can change between releases
+    """
+    stamps = list(stamps)
+    etag = quote_etag(hashlib.sha1(json.dumps([settings.VERSION, stamps, keys]).encode()).hexdigest())
+    return etag, max(stamps) // 10 ** 9
+
+
+def conditional_response_not_modified(request, etag, last_modified):
+    """
+    Returns a 304 Not Modified response if the request's copy of the response (its If-None-Match/If-Modified-Since headers)
+    is current, so the response doesn't need to be rendered, otherwise None
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        conditional_response_set_validators(response, etag, last_modified)
+    return response
+
+
+def conditional_response_set_validators(response, etag, last_modified):
+    """ Sets the ETag and Last-Modified headers of the response, which clients must revalidate before reusing (no-cache) """
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True)
+
+
 #
 # 2. Main Views
 #
@@ -212,6 +257,63 @@ class TextDetailView(DetailView):
     """
     template_name = 'corpus/text-detail.html'
     model = models.Text
+    # Number of seconds that the rendered page is cached for (for anonymous users, see get())
+    page_cache_timeout = 60 * 60 * 24
+    # URL params that change the page, which are included in its cache key (pages with any other params aren't cached)
+    page_cache_params = ['tab', 'textfolio', 'codex_pagination']
+    # Tabs of trans fields, whose lines can be shown alongside each other (see detail.js)
+    tabs_trans = ['transliteration', 'transcription', 'translation']
+
+    def page_cache_key(self):
+        """
+        Returns the cache key of the rendered page, or None if it can't be cached, i.e. for logged in users
+        (who can see admin-only controls and unapproved Texts) and for requests with params other than page_cache_params
+
+        The key includes the version of the Text (bumped when the Text, its related data, or other data shown on its page changes,
+        e.g. the title of a related Text, see signals.py), the version of the select lists, the language, and the URL (host, path, and params)
+        These version stamps are also set as page_cache_stamps (see get())
+        """
+        request = self.request
+        text_id = str(self.kwargs.get(self.pk_url_kwarg))
+        if request.method != 'GET' or request.user.is_authenticated or not text_id.isdigit() or not set(request.GET) <= set(self.page_cache_params):
+            return None
+        text_version_name = versions.text_version_name(text_id)
+        stamps = versions.versions_get([text_version_name, 'select_lists'])
+        self.page_cache_stamps = [stamps[text_version_name], stamps['select_lists']]
+        url = json.dumps([request.scheme, request.get_host(), request.path, sorted(request.GET.lists())])
+        return f'corpus_textdetail_{text_id}_{get_language()}_{stamps[text_version_name]}_{stamps["select_lists"]}_{hashlib.sha1(url.encode()).hexdigest()[:16]}'
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns the page from the cache, if it can be cached (see page_cache_key()), otherwise renders it (caching it if it can be)
+        The X-Cache header of the response is HIT, MISS, or BYPASS (if the page can't be cached)
+
+        Pages that can be cached also have an ETag and Last-Modified (derived from the cache key and the version stamps within it),
+        so a request whose copy of the page is current gets a 304 Not Modified response, without reading the cache or rendering
+        """
+        cache_key = self.page_cache_key()
+        if cache_key is None:
+            response = super().get(request, *args, **kwargs)
+            response['X-Cache'] = 'BYPASS'
+            return response
+        etag, last_modified = conditional_validators(self.page_cache_stamps, cache_key)
+        response = conditional_response_not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        content = cache.get(cache_key)
+        if content is not None:
+            response = HttpResponse(content)
+            response['X-Cache'] = 'HIT'
+            conditional_response_set_validators(response, etag, last_modified)
+            return response
+        response = super().get(request, *args, **kwargs)
+        response.render()
+        # Only cache pages without per-request data (i.e. that don't set cookies, such as a CSRF token)
+        if response.status_code == 200 and not response.cookies and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+            cache.set(cache_key, response.content, self.page_cache_timeout)
+            conditional_response_set_validators(response, etag, last_modified)
+        response['X-Cache'] = 'MISS'
+        return response
 
     def get_queryset(self):
         # Start with the initial queryset of Text objects
@@ -229,10 +331,7 @@ class TextDetailView(DetailView):
             'text_related_publications',
             'text_dates',
             'seals',
-            Prefetch(
-                'toponyms__texts',
-                models.Text.objects.all().select_related('collection', 'primary_language__script')
-            ),
+            'toponyms',
             Prefetch(
                 'persons_in_texts',
                 models.PersonInText.objects.all().select_related('person_role_in_text', 'person__gender')
@@ -244,14 +343,46 @@ class TextDetailView(DetailView):
 
         return queryset
 
+    def tabs(self):
+        """
+        Returns the names of the tabs of the Text (in the order they're shown)
+        """
+        text = self.object
+        tabs = {
+            'details': True,
+            'folios': text.count_text_folios > 1,
+            'codex': text.is_codex,
+            'tags': text.has_textfoliotag,
+            'transliteration': text.has_transliteration,
+            'transcription': text.has_transcription,
+            'translation': text.has_translation,
+            'palaeography': text.has_palaeography,
+            'map': text.has_toponym_coordinates,
+            'seals': len(text.seals.all()),
+        }
+        return [tab for tab, is_shown in tabs.items() if is_shown]
+
+    def tab(self, tabs):
+        """
+        Returns the name of the tab whose content is rendered, i.e. the active tab (from the 'tab' URL param, else the first tab)
+        The content of the other tabs is loaded when they're opened (see TextDetailTabView)
+        """
+        tab = self.request.GET.get('tab')
+        return tab if tab in tabs else tabs[0]
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
+        # Tabs
+        context['tabs'] = self.tabs()
+        context['tabs_trans'] = self.tabs_trans
+        context['tab'] = self.tab(context['tabs'])
+
         # Codex pagination
-        if self.object.is_codex:
+        if context['tab'] == 'codex':
             codex_pagination = int(self.request.GET.get('codex_pagination', 0))
             codex_perpage = 25
-            codex_images = self.object.codex_images
+            codex_images = self.object.codex_images or []  # e.g. if its IIIF manifest can't be fetched
             context['codex_images'] = codex_images[
                 codex_pagination:codex_pagination + codex_perpage
             ]
@@ -278,12 +409,29 @@ class TextDetailView(DetailView):
                 models.TextFolioTag.objects.all().select_related('tag__category')
             )
         )
-        context['text_folio_tag_categories'] = models.SlTextFolioTagCategory.objects.all().prefetch_related('tags__text_folio_tags')
-        context['text_folio_tags'] = models.SlTextFolioTag.objects.all().select_related('category')
-        context['permalink'] = self.request.build_absolute_uri().split('?')[0]
+        # Categories of this Text's tags, for the 'Only show' select of the image
+        # (the categories and tags of the Tag Manager form are loaded when it's opened, see textfoliotag_options())
+        context['text_folio_tag_categories'] = models.SlTextFolioTagCategory.objects.filter(
+            Exists(models.TextFolioTag.objects.filter(tag__category=OuterRef('pk'), text_folio__text=self.object))
+        )
+        context['permalink'] = self.request.build_absolute_uri(reverse('corpus:text-detail', args=[self.object.id]))
 
         # Details data
-        context['data_items'] = [
+        if context['tab'] == 'details':
+            context['data_items'] = self.data_items(context['permalink'])
+
+        # Toponyms shown on the map, with a summary of the Texts of each (rather than all of them, see toponym_summaries.py)
+        if context['tab'] == 'map':
+            context['toponyms'] = toponym_summaries.toponyms_with_summaries(self.object.toponyms.all())
+
+        return context
+
+    def data_items(self, permalink):
+        """
+        Returns the data shown in the details tab, as a list of section headers and their data items (label and value, or html)
+        """
+
+        return [
 
             # Content
             {
@@ -509,7 +657,7 @@ class TextDetailView(DetailView):
             {
                 'label': 'Permalink',
                 'label_fa': 'پیوند سند',
-                'value': f'<a href="{context["permalink"]}">{context["permalink"]}</a>'
+                'value': f'<a href="{permalink}">{permalink}</a>'
             },
             {
                 'label': 'Image Permission Statement',
@@ -525,12 +673,46 @@ class TextDetailView(DetailView):
             {
                 'label': 'Contact Editorial Team',
                 'label_fa': 'تماس با گروه تدوین',
-                'value': f'<a href="mailto:{settings.MAIN_CONTACT_EMAIL}?subject=Invisible East Digital Corpus&body=This email relates to Text {self.object.id} - {context["permalink"]}">{settings.MAIN_CONTACT_EMAIL}</a> <em>(Please include the above permalink when contacting the editorial team about this Text)</em>'
+                'value': f'<a href="mailto:{settings.MAIN_CONTACT_EMAIL}?subject=Invisible East Digital Corpus&body=This email relates to Text {self.object.id} - {permalink}">{settings.MAIN_CONTACT_EMAIL}</a> <em>(Please include the above permalink when contacting the editorial team about this Text)</em>'
             },
 
         ]
 
-        return context
+
+class TextDetailTabView(TextDetailView):
+    """
+    Class-based view for the content of a single tab of the Text detail template,
+    loaded when the tab is opened (see detail.js), e.g. /corpus/1/tab/transcription/
+    """
+    template_name = 'corpus/snippets/text-detail-tab.html'
+    page_cache_params = ['codex_pagination']
+
+    def tab(self, tabs):
+        tab = self.kwargs['tab']
+        if tab not in tabs:
+            raise Http404(f"This text doesn't have a {tab} tab")
+        return tab
+
+
+class KeysetPage(Page):
+    """
+    A page of keyset pagination (see TextListView.paginate_queryset()), where the previous/next pages
+    are found by seeking from a cursor rather than from the page number
+    """
+    keyset_has_previous = False
+    keyset_has_next = False
+
+    def has_previous(self):
+        return self.keyset_has_previous
+
+    def has_next(self):
+        return self.keyset_has_next
+
+    def previous_page_number(self):
+        return max(self.number - 1, 1)
+
+    def next_page_number(self):
+        return self.number + 1
 
 
 class TextListView(ListView):
@@ -542,153 +724,407 @@ class TextListView(ListView):
     paginate_by = 30
 
     # Special starts to the values & labels of options in 'sort by' select lists, used in below sort() function and within views scripts
-    sort_pre_count_value = 'count_'
+    sort_pre_count_value = facets.SORT_PRE_COUNT
     sort_pre_count_label = 'Number of '
 
-    def get_field_type(self, field_name, queryset):
-        """
-        Return the type of a field
-        E.g. used in sort() to see if case insensitivity is needed (if field is a CharField/TextField)
-        """
-        try:
-            stripped_field_name = field_name.lstrip('-')
-            if stripped_field_name in queryset.query.annotations:
-                return queryset.query.annotations[stripped_field_name].output_field
-            return queryset.model._meta.get_field(stripped_field_name)
-        except Exception:
-            return CharField  # If it fails, assume it's a CharField by default
+    # Search terms, type, and operator (set in get_queryset()), and a message to show the user if their search couldn't be performed (e.g. an invalid RegEx)
+    searches = []
+    search_type = ''
+    search_operator = 'and'
+    search_error = None
 
-    def get_queryset(self):
-        # Start with the initial queryset of Text objects
-        queryset = text_initial_queryset(self.request.user)
+    # Number of seconds that the results of searches/filters are cached for (they're also invalidated when the corpus changes)
+    results_cache_timeout = 60 * 60
+    # Number of seconds that the HTML of the list item of each Text is cached for (it's also invalidated when the Text changes)
+    list_item_cache_timeout = 60 * 60 * 24
 
-        # Improve performance
-        queryset = queryset.select_related(
-            'writing_support',
-            'primary_language__script',
-            'type__category',
-            'gregorian_date_century',
-            'collection',
-        ).prefetch_related(
-            'text_folios',
-            'text_folios__text_folio_tags'
-        )
-
-        # Search
+    def search_params(self):
+        """
+        Returns the search params of the request in a canonical form: (search_type, search_operator, searches)
+        Search terms are stripped of surrounding whitespace (and repeated whitespace within 'exact' terms, which match whole words),
+        empty and duplicate terms are removed, and terms are sorted, as none of these affect the results
+        """
         try:
             searches = json.loads(self.request.GET.get('search', '[]'))
         except json.decoder.JSONDecodeError:
             searches = []
+        if not isinstance(searches, list):
+            searches = []
+        search_type = self.request.GET.get('search_type', '')
+        search_type = search_type if search_type in ('exact', 'regex') else ''
+        searches = [str(s).strip() for s in searches]
+        if search_type == 'exact':
+            searches = [' '.join(s.split()) for s in searches]
+        searches = sorted(set(s for s in searches if s))
+        # The operator only affects multiple searches and anything other than 'or' is 'and'
+        search_operator = 'or' if self.request.GET.get('search_operator', '') == 'or' and len(searches) > 1 else 'and'
+        return search_type, search_operator, searches
+
+    def cache_key(self, *params):
+        """
+        Returns a cache key for the provided params at the current version of the corpus
+        (so cached results are invalidated whenever a Text, TextFolio, tag, etc. changes)
+        """
+        params_hash = hashlib.sha1(json.dumps([self.facet_index.version, *params]).encode()).hexdigest()
+        return f'corpus_textlist_{params_hash}'
 
-        field_names_to_search = [
-            'shelfmark',
-            'collection__name',
-            'corpus__name',
-            'primary_language__name',
-            'primary_language__script__name',
-            'type__name',
-            'summary_of_content',
-            'text_folios__transcription',
-            'text_folios__translation',
-            'text_folios__transliteration',
-            'text_folios__text_folio_tags__tag__name'
-        ]
-        # Set list of search options
-        if searches not in [[''], []]:
-            search_type = self.request.GET.get('search_type', '')
-            search_lookup = 'iregex' if search_type in ['regex', 'exact'] else 'icontains'
-            operator = or_ if self.request.GET.get('search_operator', '') == 'or' else and_
-            queries = []
-            for search in searches:
-                # Exact search will force full word matching, e.g. search 'hen' won't return 'when'
-                if search_type == 'exact':
-                    search = r'\y{}\y'.format(re.escape(search))
-                # Uses 'or_' as the search term could appear in any field, so 'and_' wouldn't be suitable
-                queries.append(reduce(or_, (Q((f'{field_name}__{search_lookup}', search.strip())) for field_name in field_names_to_search)))
-            # Connect the individual search queries via the user-defined operator (or_ / and_)
-            queries = reduce(operator, queries)
-            # Filter the queryset using the completed search query
-            queryset = queryset.filter(queries)
-
-        # Filter
-        for filter_key in [k for k in list(self.request.GET.keys()) if k.startswith(filter_pre)]:
-            filter_value = self.request.GET.get(filter_key, '')
+    @cached_property
+    def visible_bitmap(self):
+        """ The bitmap (see facets.py) of Texts visible to the user: all if logged in, otherwise only approved Texts """
+        return self.facet_index.all if self.request.user.is_authenticated else self.facet_index.public
+
+    @cached_property
+    def search_bitmap(self):
+        """
+        The bitmap (see facets.py) of visible Texts that match the search of the request
+        The ids of the Texts that match each search are cached
+        """
+        if not self.searches:
+            return self.visible_bitmap
+        search_cache_key = self.cache_key('search', self.search_type, self.search_operator, self.searches)
+        search_text_ids = cache.get(search_cache_key)
+        if search_text_ids is None:
+            # General and exact searches use the full-text search index
+            # Exact search will force full word matching, e.g. search 'hen' won't return 'when'
+            if self.search_type != 'regex':
+                search_text_ids = search.text_ids_matching_searches(self.searches, self.search_type, self.search_operator)
+            # RegEx searches use the RegEx search engine
+            else:
+                try:
+                    search_text_ids = search.text_ids_matching_regexes(self.searches, self.search_operator)
+                except re.error:
+                    self.search_error = 'Invalid RegEx search'
+                    search_text_ids = set()
+                except regex_search.RegexSearchTimeout:
+                    self.search_error = 'RegEx search took too long. Please try a more specific search'
+                    search_text_ids = set()
+            search_text_ids = sorted(search_text_ids)
+            if not self.search_error:
+                cache.set(search_cache_key, search_text_ids, self.results_cache_timeout)
+        return self.visible_bitmap & facets.bitmap_from_ids(search_text_ids)
+
+    def filter_keys(self, skip_filter_keys=()):
+        """ Returns a list of the filter_ params of the request that have a value (except for any skip_filter_keys) """
+        return [k for k in self.request.GET.keys() if k.startswith(filter_pre) and k not in skip_filter_keys and self.filter_values(k)]
+
+    def filter_values(self, filter_key):
+        """
+        Returns a list of the values of a filter_ param of the request (except empty values)
+        A filter can have several values (e.g. ?filter_fk_collection=1&filter_fk_collection=2), which match Texts with any of them
+        """
+        return [value for value in self.request.GET.getlist(filter_key) if value != '']
+
+    def filter_queryset(self, queryset, filter_keys):
+        """
+        Filter the queryset by the provided filter_ params of the request
+        Used for filters that aren't in the facet index (see filter_bitmap())
+        """
+        for filter_key in filter_keys:
+            filter_values = self.filter_values(filter_key)
+            filter_value = filter_values[-1] if filter_values else ''
             # Perform the filter based on the type
+            # Filters of multi-valued relations are EXISTS subqueries, so there's no join or need for DISTINCT (see filters.py)
             if filter_value != '':
-                # Many to Many relationship (uses __in comparison and filter_value is a list)
+                # Many to Many relationship (uses __in comparison, matching any of the values)
                 if filter_key.startswith(filter_pre_mm):
                     filter_field = filter_key.replace(filter_pre_mm, '')
-                    queryset = queryset.filter(**{f'{filter_field}__in': [filter_value]})
-                # Foreign Key relationship
+                    queryset = queryset.filter(filters.filter_q(filter_field, 'in', filter_values))
+                # Foreign Key relationship (matching any of the values, if several)
                 elif filter_key.startswith(filter_pre_fk):
                     filter_field = filter_key.replace(filter_pre_fk, '')
-                    queryset = queryset.filter(**{filter_field: filter_value})
+                    if len(filter_values) > 1:
+                        queryset = queryset.filter(filters.filter_q(filter_field, 'in', filter_values))
+                    else:
+                        queryset = queryset.filter(filters.filter_q(filter_field, 'exact', filter_value))
                 # Greater than or equal to
                 elif filter_key.startswith(filter_pre_gt):
                     filter_field = filter_key.replace(filter_pre_gt, '')
-                    queryset = queryset.filter(**{f'{filter_field}__gte': filter_value})
+                    queryset = queryset.filter(filters.filter_q(filter_field, 'gte', filter_value))
                 # Less than or equal to
                 elif filter_key.startswith(filter_pre_lt):
                     filter_field = filter_key.replace(filter_pre_lt, '')
-                    queryset = queryset.filter(**{f'{filter_field}__lte': filter_value})
+                    queryset = queryset.filter(filters.filter_q(filter_field, 'lte', filter_value))
                 # Boolean content (e.g. field is not null or empty string)
                 elif filter_key.startswith(filter_pre_bl):
                     filter_field = filter_key.replace(filter_pre_bl, '')
                     if filter_value == 'on':
-                        try:
-                            queryset = queryset.exclude(**{f'{filter_field}__isnull': True})  # remove null values
-                        except Exception:
-                            pass
-                        try:
-                            queryset = queryset.exclude(**{f'{filter_field}__exact': ''})  # remove empty strings
-                        except Exception:
-                            pass
-
-        # Sort
-        # Establish the sort direction (asc/desc) and the field to sort by, from the self.request
-        sort = self.request.GET.get('sort', 'id')
-        sort_dir = '-' if sort.startswith('-') else ''
-        sort_pre_length = len(f"{sort_dir}{self.sort_pre_count_value}")  # e.g. '-numerical_' for descending numerical
-        # Count sorting (e.g. sort by count of related items)
-        if sort.startswith(self.sort_pre_count_value) or sort.startswith(f'-{self.sort_pre_count_value}'):
-            # '-countitems' if descending, 'countitems' if ascending
-            order_by = f'{sort_dir}countitems'
-            sort_field = sort[sort_pre_length:]
-            queryset = queryset.annotate(countitems=Count(sort_field)).order_by(order_by)
-        # Standard sort
-        else:
-            # Sort descending (Z-A)
-            if sort.startswith('-'):
-                # Convert CharField and TextField values to lowercase, for case insensitivity
-                if isinstance(self.get_field_type(sort, queryset), (CharField, TextField)):
-                    queryset = queryset.order_by(Lower(sort[1:]).desc())
-                else:
-                    queryset = queryset.order_by(sort)
-            # Sort ascending (A-Z)
-            else:
-                # Convert CharField and TextField values to lowercase, for case insensitivity
-                if isinstance(self.get_field_type(sort, queryset), (CharField, TextField)):
-                    queryset = queryset.order_by(Lower(sort))
+                        queryset = queryset.filter(filters.filter_boolean_q(filter_field))
+        return queryset
+
+    def filter_bitmap(self, skip_filter_keys=()):
+        """
+        Returns the bitmap (see facets.py) of Texts that match the search and filter_ params of the request
+        (except for any skip_filter_keys, e.g. used by facet_counts() to count the options of a filter as if it weren't selected)
+        Filters of fields that aren't in the facet index (e.g. persons) are performed in the database
+        """
+        index = self.facet_index
+        bitmap = self.search_bitmap
+        filter_keys_other = []
+        for filter_key in self.filter_keys(skip_filter_keys):
+            filter_values = self.filter_values(filter_key)
+            filter_value = filter_values[-1]
+            filter_field = filter_key[len(filter_pre) + 3:]  # e.g. 'filter_fk_collection' --> 'collection'
+            try:
+                # Many to Many relationship and Foreign Key relationship (several values of a filter match any of them)
+                if filter_key.startswith((filter_pre_mm, filter_pre_fk)) and filter_field in index.values:
+                    bitmap &= index.value_any(filter_field, filter_values)
+                # Greater than or equal to
+                elif filter_key.startswith(filter_pre_gt) and filter_field in index.values:
+                    bitmap &= index.value_range(filter_field, value_min=filter_value)
+                # Less than or equal to
+                elif filter_key.startswith(filter_pre_lt) and filter_field in index.values:
+                    bitmap &= index.value_range(filter_field, value_max=filter_value)
+                # Boolean content (e.g. field is not null or empty string)
+                elif filter_key.startswith(filter_pre_bl) and filter_field in index.booleans:
+                    if filter_value == 'on':
+                        bitmap &= index.booleans[filter_field]
                 else:
-                    queryset = queryset.order_by(sort)
+                    filter_keys_other.append(filter_key)
+            # Invalid values (e.g. a non-numeric id) match no Texts
+            except ValueError:
+                bitmap = 0
+        if filter_keys_other and bitmap:
+            bitmap &= facets.bitmap_from_ids(self.filter_queryset(models.Text.objects.all(), filter_keys_other).values_list('id', flat=True))
+        return bitmap
+
+    def facet_counts(self, facet_field, skip_filter_keys):
+        """
+        Returns a dict of {value: count} of the results for each value of facet_field (e.g. {collection_id: count})
+        Results are counted as if the filter(s) of skip_filter_keys weren't selected
+        (i.e. the facet's own filters), so each count is the number of results that selecting that option would give
+        """
+        if any(self.filter_values(key) for key in skip_filter_keys):
+            bitmap = self.filter_bitmap(skip_filter_keys)
+        else:
+            bitmap = self.result_bitmap
+        return self.facet_index.counts(facet_field, bitmap)
+
+    def facet_counts_boolean(self, filter_ids):
+        """
+        Returns a list of counts of the results that would remain if each boolean ('Includes') filter were selected
+        """
+        return [(self.result_bitmap & self.facet_index.booleans[filter_id.replace(filter_pre_bl, '')]).bit_count() for filter_id in filter_ids]
+
+    def get_queryset(self):
+        """
+        Sets up the search and sort of the request; the results are searched, filtered, and sorted using the facet index
+        (see facets.py, result_bitmap, and result_ids)
+        Returns the queryset used to fetch the Text objects of the current page (see paginate_queryset())
+        """
+        # Start with the initial queryset of Text objects
+        queryset = text_initial_queryset(self.request.user)
+
+        # Improve performance
+        queryset = queryset.select_related(
+            'writing_support',
+            'primary_language__script',
+            'type__category',
+            'gregorian_date_century',
+            'collection',
+            'list_summary',
+        ).defer(
+            # The cards of the list show the TextListSummary of each Text, so rich text is never needed
+            *models.rich_text_fields(models.Text)
+        )
+
+        self.facet_index = facets.facet_index()
+        self.count_all_texts = self.visible_bitmap.bit_count()
+        self.search_sort_setup()
+
+        return queryset
+
+    def search_sort_setup(self):
+        """ Sets the search params (see search_params()) and sort of the request """
+        self.search_type, self.search_operator, self.searches = self.search_params()
+        self.sort = self.request.GET.get('sort', 'id')
 
-        # return queryset, removing duplicates
-        return queryset.distinct()
+    def get(self, request, *args, **kwargs):
+        """
+        Returns the page, with an ETag and Last-Modified (derived from the versions of the corpus and of the list summaries, and the URL)
+        for users who aren't logged in, so a request whose copy of the page is current gets a 304 Not Modified response,
+        without searching or rendering. Pages of logged in users (which include unapproved Texts) don't have validators
+        """
+        if request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+        etag, last_modified = conditional_validators(
+            versions.versions_get(['corpus', 'text_list_summaries']).values(),
+            get_language(), request.scheme, request.get_host(), request.path, sorted(request.GET.lists())
+        )
+        response = conditional_response_not_modified(request, etag, last_modified)
+        if response is not None:
+            # Reset the expiry of the saved search of the page's download links (see get_context_data())
+            if request.GET:
+                self.search_sort_setup()
+                saved_searches.saved_search_save(self.saved_search_params())
+            return response
+        response = super().get(request, *args, **kwargs)
+        response.render()
+        # Pages of failed searches (e.g. a RegEx search that took too long) and that set cookies aren't revalidated
+        if response.status_code == 200 and not self.search_error and not response.cookies and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+            conditional_response_set_validators(response, etag, last_modified)
+        return response
+
+    def saved_search_params(self):
+        """ Returns the search, filter, and sort params of the request in a canonical form, as a list of (key, value) """
+        params = [('search', json.dumps(self.searches)), ('search_type', self.search_type), ('search_operator', self.search_operator)]
+        params += [(key, value) for key in sorted(self.filter_keys()) for value in self.filter_values(key)]
+        return params + [('sort', self.sort)]
+
+    @classmethod
+    def saved_search_text_ids(cls, request, query):
+        """
+        Returns a list of the ids of the Texts in the results of a saved search (query, see saved_searches.py)
+        as seen by the user of the request
+        """
+        saved_search_request = copy.copy(request)
+        saved_search_request.GET = query
+        view = cls()
+        view.setup(saved_search_request)
+        view.get_queryset()
+        return view.result_ids
+
+    def list_items_cache_keys(self, text_ids):
+        """
+        Returns a dict of the cache key of the HTML of the list item (card) of each Text id
+
+        The keys include the version of the Text (bumped when the Text or its folios, tags, seals, toponyms, persons, etc. change,
+        see signals.py), the version of the select lists, the language, and whether the user is logged in
+        """
+        language = get_language()
+        text_versions = versions.versions_get([versions.text_version_name(text_id) for text_id in text_ids])
+        select_lists_version = versions.version_get('select_lists')
+        return {
+            text_id: f'corpus_textlistitem_{text_id}_{language}_{self.request.user.is_authenticated:d}_{text_versions[versions.text_version_name(text_id)]}_{select_lists_version}'
+            for text_id in text_ids
+        }
+
+    def list_items_html(self, texts, start_count):
+        """
+        Returns a list of the HTML of the list item (card) of each Text, numbered from start_count
+        Uses the cached HTML of each Text (see paginate_queryset()), rendering and caching any that aren't cached,
+        and then adds the parts of a list item that depend on the request (its number and search snippets)
+        """
+        items_html = []
+        tags = None
+        for i, text in enumerate(texts):
+            cache_key = self.list_items_keys[text.id]
+            if cache_key not in self.list_items_cached:
+                # The names of the tags of the Text (its list summary only has their ids), from the 'tags' select list
+                if tags is None:
+                    tags = {tag.id: tag for tag in select_lists.select_list('tags')}
+                text.list_tags = [tags[tag_id] for tag_id in text.list_summary.tags if tag_id in tags]
+                self.list_items_cached[cache_key] = render_to_string('corpus/snippets/text-list-item.html', {'object': text}, self.request)
+                cache.set(cache_key, self.list_items_cached[cache_key], self.list_item_cache_timeout)
+            snippets_html = render_to_string('corpus/snippets/text-list-item-snippets.html', {'object': text}) if getattr(text, 'search_snippets', None) else ''
+            items_html.append(mark_safe(
+                self.list_items_cached[cache_key].replace('<!--list-item-count-->', str(start_count + i)).replace('<!--list-item-snippets-->', snippets_html)
+            ))
+        return items_html
+
+    def results_cache_key(self, *params):
+        """ Returns the cache key of results of the search and filter params of the request (and any other params, e.g. sort) """
+        return self.cache_key(
+            'results',
+            self.request.user.is_authenticated,
+            self.search_type,
+            self.search_operator,
+            self.searches,
+            [(key, self.filter_values(key)) for key in sorted(self.filter_keys())],
+            *params
+        )
+
+    @cached_property
+    def result_bitmap(self):
+        """
+        The bitmap (see facets.py) of Texts that match the search and filter params of the request
+        Cached, so paginating through the results doesn't repeat the search and filter
+        """
+        results_cache_key = self.results_cache_key()
+        bitmap = cache.get(results_cache_key)
+        if bitmap is None:
+            bitmap = self.filter_bitmap()
+            # Don't cache failed searches (e.g. that timed out)
+            if not self.search_error:
+                cache.set(results_cache_key, bitmap, self.results_cache_timeout)
+        return bitmap
+
+    @cached_property
+    def result_ids(self):
+        """
+        A list of the ids of all Texts in result_bitmap, in order of the sort param of the request
+        Cached, so paginating through the results doesn't repeat the sort
+        """
+        results_cache_key = self.results_cache_key(self.sort)
+        ids = cache.get(results_cache_key)
+        if ids is None:
+            ids = self.facet_index.sorted_ids(self.result_bitmap, self.sort)
+            if not self.search_error:
+                cache.set(results_cache_key, ids, self.results_cache_timeout)
+        return ids
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Paginates the results and fetches only the Text objects of the current page
+
+        Pages are either:
+        - keyset pages, when the request has an 'after' or 'before' param (a cursor: the id of the last Text of the previous page,
+          or the first Text of the next page), which seek from the cursor within result_ids (see FacetIndex.seek()),
+          so the cost of a page doesn't depend on how deep it is. Previous/Next links use cursors of the current page.
+          The 'page' param is then only used to number the page and its Texts.
+        - offset pages of the 'page' param (e.g. to go to the first, last, or a selected page)
+        """
+        page = self.paginate_keyset(page_size)
+        if page is None:
+            paginator, page, text_ids, is_paginated = super().paginate_queryset(self.result_ids, page_size)
+            page.cursor_previous = text_ids[0] if text_ids else None
+            page.cursor_next = text_ids[-1] if text_ids else None
+        else:
+            paginator = page.paginator
+            text_ids = page.object_list
+        # Only Texts without a cached list item (see list_items_html()) are fetched from the database
+        # (text_ids are all visible to the user, see visible_bitmap, so the others only need their id)
+        self.list_items_keys = self.list_items_cache_keys(text_ids)
+        self.list_items_cached = cache.get_many(self.list_items_keys.values())
+        texts = queryset.in_bulk([text_id for text_id in text_ids if self.list_items_keys[text_id] not in self.list_items_cached])
+        page.object_list = [texts.get(text_id) or models.Text(id=text_id) for text_id in text_ids]
+        # The list shows the TextListSummary of each Text. Any that don't exist yet are built without saving them
+        # (they're saved by signals and text_list_summary_rebuild, rather than by requests)
+        for text in texts.values():
+            if not hasattr(text, 'list_summary'):
+                text.list_summary = models.TextListSummary.build(text)
+        return paginator, page, page.object_list, paginator.num_pages > 1
+
+    def paginate_keyset(self, page_size):
+        """
+        Returns a KeysetPage of the ids of the Texts after/before the cursor of the request (see paginate_queryset())
+        Returns None if the request has no valid cursor
+        """
+        for param, backwards in (('after', False), ('before', True)):
+            cursor = self.request.GET.get(param, '')
+            if cursor.isdigit():
+                index = self.facet_index.seek(self.result_ids, self.sort, int(cursor), backwards)
+                if index is not None:
+                    start, end = (max(index - page_size, 0), index) if backwards else (index, index + page_size)
+                    text_ids = self.result_ids[start:end]
+                    if text_ids:
+                        break
+        else:
+            return None
+        page_number = self.request.GET.get('page', '')
+        paginator = Paginator(range(len(self.result_ids)), page_size)
+        page = KeysetPage(text_ids, min(int(page_number), paginator.num_pages) if page_number.isdigit() else 1, paginator)
+        page.cursor_previous = text_ids[0]
+        page.cursor_next = text_ids[-1]
+        page.keyset_has_previous = start > 0
+        page.keyset_has_next = start + len(text_ids) < len(self.result_ids)
+        return page
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
         # Count of all published texts
-        context['count_all_texts'] = text_initial_queryset(self.request.user).count()
-        # Filter pre values
-        context['filter_pre'] = filter_pre
-        context['filter_pre_gt'] = filter_pre_gt
-        context['filter_pre_lt'] = filter_pre_lt
-        context['filter_pre_bl'] = filter_pre_bl
-
-        # Download Data
-        if self.request.GET:
-            context['downloaddata_text_ids'] = ','.join([str(i) for i in self.object_list.values_list('id', flat=True)])
+        context['count_all_texts'] = self.count_all_texts
+        context['search_error'] = self.search_error
 
         # Results count start
         if context.get('is_paginated'):
@@ -698,10 +1134,30 @@ class TextListView(ListView):
         else:
             context['start_count'] = 1
 
+        # Search snippets (keyword in context) of the Texts on this page, showing where the search terms occur
+        if self.searches and not self.search_error:
+            snippets = search.search_snippets([text.id for text in context['object_list']], self.searches, self.search_type)
+            for text in context['object_list']:
+                text.search_snippets = snippets[text.id]
+
+        # HTML of the list item (card) of each Text on this page
+        for text, list_item_html in zip(context['object_list'], self.list_items_html(context['object_list'], context['start_count'])):
+            text.list_item_html = list_item_html
+
+        # Filter pre values
+        context['filter_pre'] = filter_pre
+        context['filter_pre_gt'] = filter_pre_gt
+        context['filter_pre_lt'] = filter_pre_lt
+        context['filter_pre_bl'] = filter_pre_bl
+
+        # Download Data
+        if self.request.GET:
+            context['downloaddata_saved_search'] = saved_searches.saved_search_save(self.saved_search_params())
+
         # Tag
         tag_id = self.request.GET.get(f'{filter_pre_fk}text_folios__text_folio_tags__tag', None)
         if tag_id:
-            context['filter_active_tag'] = models.SlTextFolioTag.objects.get(id=tag_id).name
+            context['filter_active_tag'] = next((tag.name for tag in select_lists.select_list('tags') if str(tag.id) == tag_id), None)
 
         # Options: Sort
         context['options_sort'] = [
@@ -738,7 +1194,7 @@ class TextListView(ListView):
         ]
 
         # Reused querysets in below filters (specified here to avoid duplicate SQL queries)
-        filter_queryset_centuries = models.SlTextGregorianCentury.objects.all()
+        filter_options_centuries = select_lists.select_list('centuries')
 
         # Includes (aka checkbox filters)
         context['options_includes'] = [
@@ -788,14 +1244,18 @@ class TextListView(ListView):
                 'filter_classes': filter_pre_gt,
                 'filter_name': 'From',
                 'filter_name_fa': 'از',
-                'filter_options': filter_queryset_centuries
+                'filter_options': filter_options_centuries,
+                'facet_field': 'gregorian_date_century__century_number',
+                'facet_cumulative': 'gte'  # selecting a century includes all later centuries
             },
             {
                 'filter_id': f'{filter_pre_lt}gregorian_date_century__century_number',
                 'filter_classes': filter_pre_lt,
                 'filter_name': 'To',
                 'filter_name_fa': 'به',
-                'filter_options': filter_queryset_centuries
+                'filter_options': filter_options_centuries,
+                'facet_field': 'gregorian_date_century__century_number',
+                'facet_cumulative': 'lte'  # selecting a century includes all earlier centuries
             },
         ]
 
@@ -804,32 +1264,36 @@ class TextListView(ListView):
             {
                 'filter_id': f'{filter_pre_fk}text_folios__text_folio_tags__tag',
                 'filter_name': 'Tag',
-                'filter_options': models.SlTextFolioTag.objects.all(),
+                'filter_options': select_lists.select_list('tags'),
                 'filter_hidden': True  # this filter is not visible as its set by user clicking tags in list items
             },
             {
                 'filter_id': f'{filter_pre_fk}primary_language',
                 'filter_name': 'Primary Language',
                 'filter_name_fa': 'زبان اصلی',
-                'filter_options': models.SlTextLanguage.objects.filter(texts_primary__isnull=False).distinct().select_related('script')
+                'filter_options': select_lists.select_list('primary_languages'),
+                'facet_field': 'primary_language'
             },
             {
                 'filter_id': f'{filter_pre_mm}additional_languages',
                 'filter_name': 'Additional Languages',
                 'filter_name_fa': 'زبانهای دیگر',
-                'filter_options': models.SlTextLanguage.objects.filter(texts__isnull=False).distinct().select_related('script')
+                'filter_options': select_lists.select_list('additional_languages'),
+                'facet_field': 'additional_languages'
             },
             {
                 'filter_id': f'{filter_pre_fk}collection',
                 'filter_name': 'Collection',
                 'filter_name_fa': 'مجموعه',
-                'filter_options': models.SlTextCollection.objects.all()
+                'filter_options': select_lists.select_list('collections'),
+                'facet_field': 'collection'
             },
             {
                 'filter_id': f'{filter_pre_fk}corpus',
                 'filter_name': 'Groups',
                 'filter_name_fa': 'گروه',
-                'filter_options': models.SlTextCorpus.objects.all(),
+                'filter_options': select_lists.select_list('corpora'),
+                'facet_field': 'corpus',
                 'info_alert': 'These are sub-corpora of documents organised by place of origin (presumed or confirmed)',
                 'info_alert_fa': 'این زیرمجموعه‌ها شامل اسنادی هستند که بر اساس محل نگارش (تأیید شده یا مفروض) طبقه‌بندی شده‌اند'
             },
@@ -837,20 +1301,68 @@ class TextListView(ListView):
                 'filter_id': f'{filter_pre_fk}type',
                 'filter_name': 'Type of Text',
                 'filter_name_fa': 'نوع متن',
-                'filter_options': models.SlTextType.objects.all().select_related('category'),
+                'filter_options': select_lists.select_list('types'),
+                'facet_field': 'type',
                 'info_link': reverse('general:about-typology')
             },
             {
                 'filter_id': f'{filter_pre_fk}writing_support',
                 'filter_name': 'Writing Support',
                 'filter_name_fa': 'سطح نوشتار',
-                'filter_options': models.SlTextWritingSupport.objects.all()
+                'filter_options': select_lists.select_list('writing_supports'),
+                'facet_field': 'writing_support'
             },
         ]
 
+        # Facet counts: the number of results that selecting each filter option would give
+        for f in context['options_datefilters'] + context['options_filters']:
+            if 'facet_field' in f:
+                counts = self.facet_counts(f['facet_field'], [f['filter_id']])
+                f['filter_options'] = [copy.copy(o) for o in f['filter_options']]
+                for o in f['filter_options']:
+                    value = getattr(o, 'html_select_value_field', o.id)
+                    # Range filters (e.g. 'From' century) count all values within the range
+                    if f.get('facet_cumulative') == 'gte':
+                        o.facet_count = sum(c for v, c in counts.items() if v is not None and v >= value)
+                    elif f.get('facet_cumulative') == 'lte':
+                        o.facet_count = sum(c for v, c in counts.items() if v is not None and v <= value)
+                    else:
+                        o.facet_count = counts.get(value, 0)
+        for f, count in zip(context['options_includes'], self.facet_counts_boolean([f['filter_id'] for f in context['options_includes']])):
+            f['facet_count'] = count
+
         return context
 
 
+def text_list_autocomplete(request):
+    """
+    Returns JSON of autocomplete suggestions (tags, toponyms, persons, collections, and shelfmarks) that start with the 'q' param
+    Used by the search box of the Text list page
+    """
+    suggestions = autocomplete.autocomplete_index().search(
+        request.GET.get('q', ''),
+        include_private=request.user.is_authenticated
+    )
+    return JsonResponse({'suggestions': suggestions})
+
+
+def textfoliotag_options(request):
+    """
+    Returns JSON of the options of the category and tag select lists of the Tag Manager form (on the Text detail page)
+    Loaded when the form is first opened, as only admins can use it
+    """
+    if not (request.user.is_authenticated and request.user.is_admin):
+        raise PermissionDenied
+    return JsonResponse({
+        'categories': [
+            {'id': category.id, 'name': category.name} for category in select_lists.select_list('tag_categories')
+        ],
+        'tags': [
+            {'id': tag.id, 'name': tag.name, 'category': tag.category_id} for tag in select_lists.select_list('tags')
+        ],
+    })
+
+
 class TextFolioTagCreateView(View):
     """
     Class-based view to create a TextFolioTag object in the database
@@ -1020,19 +1532,33 @@ class MapTextsListView(ListView):
         # Start with the initial queryset of SlTextToponym objects that have coordinates data
         queryset = self.model.objects.filter(latitude__isnull=False, longitude__isnull=False)
 
-        # Improve performance
-        queryset = queryset.prefetch_related(
-            Prefetch(
-                'texts',
-                models.Text.objects.all().select_related(
-                    'primary_language',
-                    'collection',
-                )
-            )
-        )
-
         return queryset
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Toponyms, with a summary of the Texts of each (rather than all of them, see toponym_summaries.py)
+        context['toponyms'] = toponym_summaries.toponyms_with_summaries(context['object_list'])
+        return context
+
+
+def map_toponym_texts(request, pk):
+    """
+    Returns JSON of a page of the Texts (id and title) of a toponym, starting from the 'start' param (an offset)
+    Used by the popups of toponyms on maps, which show a summary of the first Texts of each toponym (see toponym_summaries.py)
+    """
+    if not models.SlTextToponym.objects.filter(id=pk).exists():
+        raise Http404('Toponym not found')
+    start = request.GET.get('start', '0')
+    start = int(start) if start.isdigit() else 0
+    texts = toponym_summaries.toponym_texts(pk)
+    count = texts.count()
+    end = start + toponym_summaries.TEXTS_PAGE_SIZE
+    return JsonResponse({
+        'count': count,
+        'texts': toponym_summaries.toponym_texts_data(texts[start:end]),
+        'next': end if end < count else None,
+    })
+
 
 class MapFindSpotTemplateView(TemplateView):
     """
@@ -1242,7 +1768,7 @@ def downloaddata_word(request):
 
             # Content
             {'section_header': 'Content Summary'},
-            {'content_block': text.summary_of_content},
+            {'content_block': text.summary_of_content_plain},
 
             # Dates (Gregorian and Original)
             {'section_header': 'Dates'},
@@ -1308,10 +1834,10 @@ def downloaddata_word(request):
                 label.bold = True
                 # Value
                 p.add_run(str(text_data_item['value']))
-            # Content blocks (e.g. multiline blocks of text, like transcriptions)
+            # Content blocks (e.g. multiline blocks of text, like transcriptions), already plain text
             elif 'content_block' in text_data_item and text_data_item['content_block']:
                 p = word_doc.add_paragraph()
-                p.add_run(f"{clean_html(text_data_item['content_block'])}")
+                p.add_run(str(text_data_item['content_block']))
                 if 'alignment' in text_data_item:
                     p.alignment = text_data_item['alignment']
 
@@ -1342,9 +1868,22 @@ def downloaddata_word(request):
 def downloaddata_json(request):
     """
     Returns a JSON object containing all Text and related data
+
+    The response has an ETag and Last-Modified derived from the ids of the Texts it covers and their versions
+    (and the version of the select lists), so a request whose copy of the data is current gets a 304 Not Modified response
     """
 
     texts = downloaddata_text_queryset(request)
+    text_ids = list(texts.prefetch_related(None).values_list('id', flat=True))
+    stamps = versions.versions_get([versions.text_version_name(text_id) for text_id in text_ids] + ['select_lists'])
+    etag, last_modified = conditional_validators(
+        stamps.values(),
+        text_ids, request.user.is_authenticated, request.scheme, request.get_host()
+    )
+    response = conditional_response_not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+
     data = []
     for text in texts:
         permalink = f"{request.build_absolute_uri('/')[:-1]}{reverse('corpus:text-detail', args=[text.id])}"
@@ -1440,4 +1979,6 @@ def downloaddata_json(request):
             'imagePermissionStatement': clean_html(text.image_permission_statement),
         })
 
-    return JsonResponse(data, safe=False)
+    response = JsonResponse(data, safe=False)
+    conditional_response_set_validators(response, etag, last_modified)
+    return response